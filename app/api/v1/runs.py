@@ -1,21 +1,58 @@
 # app/api/v1/runs.py
 
-from typing import Annotated
+from typing import Annotated, Any, Literal
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response, status
 
 from app.core.deps import get_uow, require_access_token
-from app.domains.procurement.usecases.runs.ingest_supplier import execute as uc_ingest
+from app.domains.procurement.usecases.runs.get_run import execute as uc_get_run
+from app.domains.procurement.usecases.runs.ingest_all import execute as uc_ingest_all
+from app.domains.procurement.usecases.runs.list_runs import execute as uc_list_runs
+from app.domains.procurement.usecases.runs.submit_ingest import execute as uc_submit_ingest
 from app.infra.uow import UoW
+from app.schemas.runs import FeedRunListOut, FeedRunOut
 
 router = APIRouter(prefix="/runs", tags=["runs"], dependencies=[Depends(require_access_token)])
 UowDep = Annotated[UoW, Depends(get_uow)]
 
 
-@router.post("/supplier/{id_supplier}/ingest")
+@router.post("/supplier/{id_supplier}/ingest", status_code=status.HTTP_202_ACCEPTED)
 async def ingest_supplier(
     id_supplier: int,
     limit: int | None = Query(default=None, ge=1, le=1_000_000),
+    mode: Literal["row", "bulk"] | None = Query(default=None),
+    wait: bool = Query(default=False, description="Esperar pelo fim do ingest (resumo final)"),
     uow: UowDep = None,
+    response: Response = None,
+) -> dict[str, Any]:
+    if wait:
+        response.status_code = status.HTTP_200_OK
+    return await uc_submit_ingest(uow, id_supplier=id_supplier, limit=limit, mode=mode, wait=wait)
+
+
+@router.post("/ingest-all", status_code=status.HTTP_202_ACCEPTED)
+async def ingest_all(
+    suppliers: list[int] | None = Query(default=None, description="Omitir → todos os feeds ativos"),
+    limit: int | None = Query(default=None, ge=1, le=1_000_000),
+    mode: Literal["row", "bulk"] | None = Query(default=None),
+    wait: bool = Query(default=False, description="Esperar pelo fim de todas as runs"),
+    response: Response = None,
+) -> dict[str, Any]:
+    if wait:
+        response.status_code = status.HTTP_200_OK
+    return await uc_ingest_all(id_suppliers=suppliers, limit=limit, mode=mode, wait=wait)
+
+
+@router.get("/supplier/{id_supplier}", response_model=FeedRunListOut)
+def list_supplier_runs(
+    id_supplier: int,
+    uow: UowDep,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
 ):
-    return await uc_ingest(uow, id_supplier=id_supplier, limit=limit)
+    return uc_list_runs(uow, id_supplier=id_supplier, page=page, page_size=page_size)
+
+
+@router.get("/{id_run}", response_model=FeedRunOut)
+def get_run(id_run: int, uow: UowDep):
+    return uc_get_run(uow, id_run=id_run)
@@ -29,6 +29,43 @@ class Settings(BaseSettings):
     JWT_REFRESH_EXPIRE_MIN: int = 43200
     # Feed
     FEED_DOWNLOAD_TIMEOUT: int = 60
+    FEED_SPOOL_MAX_MEMORY_BYTES: int = 8 * 1024 * 1024  # acima disto o download vai para disco
+    FEED_SPOOL_DIR: str | None = None  # None → diretoria temporária do sistema
+    # Cliente HTTP partilhado dos downloads (aberto no lifespan da API / no worker)
+    FEED_HTTP_CONNECT_TIMEOUT_S: float = 10.0
+    FEED_HTTP_POOL_TIMEOUT_S: float = 30.0  # espera por uma ligação livre do pool
+    FEED_HTTP_MAX_CONNECTIONS: int = 20
+    FEED_HTTP_MAX_PER_HOST: int = 4  # pedidos em simultâneo por host
+    FEED_HTTP_KEEPALIVE_S: float = 30.0
+    FEED_HTTP2: bool = False  # requer o pacote "h2"; sem ele fica HTTP/1.1
+    FEED_DOWNLOAD_RETRIES: int = 3  # novas tentativas em falhas transitórias (rede, 5xx, 429)
+    FEED_DOWNLOAD_BACKOFF_S: float = (
+        2.0  # espera antes da 1.ª nova tentativa (duplica a cada falha)
+    )
+    FEED_DOWNLOAD_BACKOFF_MAX_S: float = 60.0
+    # Sessões FTP reutilizadas entre feeds do mesmo servidor (por processo)
+    FEED_FTP_KEEPALIVE_S: float = 60.0  # sessão inativa há mais tempo é fechada
+    FEED_FTP_MAX_IDLE_PER_HOST: int = 2
+    # Ingest
+    INGEST_MODE: Literal["row", "bulk"] = "row"
+    INGEST_COPY_BATCH_ROWS: int = 10_000
+    INGEST_PRODUCT_INSERT_BATCH: int = 500  # modo row: produtos novos por INSERT
+    INGEST_MAX_CONCURRENT_JOBS: int = 2  # jobs de ingest em simultâneo (restantes ficam em fila)
+    INGEST_PROGRESS_INTERVAL_S: float = 2.0  # intervalo mínimo entre escritas de progresso da run
+    INGEST_HTTP_CONDITIONAL: bool = True  # If-None-Match/If-Modified-Since; 304 → run "unchanged"
+    INGEST_SKIP_SAME_PAYLOAD: bool = True  # SHA-256 igual à última run (mesmo mapper) → "unchanged"
+    INGEST_MAP_WORKERS: int = 0  # processos de mapping por run (0/1 = no próprio processo)
+    INGEST_MAP_CHUNK_ROWS: int = 2_000  # linhas por chunk (lote colunar / envio a cada processo)
+    INGEST_MAP_COLUMNAR: bool = True  # mapping por lote coluna a coluna (False = map_row por linha)
+    INGEST_DELTA: bool = True  # só linhas alteradas vs snapshot da última run completa do feed
+    INGEST_SNAPSHOT_DIR: str | None = None  # None → <tmp>/gsm_snapshots
+    INGEST_DELTA_MAX_AGE_H: float = 24.0  # snapshot mais antigo → run completa (ressincroniza)
+    # Worker (apps/worker_main.py)
+    WORKER_INGEST_INTERVAL_MIN: int = (
+        60  # cadência por feed (override: extra_json.ingest_interval_min)
+    )
+    WORKER_INGEST_JITTER_S: int = 120  # jitter de cada disparo (espalha feeds/réplicas)
+    WORKER_FEEDS_REFRESH_S: int = 300  # de quanto em quanto tempo relê os feeds ativos
     # Prestashop
     PS_AUTH_VALIDATE_URL: str
     PS_GENESYS_KEY: str
@@ -9,6 +9,7 @@ import unicodedata
 from contextlib import suppress
 from collections.abc import Iterable
 from decimal import Decimal, InvalidOperation
+from functools import lru_cache
 from typing import Any
 
 _WS_RE = re.compile(r"\s+")
@@ -16,6 +17,18 @@ _TAG_RE = re.compile(r"<[^>]+>")
 _SEP_RE = re.compile(r"[,\|\s]+")
 _SYMBOLS_RE = re.compile(r"[®™©]+")
 _SPACES_RE = re.compile(r"\s+")
+_NON_NUMERIC_RE = re.compile(r"[^0-9\.-]")
+# numerais ASCII "limpos" (ex.: "12", "-3", "39.99"): o parse completo devolveria o mesmo
+_PLAIN_DECIMAL_RE = re.compile(r"-?[0-9]+(?:\.[0-9]+)?")
+_PLAIN_INT_RE = re.compile(r"-?[0-9]+")
+
+# Preços/stocks repetem-se muito nos feeds: parse memoizado por string de entrada.
+_NUM_CACHE_SIZE = 65_536
+_NUM_CACHE_MAX_LEN = 64  # strings maiores não entram na cache
+
+# Tamanho máximo dos nomes guardados (normalize_simple/normalize_key_ci nos repos e no ingest)
+BRAND_NAME_MAX_LEN = 200
+CATEGORY_NAME_MAX_LEN = 300
 
 
 def as_str(x: Any) -> str | None:
@@ -58,14 +71,14 @@ def _normalize_decimal_string(txt: str) -> str:
             s = s.replace(",", "")
     else:
         s = s.replace(",", ".")
-    s = re.sub(r"[^0-9\.-]", "", s).replace("--", "-")
+    s = _NON_NUMERIC_RE.sub("", s).replace("--", "-")
     return s
 
 
-def to_decimal(x: Any) -> Decimal | None:
-    if x is None or x == "":
-        return None
-    s = clean_text(x)
+def _parse_decimal(txt: str) -> Decimal | None:
+    if _PLAIN_DECIMAL_RE.fullmatch(txt):
+        return Decimal(txt)
+    s = clean_text(txt)
     if not s:
         return None
     s = _normalize_decimal_string(s)
@@ -77,7 +90,41 @@ def to_decimal(x: Any) -> Decimal | None:
         return None
 
 
+@lru_cache(maxsize=_NUM_CACHE_SIZE)
+def _parse_decimal_cached(txt: str) -> Decimal | None:
+    return _parse_decimal(txt)
+
+
+@lru_cache(maxsize=_NUM_CACHE_SIZE)
+def _parse_decimal_str_cached(txt: str) -> str | None:
+    d = _parse_decimal(txt)
+    return format(d, "f") if d is not None else None
+
+
+@lru_cache(maxsize=_NUM_CACHE_SIZE)
+def _parse_int_cached(txt: str) -> int | None:
+    if _PLAIN_INT_RE.fullmatch(txt):
+        return int(txt)
+    d = _parse_decimal(txt)
+    if d is None:
+        return None
+    return int(d) if d == d.to_integral_value() else None
+
+
+def to_decimal(x: Any) -> Decimal | None:
+    if x is None or x == "":
+        return None
+    s = as_str(x)
+    if len(s) > _NUM_CACHE_MAX_LEN:
+        return _parse_decimal(s)
+    return _parse_decimal_cached(s)
+
+
 def to_decimal_str(x: Any, places: int | None = None) -> str | None:
+    if places is None and x is not None and x != "":
+        s = as_str(x)
+        if len(s) <= _NUM_CACHE_MAX_LEN:
+            return _parse_decimal_str_cached(s)
     d = to_decimal(x)
     if d is None:
         return None
@@ -101,7 +148,10 @@ def to_int(x: Any) -> int | None:
             return int(d) if d == d.to_integral_value() else None
         except Exception:
             return int(x)
-    d = to_decimal(x)
+    s = as_str(x)
+    if len(s) <= _NUM_CACHE_MAX_LEN:
+        return _parse_int_cached(s)
+    d = _parse_decimal(s)
     if d is None:
         return None
     return int(d) if d == d.to_integral_value() else None
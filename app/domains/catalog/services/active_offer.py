@@ -1,11 +1,17 @@
 # app/domains/catalog/services/active_offer.py
 from __future__ import annotations
 
+from collections.abc import Iterable
 from dataclasses import dataclass
+from typing import Any
 
 from sqlalchemy.orm import Session
 
+from app.infra.base import utcnow
 from app.models.product_active_offer import ProductActiveOffer
+from app.repositories.catalog.read.product_active_offer_read_repo import (
+    ProductActiveOfferReadRepository,
+)
 from app.repositories.catalog.read.products_read_repo import ProductsReadRepository
 from app.repositories.catalog.write.product_active_offer_write_repo import (
     ProductActiveOfferWriteRepository,
@@ -15,6 +21,11 @@ from app.repositories.procurement.read.supplier_item_read_repo import (
 )
 
 
+ACTIVE_OFFER_BATCH = 2000  # produtos por lote no recálculo em massa
+
+_SNAPSHOT_KEYS = ("id_supplier", "id_supplier_item", "unit_price_sent", "stock_sent")
+
+
 @dataclass
 class ActiveOfferCandidate:
     id_supplier: int
@@ -23,6 +34,41 @@ class ActiveOfferCandidate:
     stock: int
 
 
+@dataclass
+class ActiveOfferSnapshot:
+    """
+    Oferta ativa calculada em lote. Tem os mesmos atributos que ProductActiveOffer
+    usados por sync_events/CatalogUpdateStream, para poder ser passada no lugar dele.
+    """
+
+    id_product: int
+    id_supplier: int | None
+    id_supplier_item: int | None
+    unit_cost: float | None
+    unit_price_sent: float | None
+    stock_sent: int
+
+
+@dataclass
+class ActiveOfferRecalc:
+    id_product: int
+    prev_snapshot: dict[str, Any] | None  # None → ainda não havia ProductActiveOffer
+    active_offer: ActiveOfferSnapshot
+
+    @property
+    def changed(self) -> bool:
+        """Mesma regra de short-circuit do emit_product_state_event."""
+        if self.prev_snapshot is None:
+            return True
+        current = {
+            "id_supplier": self.active_offer.id_supplier,
+            "id_supplier_item": self.active_offer.id_supplier_item,
+            "unit_price_sent": self.active_offer.unit_price_sent,
+            "stock_sent": int(self.active_offer.stock_sent or 0),
+        }
+        return any(self.prev_snapshot.get(k) != current[k] for k in _SNAPSHOT_KEYS)
+
+
 def _get(obj, key: str):
     """
     Helper para lidar tanto com dicts como com ORM objects/row mappings.
@@ -167,3 +213,90 @@ def recalculate_active_offer_for_product(
     )
 
     return entity
+
+
+def recalculate_active_offers_for_products(
+    db: Session,
+    *,
+    product_ids: Iterable[int],
+    only_linked: bool = False,
+    batch_size: int = ACTIVE_OFFER_BATCH,
+) -> list[ActiveOfferRecalc]:
+    """
+    Versão em lote de recalculate_active_offer_for_product.
+
+    Por lote de produtos: margens (1 query), snapshots anteriores (1 query),
+    oferta vencedora via DISTINCT ON (1 query) e upsert de products_active_offers
+    (1 statement). Preço com margem calculado em Python, como no caminho unitário.
+
+    only_linked=True → só produtos com id_ecommerce (os únicos que emitem eventos).
+    Devolve before/after por produto para a emissão de eventos.
+    """
+    ids = sorted({int(x) for x in product_ids if x})
+    if not ids:
+        return []
+
+    p_repo = ProductsReadRepository(db)
+    pao_r = ProductActiveOfferReadRepository(db)
+    pao_w = ProductActiveOfferWriteRepository(db)
+    si_repo = SupplierItemReadRepository(db)
+
+    out: list[ActiveOfferRecalc] = []
+    step = max(1, int(batch_size))
+
+    for start in range(0, len(ids), step):
+        margins = p_repo.map_margins(ids[start : start + step], only_linked=only_linked)
+        if not margins:
+            continue
+
+        chunk = list(margins)
+        prev = pao_r.snapshots_for_products(chunk)
+        best = si_repo.best_offers_for_products(chunk)
+        now = utcnow()
+
+        rows: list[dict[str, Any]] = []
+        for id_product in chunk:
+            offer = best.get(id_product)
+            if offer is None:
+                snap = ActiveOfferSnapshot(
+                    id_product=id_product,
+                    id_supplier=None,
+                    id_supplier_item=None,
+                    unit_cost=None,
+                    unit_price_sent=None,
+                    stock_sent=0,
+                )
+            else:
+                unit_cost = float(offer.price)
+                snap = ActiveOfferSnapshot(
+                    id_product=id_product,
+                    id_supplier=int(offer.id_supplier),
+                    # como no caminho unitário (list_offers_for_product não traz o id do item)
+                    id_supplier_item=None,
+                    unit_cost=unit_cost,
+                    unit_price_sent=round(unit_cost * (1 + margins[id_product]), 2),
+                    stock_sent=int(offer.stock),
+                )
+
+            rows.append(
+                {
+                    "id_product": id_product,
+                    "id_supplier": snap.id_supplier,
+                    "id_supplier_item": snap.id_supplier_item,
+                    "unit_cost": snap.unit_cost,
+                    "unit_price_sent": snap.unit_price_sent,
+                    "stock_sent": snap.stock_sent,
+                    "synced_at": now,
+                }
+            )
+            out.append(
+                ActiveOfferRecalc(
+                    id_product=id_product,
+                    prev_snapshot=prev.get(id_product),
+                    active_offer=snap,
+                )
+            )
+
+        pao_w.upsert_many(rows)
+
+    return out
@@ -0,0 +1,214 @@
+# app/domains/catalog/services/product_key_index.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.core.errors import InvalidArgument
+from app.core.normalize import normalize_key_ci
+from app.repositories.catalog.read.brand_read_repo import BrandsReadRepository, MAX_NAME_LEN
+from app.repositories.catalog.read.products_read_repo import ProductsReadRepository
+from app.repositories.catalog.write.brand_write_repo import BrandsWriteRepository
+from app.repositories.catalog.write.product_write_repo import ProductWriteRepository
+
+
+@dataclass(eq=False)
+class PendingProduct:
+    """
+    Produto novo ainda não inserido (aguarda flush() do índice).
+    As chaves podem ser completadas por linhas seguintes antes do INSERT,
+    tal como o fill_canonicals_if_empty faria num produto já existente.
+    """
+
+    gtin: str | None
+    id_brand: int | None
+    partnumber: str | None
+    margin: float
+    id: int | None = None
+
+
+class ProductKeyIndex:
+    """
+    Índice em memória, por run, das chaves de produto:
+      - gtin → id_product
+      - (id_brand, partnumber) → id_product
+      - nome de marca (CI) → id_brand
+
+    Carregado com uma query em stream (load); a resolução é feita em memória
+    e os produtos novos são inseridos em lote (flush), atualizando o índice.
+    Mesma ordem de decisão do ProductWriteRepository.get_or_create:
+    gtin → brand+mpn → criar.
+    """
+
+    def __init__(self, db: Session, *, default_margin: float | None) -> None:
+        self.db = db
+        self.default_margin = float(default_margin or 0.0)
+        self._by_gtin: dict[str, int | PendingProduct] = {}
+        self._by_brand_mpn: dict[tuple[int, str], int | PendingProduct] = {}
+        self._brands: dict[str, int] = {}
+        self._pending: list[PendingProduct] = []
+
+    def load(self) -> int:
+        """
+        Preenche o índice a partir da BD (1 query de produtos + 1 de marcas).
+        Devolve o nº de produtos indexados.
+        """
+        self._brands = BrandsReadRepository(self.db).map_ids_by_key()
+        n = 0
+        for id_product, gtin, id_brand, partnumber in ProductsReadRepository(self.db).iter_keys():
+            self._register(id_product, gtin=gtin, id_brand=id_brand, partnumber=partnumber)
+            n += 1
+        return n
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    # -------------------- resolução --------------------
+
+    def brand_id(self, brand_name: str) -> int:
+        """
+        id_brand a partir da cache; em falta cria/obtém via BrandsWriteRepository.
+        """
+        key = normalize_key_ci(brand_name, MAX_NAME_LEN)
+        if not key:
+            raise InvalidArgument("Brand name is empty")
+        id_brand = self._brands.get(key)
+        if id_brand is None:
+            id_brand = BrandsWriteRepository(self.db).get_or_create(brand_name).id
+            self._brands[key] = id_brand
+        return id_brand
+
+    def resolve(
+        self,
+        *,
+        gtin: str | None,
+        partnumber: str | None,
+        brand_name: str | None,
+    ) -> int | PendingProduct:
+        """
+        Devolve o id do produto existente ou um PendingProduct (novo, a inserir no flush).
+        Levanta InvalidArgument se a linha não tiver chave (gtin ou brand+mpn).
+        """
+        if gtin:
+            hit = self._by_gtin.get(gtin)
+            if hit is not None:
+                if isinstance(hit, PendingProduct):
+                    self._complete_pending(hit, partnumber=partnumber, brand_name=brand_name)
+                return hit
+
+        id_brand = self.brand_id(brand_name) if brand_name else None
+
+        if id_brand and partnumber:
+            hit = self._by_brand_mpn.get((id_brand, partnumber))
+            if hit is not None:
+                if isinstance(hit, PendingProduct) and gtin and not hit.gtin:
+                    hit.gtin = gtin
+                    self._by_gtin.setdefault(gtin, hit)
+                return hit
+
+        if not gtin and not (id_brand and partnumber):
+            raise InvalidArgument("Missing product key (gtin or brand+mpn)")
+
+        pending = PendingProduct(
+            gtin=gtin,
+            id_brand=id_brand,
+            partnumber=partnumber,
+            margin=self.default_margin,
+        )
+        self._pending.append(pending)
+        self._register(pending, gtin=gtin, id_brand=id_brand, partnumber=partnumber)
+        return pending
+
+    def observe(self, id_product: int, *, gtin: Any, id_brand: Any, partnumber: Any) -> None:
+        """
+        Regista as chaves atuais de um produto (ex.: depois de fills que preencheram gtin/mpn).
+        """
+        self._register(id_product, gtin=gtin, id_brand=id_brand, partnumber=partnumber)
+
+    # -------------------- escrita em lote --------------------
+
+    def flush(self) -> list[PendingProduct]:
+        """
+        Insere os PendingProduct acumulados num único INSERT e atribui os ids.
+        Em conflito (produto criado entretanto por outra run) faz lookup pontual.
+        Devolve os pendentes processados (id None → não foi possível resolver).
+        """
+        pending, self._pending = self._pending, []
+        if not pending:
+            return []
+
+        prod_w = ProductWriteRepository(self.db)
+        inserted = prod_w.insert_many(
+            [
+                {
+                    "gtin": p.gtin,
+                    "id_brand": p.id_brand,
+                    "partnumber": p.partnumber,
+                    "margin": p.margin,
+                }
+                for p in pending
+            ]
+        )
+        ids_by_gtin: dict[str, int] = {}
+        ids_by_brand_mpn: dict[tuple[int, str], int] = {}
+        for id_product, gtin, id_brand, partnumber in inserted:
+            if gtin:
+                ids_by_gtin[gtin] = id_product
+            elif id_brand and partnumber:
+                ids_by_brand_mpn[(id_brand, partnumber)] = id_product
+
+        for p in pending:
+            if p.gtin:
+                p.id = ids_by_gtin.get(p.gtin)
+            elif p.id_brand and p.partnumber:
+                p.id = ids_by_brand_mpn.get((p.id_brand, p.partnumber))
+
+            if p.id is None:
+                # corrida: outra run inseriu a mesma chave entre o load e o flush
+                existing = prod_w.get_by_gtin(p.gtin) if p.gtin else None
+                if existing is None and p.id_brand and p.partnumber:
+                    existing = prod_w.get_by_brand_mpn(p.id_brand, p.partnumber)
+                p.id = existing.id if existing is not None else None
+
+            if p.id is not None:
+                self._register(p.id, gtin=p.gtin, id_brand=p.id_brand, partnumber=p.partnumber)
+
+        return pending
+
+    # -------------------- internos --------------------
+
+    def _complete_pending(
+        self, p: PendingProduct, *, partnumber: str | None, brand_name: str | None
+    ) -> None:
+        new_pn = p.partnumber or partnumber or None
+        new_brand = p.id_brand or (self.brand_id(brand_name) if brand_name else None)
+        if (new_pn, new_brand) == (p.partnumber, p.id_brand):
+            return
+        if new_brand and new_pn:
+            taken = self._by_brand_mpn.get((new_brand, new_pn))
+            if taken is not None and taken is not p:
+                # brand+mpn já pertence a outro produto: não completar (evita violar o unique)
+                return
+            self._by_brand_mpn[(new_brand, new_pn)] = p
+        p.partnumber, p.id_brand = new_pn, new_brand
+
+    def _register(
+        self,
+        ref: int | PendingProduct,
+        *,
+        gtin: Any,
+        id_brand: Any,
+        partnumber: Any,
+    ) -> None:
+        if gtin:
+            cur = self._by_gtin.get(gtin)
+            if cur is None or cur is ref or (isinstance(cur, PendingProduct) and cur.id == ref):
+                self._by_gtin[gtin] = ref
+        if id_brand and partnumber:
+            key = (int(id_brand), str(partnumber))
+            cur = self._by_brand_mpn.get(key)
+            if cur is None or cur is ref or (isinstance(cur, PendingProduct) and cur.id == ref):
+                self._by_brand_mpn[key] = ref
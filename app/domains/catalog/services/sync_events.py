@@ -2,10 +2,11 @@
 from __future__ import annotations
 
 from typing import Any
-from collections.abc import Mapping
+from collections.abc import Mapping, Sequence
 
 from sqlalchemy.orm import Session
 
+from app.domains.catalog.services.active_offer import ActiveOfferSnapshot
 from app.models.product import Product
 from app.models.product_active_offer import ProductActiveOffer
 from app.repositories.catalog.write.catalog_update_stream_write_repo import (
@@ -13,7 +14,7 @@ from app.repositories.catalog.write.catalog_update_stream_write_repo import (
 )
 
 
-def _snapshot_active_offer(ao: ProductActiveOffer | None) -> dict[str, Any]:
+def _snapshot_active_offer(ao: ProductActiveOffer | ActiveOfferSnapshot | None) -> dict[str, Any]:
     """
     Normaliza a oferta ativa para um dict estável, focado nos campos
     relevantes para o PrestaShop.
@@ -34,29 +35,14 @@ def _snapshot_active_offer(ao: ProductActiveOffer | None) -> dict[str, Any]:
     }
 
 
-def emit_product_state_event(
-    db: Session,
-    *,
-    product: Product,
-    active_offer: ProductActiveOffer | None,
-    reason: str,
-    prev_active_snapshot: Mapping[str, Any] | None = None,
-) -> None:
+def _state_event_priority(
+    current: Mapping[str, Any],
+    prev_active_snapshot: Mapping[str, Any] | None,
+) -> int | None:
     """
-    Enfileira um evento de `product_state_changed` **apenas** se o estado
-    efetivo da oferta comunicada tiver mudado (fornecedor, preço enviado, stock).
-
-    - Se não houver id_ecommerce -> não faz nada.
-    - Se o snapshot anterior == snapshot atual -> não faz nada.
-    - Caso contrário -> enfileira no CatalogUpdateStream com prioridade
-      baseada em transição de stock.
+    Prioridade do evento com base na transição de stock, ou None se o snapshot
+    efetivo (fornecedor, item, preço enviado, stock) não mudou.
     """
-    # Só faz sentido emitir para produtos ligados ao PrestaShop
-    if not product.id_ecommerce or product.id_ecommerce <= 0:
-        return
-
-    current = _snapshot_active_offer(active_offer)
-
     # --- short-circuit: nada mudou, nada a emitir ---
     if prev_active_snapshot is not None:
         keys = ("id_supplier", "id_supplier_item", "unit_price_sent", "stock_sent")
@@ -66,7 +52,7 @@ def emit_product_state_event(
         if prev_norm == curr_norm:
             # Exatamente o que estás a ver nos teus exemplos:
             # 1) e 2) têm supplier, preço enviado e stock iguais → não enfileiramos.
-            return
+            return None
 
     # --- prioridade com base em transição de stock ---
     old_stock = None
@@ -92,6 +78,34 @@ def emit_product_state_event(
             # ficou sem stock
             priority = 7
 
+    return priority
+
+
+def emit_product_state_event(
+    db: Session,
+    *,
+    product: Product,
+    active_offer: ProductActiveOffer | ActiveOfferSnapshot | None,
+    reason: str,
+    prev_active_snapshot: Mapping[str, Any] | None = None,
+) -> None:
+    """
+    Enfileira um evento de `product_state_changed` **apenas** se o estado
+    efetivo da oferta comunicada tiver mudado (fornecedor, preço enviado, stock).
+
+    - Se não houver id_ecommerce -> não faz nada.
+    - Se o snapshot anterior == snapshot atual -> não faz nada.
+    - Caso contrário -> enfileira no CatalogUpdateStream com prioridade
+      baseada em transição de stock.
+    """
+    # Só faz sentido emitir para produtos ligados ao PrestaShop
+    if not product.id_ecommerce or product.id_ecommerce <= 0:
+        return
+
+    priority = _state_event_priority(_snapshot_active_offer(active_offer), prev_active_snapshot)
+    if priority is None:
+        return
+
     repo = CatalogUpdateStreamWriteRepository(db)
     repo.enqueue_product_state_change(
         product=product,
@@ -99,3 +113,30 @@ def emit_product_state_event(
         reason=reason,
         priority=priority,
     )
+
+
+def emit_product_state_events(
+    db: Session,
+    items: Sequence[tuple[Product, ProductActiveOffer | ActiveOfferSnapshot | None, Any]],
+    *,
+    reason: str,
+) -> int:
+    """
+    Versão em lote de emit_product_state_event: items = (product, active_offer,
+    prev_active_snapshot). Mesmas regras (id_ecommerce, short-circuit, prioridade);
+    o enqueue é feito com um INSERT ... ON CONFLICT por lote. Devolve quantos enfileirou.
+    """
+    batch: list[tuple[Product, Any, int]] = []
+    for product, active_offer, prev_active_snapshot in items:
+        if not product.id_ecommerce or product.id_ecommerce <= 0:
+            continue
+        priority = _state_event_priority(_snapshot_active_offer(active_offer), prev_active_snapshot)
+        if priority is None:
+            continue
+        batch.append((product, active_offer, priority))
+
+    if not batch:
+        return 0
+
+    repo = CatalogUpdateStreamWriteRepository(db)
+    return repo.enqueue_product_state_changes(batch, reason=reason)
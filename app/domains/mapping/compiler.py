@@ -0,0 +1,508 @@
+# app/domains/mapping/compiler.py
+# Compila o perfil de um IngestEngine numa cadeia de closures (uma vez por run)
+# e numa variante colunar que mapeia um lote de linhas de uma vez.
+
+from __future__ import annotations
+
+import operator
+import re
+from collections.abc import Callable, Sequence
+from typing import TYPE_CHECKING, Any
+
+from app.core.normalize import clean_text, to_decimal_str, to_int
+from app.domains.mapping.engine import _OPS, JSON, _empty, _is_ref, _to_float
+
+if TYPE_CHECKING:
+    from app.domains.mapping.engine import IngestEngine
+
+Getter = Callable[[JSON, JSON], Any]
+Cond = Callable[[JSON, JSON], bool]
+Step = Callable[[JSON, JSON], None]
+Mapped = tuple[JSON | None, str | None]
+RowMapper = Callable[[JSON], Mapped]
+RowTail = Callable[[JSON, JSON], Mapped]
+Column = list[Any]
+ColumnOp = Callable[[Column], Column]
+BatchMapper = Callable[[Sequence[JSON]], list[Mapped]]
+
+
+class _ProfileCompiler:
+    """
+    Mesma semântica do IngestEngine.map_row, mas com o perfil resolvido uma vez:
+    - opções de cada campo lidas no compile (só ficam os passos configurados);
+    - tokens "$ref" viram getters (mapped → raw → source do campo);
+    - operandos constantes pré-calculados (float/texto), regex compiladas,
+      listas do "in" congeladas em frozenset.
+    Estruturas inválidas (ex.: condição com várias chaves) delegam no
+    interpretador do engine, para falharem exatamente como antes.
+    """
+
+    def __init__(self, engine: IngestEngine) -> None:
+        self.engine = engine
+
+    # -------------------- tokens --------------------
+
+    def token(self, token: Any) -> Getter:
+        if not _is_ref(token):
+            return lambda mapped, raw: token
+
+        name = str(token)[1:]
+        src = self.engine._field_sources.get(name)
+
+        def get(mapped: JSON, raw: JSON) -> Any:
+            if name in mapped:
+                return mapped.get(name)
+            if name in raw:
+                return raw.get(name)
+            return raw.get(src) if src else None
+
+        return get
+
+    # -------------------- condições --------------------
+
+    def cond(self, cond: Any) -> Cond:
+        if not isinstance(cond, dict) or not cond:
+            return lambda mapped, raw: False
+
+        if "and" in cond or "or" in cond:
+            key = "and" if "and" in cond else "or"
+            items = cond[key] if isinstance(cond[key], list) else [cond[key]]
+            parts = tuple(self.cond(c) for c in items)
+            if key == "and":
+                return lambda mapped, raw: all(p(mapped, raw) for p in parts)
+            return lambda mapped, raw: any(p(mapped, raw) for p in parts)
+
+        if len(cond) != 1:
+            # o interpretador rebenta (unpack) em cada linha: manter
+            return lambda mapped, raw: self.engine._eval_condition(cond, mapped, raw)
+
+        ((op, args),) = cond.items()
+        op = str(op).lower()
+
+        if op == "empty_any_of":
+            getters = tuple(self.token(i) for i in (args if isinstance(args, list) else [args]))
+            return lambda mapped, raw: any(_empty(g(mapped, raw)) for g in getters)
+
+        fn = _OPS.get(op)
+        if not fn or not isinstance(args, list) or len(args) != 2:
+            return lambda mapped, raw: False
+
+        get_a = self.token(args[0])
+        if _is_ref(args[1]):
+            get_b = self.token(args[1])
+            return lambda mapped, raw: fn(get_a(mapped, raw), get_b(mapped, raw))
+        return self._binary_const(op, get_a, args[1])
+
+    def _binary_const(self, op: str, get_a: Getter, b: Any) -> Cond:
+        """
+        Operador com 2.º operando constante: tudo o que depende só de b é calculado aqui.
+        """
+        if op in ("eq", "ne"):
+            fb = _to_float(b)
+            tb = clean_text(b) or ""
+            negate = op == "ne"
+
+            def eq(mapped: JSON, raw: JSON) -> bool:
+                a = get_a(mapped, raw)
+                if fb is not None:
+                    fa = _to_float(a)
+                    if fa is not None:
+                        return (fa == fb) != negate
+                return ((clean_text(a) or "") == tb) != negate
+
+            return eq
+
+        if op in ("gt", "gte", "lt", "lte"):
+            fb = _to_float(b)
+            if fb is None:
+                return lambda mapped, raw: False
+            cmp = {
+                "gt": operator.gt,
+                "gte": operator.ge,
+                "lt": operator.lt,
+                "lte": operator.le,
+            }[op]
+
+            def compare(mapped: JSON, raw: JSON) -> bool:
+                fa = _to_float(get_a(mapped, raw))
+                return fa is not None and cmp(fa, fb)
+
+            return compare
+
+        if op == "contains":
+            sb = str(b)
+            return lambda mapped, raw: sb in str(get_a(mapped, raw))
+        if op == "startswith":
+            sb = str(b)
+            return lambda mapped, raw: str(get_a(mapped, raw)).startswith(sb)
+        if op == "endswith":
+            sb = str(b)
+            return lambda mapped, raw: str(get_a(mapped, raw)).endswith(sb)
+
+        if op == "regex":
+            try:
+                search = re.compile(str(b)).search
+            except re.error:
+                return lambda mapped, raw: False
+            return lambda mapped, raw: search(str(get_a(mapped, raw))) is not None
+
+        if op == "in":
+            if isinstance(b, list):
+                members = frozenset(str(x) for x in b)
+            else:
+                members = frozenset(s.strip() for s in str(b).split(","))
+            return lambda mapped, raw: str(get_a(mapped, raw)) in members
+
+        fn = _OPS[op]
+        return lambda mapped, raw: fn(get_a(mapped, raw), b)
+
+    def all_of(self, conds: Any) -> Cond:
+        if not isinstance(conds, list):
+            conds = [conds]
+        parts = tuple(self.cond(c) for c in conds)
+        if len(parts) == 1:
+            return parts[0]
+        return lambda mapped, raw: all(p(mapped, raw) for p in parts)
+
+    # -------------------- campos --------------------
+
+    def field(self, target: str, cfg: JSON) -> Step | None:
+        """
+        Passo de transformação de um campo; None se não houver nada a fazer
+        (o interpretador limitava-se a reescrever o mesmo valor).
+        """
+        has_source = bool(cfg.get("source") or cfg.get("from"))
+        value_fn = _compose(self._value_ops(cfg))
+
+        derive = _derive_of(cfg)
+        if derive is None:
+            if value_fn is None:
+                return None
+            if has_source:
+                # com source a chave já existe em mapped
+                def apply_source(mapped: JSON, raw: JSON) -> None:
+                    mapped[target] = value_fn(mapped[target])
+
+                return apply_source
+
+            def apply_present(mapped: JSON, raw: JSON) -> None:
+                if target in mapped:
+                    mapped[target] = value_fn(mapped[target])
+
+            return apply_present
+
+        when = self.all_of(derive.get("when") or [])
+        then = self.token(derive.get("then"))
+        has_else = "else" in derive
+        otherwise = self.token(derive.get("else"))
+        resolve_value = self.engine._resolve_token
+
+        def apply_derive(mapped: JSON, raw: JSON) -> None:
+            if not has_source and target not in mapped:
+                return
+            if when(mapped, raw):
+                mapped[target] = then(mapped, raw)
+            elif has_else:
+                mapped[target] = otherwise(mapped, raw)
+            else:
+                # sem "else" o valor atual é resolvido como token (pode ser "$ref")
+                v = mapped.get(target)
+                if value_fn is not None:
+                    v = value_fn(v)
+                mapped[target] = resolve_value(v, mapped, raw)
+
+        return apply_derive
+
+    @staticmethod
+    def _value_ops(cfg: JSON) -> list[Callable[[Any], Any]]:
+        """
+        Transformações que só dependem do valor (trim/lower/upper, to_number, value_map).
+        """
+        ops: list[Callable[[Any], Any]] = []
+
+        methods = tuple(
+            m
+            for key, m in (("trim", str.strip), ("lowercase", str.lower), ("uppercase", str.upper))
+            if cfg.get(key)
+        )
+        if methods:
+
+            def text_ops(v: Any) -> Any:
+                if isinstance(v, str):
+                    for m in methods:
+                        v = m(v)
+                return v
+
+            ops.append(text_ops)
+
+        to_num = cfg.get("to_number")
+        if isinstance(to_num, dict):
+            dec = to_num.get("decimal") or "."
+            thou = to_num.get("thousands") or ""
+
+            def to_number(v: Any) -> Any:
+                if not isinstance(v, str | int | float):
+                    return v
+                s = str(v)
+                if thou:
+                    s = s.replace(thou, "")
+                if dec != ".":
+                    s = s.replace(dec, ".")
+                return s
+
+            ops.append(to_number)
+
+        vmap = cfg.get("value_map")
+        if isinstance(vmap, dict):
+
+            def value_map(v: Any) -> Any:
+                return vmap.get("" if v is None else str(v), v)
+
+            ops.append(value_map)
+
+        return ops
+
+    @staticmethod
+    def _column_ops(cfg: JSON) -> list[ColumnOp]:
+        """
+        Mesmas transformações do _value_ops, aplicadas a uma coluna inteira.
+        """
+        ops: list[ColumnOp] = []
+
+        for key, m in (("trim", str.strip), ("lowercase", str.lower), ("uppercase", str.upper)):
+            if cfg.get(key):
+                ops.append(lambda col, m=m: [m(v) if isinstance(v, str) else v for v in col])
+
+        to_num = cfg.get("to_number")
+        if isinstance(to_num, dict):
+            dec = to_num.get("decimal") or "."
+            thou = to_num.get("thousands") or ""
+
+            def to_number(col: Column) -> Column:
+                out = [str(v) if isinstance(v, str | int | float) else v for v in col]
+                if thou:
+                    out = [v.replace(thou, "") if isinstance(v, str) else v for v in out]
+                if dec != ".":
+                    out = [v.replace(dec, ".") if isinstance(v, str) else v for v in out]
+                return out
+
+            ops.append(to_number)
+
+        vmap = cfg.get("value_map")
+        if isinstance(vmap, dict):
+            get = vmap.get
+            ops.append(lambda col: [get("" if v is None else str(v), v) for v in col])
+
+        return ops
+
+    # -------------------- regras globais --------------------
+
+    def rule(self, rule: Any) -> Step:
+        if not isinstance(rule, dict) or not isinstance(rule.get("set") or {}, dict):
+            # o interpretador rebenta em rule.get(...)/set.items(): manter
+            return lambda mapped, raw: self.engine._apply_rule(rule, mapped, raw)
+
+        when = self.all_of(rule.get("when") or [])
+        sets = tuple(
+            (self.engine._normalize_set_key(k), self.token(v))
+            for k, v in (rule.get("set") or {}).items()
+        )
+
+        def apply(mapped: JSON, raw: JSON) -> None:
+            if when(mapped, raw):
+                for key, get in sets:
+                    mapped[key] = get(mapped, raw)
+
+        return apply
+
+    # -------------------- linha --------------------
+
+    def _row_tail(self, steps: tuple[Step, ...]) -> RowTail:
+        """
+        Resto da linha depois de fontes/defaults: passos, filtros, required e
+        normalização final de gtin/price/stock.
+        """
+        engine = self.engine
+        selector = self.cond(engine.row_selector) if engine.row_selector else None
+        drops = tuple(self.cond(c) for c in engine.drop_if)
+        required = tuple(engine.required)
+
+        def finish(mapped: JSON, raw: JSON) -> Mapped:
+            for step in steps:
+                step(mapped, raw)
+            if selector is not None and not selector(mapped, raw):
+                return None, "row_filtered"
+            for drop in drops:
+                if drop(mapped, raw):
+                    return None, "dropped"
+            for req in required:
+                if _empty(mapped.get(req)):
+                    return None, f"required_missing:{req}"
+            _normalize_row(mapped)
+            return mapped, None
+
+        return finish
+
+    def _fields(self) -> list[tuple[str, JSON]]:
+        return [(t, c) for t, c in self.engine.fields_cfg.items() if isinstance(c, dict)]
+
+    def _sources(self) -> tuple[tuple[str, str], ...]:
+        return tuple(
+            (target, src)
+            for target, cfg in self._fields()
+            if (src := cfg.get("source") or cfg.get("from"))
+        )
+
+    def compile(self) -> RowMapper:
+        sources = self._sources()
+        defaults = tuple(self.engine.defaults.items())
+        steps = tuple(s for t, c in self._fields() if (s := self.field(t, c)) is not None)
+        steps += tuple(self.rule(r) for r in self.engine.rules)
+        finish = self._row_tail(steps)
+
+        def map_row(raw: JSON) -> Mapped:
+            mapped: JSON = {target: raw.get(src) for target, src in sources}
+            for k, v in defaults:
+                if _empty(mapped.get(k)):
+                    mapped[k] = v
+            return finish(mapped, raw)
+
+        return map_row
+
+    # -------------------- lote (colunar) --------------------
+
+    def compile_batch(self) -> BatchMapper:
+        """
+        Mapeia um lote com o estado em colunas (target → lista de valores):
+        fontes, defaults e os campos só com transformações de valor
+        (trim/lower/upper, to_number, value_map) são aplicados coluna a coluna.
+
+        A partir do primeiro campo com derive (ou regras globais) a ordem dos
+        passos passa a importar entre campos: as colunas viram dicts e o resto
+        corre linha a linha, com os mesmos closures do map_row. Sem passos por
+        linha nem filtros, required e normalização final também são colunares
+        e só as linhas aceites viram dict.
+        """
+        engine = self.engine
+        sources = self._sources()
+        defaults = tuple(engine.defaults.items())
+
+        column_steps: list[tuple[str, ColumnOp]] = []
+        row_steps: list[Step] = []
+        for target, cfg in self._fields():
+            if row_steps or _derive_of(cfg) is not None:
+                if (step := self.field(target, cfg)) is not None:
+                    row_steps.append(step)
+            elif (op := _compose(self._column_ops(cfg))) is not None:
+                column_steps.append((target, op))
+        row_steps += [self.rule(r) for r in engine.rules]
+
+        columnar_tail = not row_steps and not engine.row_selector and not engine.drop_if
+        finish = self._row_tail(tuple(row_steps))
+        required = tuple(engine.required)
+
+        def map_batch(rows: Sequence[JSON]) -> list[Mapped]:
+            n = len(rows)
+            cols: dict[str, Column] = {
+                target: [raw.get(src) for raw in rows] for target, src in sources
+            }
+            for k, dv in defaults:
+                col = cols.get(k)
+                if col is None:
+                    cols[k] = [dv] * n
+                else:
+                    cols[k] = [dv if _empty(v) else v for v in col]
+            for target, op in column_steps:
+                col = cols.get(target)
+                if col is not None:
+                    cols[target] = op(col)
+
+            keys = tuple(cols)
+            if not columnar_tail:
+                if not keys:
+                    return [finish({}, raw) for raw in rows]
+                return [
+                    finish(dict(zip(keys, values, strict=True)), raw)
+                    for values, raw in zip(zip(*cols.values(), strict=True), rows, strict=True)
+                ]
+
+            errors: list[str | None] = [None] * n
+            for req in required:
+                col = cols.get(req)
+                err = f"required_missing:{req}"
+                if col is None:
+                    errors = [e or err for e in errors]
+                else:
+                    errors = [
+                        e or (err if _empty(v) else None) for e, v in zip(errors, col, strict=True)
+                    ]
+            for key, norm in _NORMALIZERS:
+                col = cols.get(key)
+                if col is not None:
+                    cols[key] = [
+                        norm(v) if v is not None and e is None else v
+                        for v, e in zip(col, errors, strict=True)
+                    ]
+
+            if not keys:
+                return [({}, None) if e is None else (None, e) for e in errors]
+            return [
+                (dict(zip(keys, values, strict=True)), None) if e is None else (None, e)
+                for values, e in zip(zip(*cols.values(), strict=True), errors, strict=True)
+            ]
+
+        return map_batch
+
+
+def _derive_of(cfg: JSON) -> JSON | None:
+    derive = cfg.get("derive")
+    return derive if isinstance(derive, dict) and derive.get("when") else None
+
+
+def _normalize_stock(v: Any) -> int:
+    s = to_int(v)
+    return max(0, s) if s is not None else 0
+
+
+# normalização final de map_row (só para valores não-None)
+_NORMALIZERS: tuple[tuple[str, Callable[[Any], Any]], ...] = (
+    ("gtin", lambda v: (clean_text(v) or "").strip()),
+    ("price", lambda v: (to_decimal_str(v) or "").strip()),
+    ("stock", _normalize_stock),
+)
+
+
+def _normalize_row(mapped: JSON) -> None:
+    for key, norm in _NORMALIZERS:
+        v = mapped.get(key)
+        if v is not None:
+            mapped[key] = norm(v)
+
+
+def _compose(fns: list[Callable[[Any], Any]]) -> Callable[[Any], Any] | None:
+    if not fns:
+        return None
+    if len(fns) == 1:
+        return fns[0]
+    chain = tuple(fns)
+
+    def composed(v: Any) -> Any:
+        for fn in chain:
+            v = fn(v)
+        return v
+
+    return composed
+
+
+def compile_engine(engine: IngestEngine) -> RowMapper:
+    """
+    Função raw → (mapped, erro) equivalente a engine.map_row_interpreted.
+    """
+    return _ProfileCompiler(engine).compile()
+
+
+def compile_batch(engine: IngestEngine) -> BatchMapper:
+    """
+    Função [raw, ...] → [(mapped, erro), ...] equivalente a map_row linha a linha.
+    """
+    return _ProfileCompiler(engine).compile_batch()
@@ -4,6 +4,7 @@
 from __future__ import annotations
 
 import re
+from collections.abc import Sequence
 from typing import Any
 
 from app.core.normalize import clean_text, to_decimal_str, to_int
@@ -126,6 +127,14 @@ _OPS = {
 
 
 class IngestEngine:
+    """
+    Interpreta um perfil de mapper (fields/defaults/rules/row_selector/drop_if/required).
+
+    map_row usa o perfil compilado (app.domains.mapping.compiler), gerado uma vez
+    no construtor; map_batch é a variante colunar (lote de linhas, mesmo resultado);
+    map_row_interpreted é a implementação de referência.
+    """
+
     def __init__(self, profile: JSON | None):
         self.profile = profile or {}
         raw_fields = self.profile.get("fields") or {}
@@ -162,6 +171,14 @@ class IngestEngine:
         self.row_selector: JSON | None = self.profile.get("row_selector")
         self.defaults: JSON = dict(self.profile.get("defaults") or {})
 
+        from app.domains.mapping.compiler import (  # import tardio (ciclo)
+            compile_batch,
+            compile_engine,
+        )
+
+        self._compiled = compile_engine(self)
+        self._compiled_batch = compile_batch(self)
+
     def _resolve_token(self, token: Any, mapped: JSON, raw: JSON) -> Any:
         if not _is_ref(token):
             return token
@@ -239,19 +256,31 @@ class IngestEngine:
             val = self._resolve_token(chosen, mapped, raw)
         mapped[target] = val
 
+    def _apply_rule(self, rule: JSON, mapped: JSON, raw: JSON) -> None:
+        conds = rule.get("when") or []
+        if not isinstance(conds, list):
+            conds = [conds]
+        if not all(self._eval_condition(c, mapped, raw) for c in conds):
+            return
+        set_ops = rule.get("set") or {}
+        for k, v in set_ops.items():
+            key = self._normalize_set_key(k)
+            mapped[key] = self._resolve_token(v, mapped, raw)
+
     def _apply_global_rules(self, mapped: JSON, raw: JSON) -> None:
         for rule in self.rules:
-            conds = rule.get("when") or []
-            if not isinstance(conds, list):
-                conds = [conds]
-            if not all(self._eval_condition(c, mapped, raw) for c in conds):
-                continue
-            set_ops = rule.get("set") or {}
-            for k, v in set_ops.items():
-                key = self._normalize_set_key(k)
-                mapped[key] = self._resolve_token(v, mapped, raw)
+            self._apply_rule(rule, mapped, raw)
 
     def map_row(self, raw: JSON) -> tuple[JSON | None, str | None]:
+        return self._compiled(raw)
+
+    def map_batch(self, rows: Sequence[JSON]) -> list[tuple[JSON | None, str | None]]:
+        """
+        Mapeia um lote de linhas (mesma ordem/resultado que map_row por linha).
+        """
+        return self._compiled_batch(rows)
+
+    def map_row_interpreted(self, raw: JSON) -> tuple[JSON | None, str | None]:
         mapped: JSON = {}
         for target, cfg in self.fields_cfg.items():
             if isinstance(cfg, dict):
@@ -0,0 +1,91 @@
+# app/domains/procurement/services/ingest_progress.py
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.infra.base import utcnow
+from app.infra.session import SessionLocal
+from app.infra.uow import UoW
+from app.repositories.procurement.write.feed_run_write_repo import FeedRunWriteRepository
+
+log = logging.getLogger("gsm.ingest")
+
+
+class IngestProgress:
+    """
+    Publica o progresso de uma FeedRun (stage + contadores) numa sessão própria,
+    com commit imediato: GET /runs/{id} vê-o enquanto a transação do ingest
+    continua aberta.
+
+    - set_stage() escreve logo; update() no máximo 1x por INGEST_PROGRESS_INTERVAL_S;
+    - a run tem de estar commitada (caso contrário enabled=False → no-op);
+    - falhas de escrita só vão para o log, nunca interrompem o ingest.
+
+    Não chamar depois do finalize_* da sessão principal (a linha fica bloqueada
+    até ao commit dessa sessão).
+    """
+
+    def __init__(
+        self,
+        id_run: int,
+        *,
+        enabled: bool = True,
+        interval_s: float | None = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self.id_run = id_run
+        self.enabled = enabled
+        self.interval_s = float(
+            settings.INGEST_PROGRESS_INTERVAL_S if interval_s is None else interval_s
+        )
+        self._session_factory = session_factory
+        self._last_write = 0.0
+        self.stage: str | None = None
+
+    def set_stage(self, stage: str) -> None:
+        self.stage = stage
+        self._write(stage=stage)
+
+    def start(self, stage: str) -> None:
+        """
+        Início real do ingest de uma run que esteve em fila: started_at passa a
+        ser agora (duração e débito não contam o tempo em fila; ver queued_at).
+        """
+        self.stage = stage
+        self._write(stage=stage, started_at=utcnow())
+
+    def update(
+        self,
+        *,
+        rows: int,
+        ok: int,
+        bad: int,
+        changed: int,
+        force: bool = False,
+    ) -> None:
+        if not self.enabled:
+            return
+        if not force and time.monotonic() - self._last_write < self.interval_s:
+            return
+        self._write(rows_processed=rows, rows_ok=ok, rows_bad=bad, rows_changed=changed)
+
+    def _write(self, **fields: int | str | datetime) -> None:
+        if not self.enabled:
+            return
+        self._last_write = time.monotonic()
+        try:
+            with self._session_factory() as db:
+                uow = UoW(db)
+                # nunca ficar à espera da linha (ex.: bloqueada pela sessão do ingest)
+                db.execute(text("SET LOCAL lock_timeout = '2s'"))
+                FeedRunWriteRepository(db).update_progress(self.id_run, **fields)
+                uow.commit()
+        except Exception as e:
+            log.warning("[run=%s] progress update failed: %s", self.id_run, e)
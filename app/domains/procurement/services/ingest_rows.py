@@ -0,0 +1,314 @@
+# app/domains/procurement/services/ingest_rows.py
+from __future__ import annotations
+
+import hashlib
+import json
+import multiprocessing
+from collections import deque
+from collections.abc import Generator, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Literal
+
+from app.core.normalize import (
+    BRAND_NAME_MAX_LEN,
+    CATEGORY_NAME_MAX_LEN,
+    normalize_images,
+    normalize_key_ci,
+    normalize_simple,
+    to_decimal_str,
+    to_int,
+)
+from app.domains.procurement.services.ingest_timings import StageTimer
+from app.domains.mapping.engine import IngestEngine
+
+CANON_PRODUCT_KEYS = {
+    "gtin",
+    "mpn",
+    "partnumber",
+    "name",
+    "description",
+    "image_url",
+    "image_urls",
+    "category",
+    "weight",
+    "brand",
+}
+CANON_OFFER_KEYS = {"price", "stock", "sku"}
+
+Prepare = Literal["stage", "work"]
+# (nº da linha no feed, linha preparada ou None, erro do mapper)
+MappedRow = tuple[int, Any, str | None]
+
+
+def split_payload(mapped: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any], dict[str, Any]]:
+    """
+    Separa o resultado do mapper em:
+    - product_payload (campos canónicos de produto)
+    - offer_payload   (preço/stock/sku + chaves técnicas)
+    - meta_payload    (resto dos campos, não-canónicos)
+    """
+    out_product = {
+        "gtin": (mapped.get("gtin") or "") or None,
+        "partnumber": (mapped.get("mpn") or mapped.get("partnumber") or "") or None,
+        "name": mapped.get("name"),
+        "description": mapped.get("description"),
+        "image_url": mapped.get("image_url"),
+        "weight_str": mapped.get("weight"),
+    }
+
+    # Preço: normalizar para decimal string “limpa” (39,99 € → "39.99")
+    raw_price = mapped.get("price")
+    price_str = to_decimal_str(raw_price) or "" if raw_price is not None else ""
+
+    # Stock: aguentar porcarias tipo "10+", " 5 ", "N/A" → 10, 5, 0
+    raw_stock = mapped.get("stock")
+    stock_int = to_int(raw_stock)
+    if stock_int is None:
+        stock_int = 0
+
+    out_offer = {
+        "price": price_str,
+        "stock": stock_int,
+        "sku": (mapped.get("sku") or mapped.get("partnumber") or mapped.get("gtin") or "").strip(),
+        "gtin": out_product["gtin"],
+        "partnumber": out_product["partnumber"],
+    }
+
+    used = set(CANON_PRODUCT_KEYS) | set(CANON_OFFER_KEYS)
+    meta = {k: v for k, v in mapped.items() if k not in used and v not in (None, "", [])}
+    return out_product, out_offer, meta
+
+
+@dataclass
+class RowWork:
+    """
+    Linha já mapeada à espera de produto (imediato ou após flush dos produtos novos).
+    """
+
+    idx: int
+    sku: str
+    product_payload: dict[str, Any]
+    offer_payload: dict[str, Any]
+    meta_payload: dict[str, Any]
+    gtin: str | None
+    pn: str | None
+    brand_name: str | None
+    category_name: str | None
+
+
+def prepare_row(idx: int, mapped: dict[str, Any]) -> RowWork:
+    """
+    Linha mapeada → RowWork (modo row): payloads separados, sku com fallback,
+    brand/category normalizados.
+    """
+    product_payload, offer_payload, meta_payload = split_payload(mapped)
+
+    gtin = product_payload.get("gtin") or None
+    pn = product_payload.get("partnumber") or None
+
+    raw_brand_name = mapped.get("brand") or None
+    raw_category_name = mapped.get("category") or None
+
+    return RowWork(
+        idx=idx,
+        sku=(offer_payload["sku"] or str(pn or gtin or f"row-{idx}")).strip(),
+        product_payload=product_payload,
+        offer_payload=offer_payload,
+        meta_payload=meta_payload,
+        gtin=gtin,
+        pn=pn,
+        brand_name=normalize_simple(raw_brand_name) if raw_brand_name else None,
+        category_name=normalize_simple(raw_category_name) if raw_category_name else None,
+    )
+
+
+def stage_row(idx: int, mapped: dict[str, Any]) -> tuple[Any, ...]:
+    """
+    Converte uma linha mapeada no tuplo da staging (ordem = STAGE_COLUMNS).
+    Mesmas regras do caminho linha-a-linha (sku fallback, brand/category normalizados);
+    nome e chave de lookup de brand/category como no get_or_create dos repos.
+    """
+    return (idx, *_stage_fields(prepare_row(idx, mapped)))
+
+
+def _stage_fields(work: RowWork) -> tuple[Any, ...]:
+    meta = {str(k): str(v) for k, v in work.meta_payload.items()}
+    return (
+        work.sku,
+        work.gtin,
+        work.pn,
+        normalize_simple(work.brand_name, BRAND_NAME_MAX_LEN),
+        normalize_key_ci(work.brand_name, BRAND_NAME_MAX_LEN),
+        normalize_simple(work.category_name, CATEGORY_NAME_MAX_LEN),
+        normalize_key_ci(work.category_name, CATEGORY_NAME_MAX_LEN),
+        work.product_payload.get("name"),
+        work.product_payload.get("description"),
+        work.product_payload.get("image_url"),
+        work.product_payload.get("weight_str"),
+        work.offer_payload["price"],
+        work.offer_payload["stock"],
+        json.dumps(meta, ensure_ascii=False) if meta else None,
+    )
+
+
+def row_sku(prepared: RowWork | tuple[Any, ...]) -> str:
+    return prepared.sku if isinstance(prepared, RowWork) else prepared[1]
+
+
+def row_fingerprint(prepared: RowWork | tuple[Any, ...]) -> bytes:
+    """
+    Fingerprint (8 bytes) do conteúdo mapeado de uma linha: igual para o RowWork
+    e para o tuplo da staging (o nº da linha não conta).
+    """
+    values = _stage_fields(prepared) if isinstance(prepared, RowWork) else prepared[1:]
+    return hashlib.blake2b(repr(values).encode(), digest_size=8).digest()
+
+
+_PREPARERS = {"stage": stage_row, "work": prepare_row}
+
+
+def _map_chunk_with(
+    engine: IngestEngine,
+    prepare: Prepare,
+    columnar: bool,
+    start_idx: int,
+    rows: list[dict[str, Any]],
+) -> list[MappedRow]:
+    results = engine.map_batch(rows) if columnar else map(engine.map_row, rows)
+    prep = _PREPARERS[prepare]
+    return [
+        (idx, prep(idx, normalize_images(mapped)), None) if mapped else (idx, None, err)
+        for idx, (mapped, err) in enumerate(results, start_idx)
+    ]
+
+
+# -------------------- process pool --------------------
+
+# estado por processo worker (definido pelo initializer, uma vez por worker)
+_worker_engine: IngestEngine | None = None
+_worker_prepare: Prepare = "work"
+_worker_columnar = True
+
+
+def _init_worker(profile: dict[str, Any], prepare: Prepare, columnar: bool) -> None:
+    global _worker_engine, _worker_prepare, _worker_columnar
+    _worker_engine = IngestEngine(profile)  # perfil compilado uma vez por worker
+    _worker_prepare = prepare
+    _worker_columnar = columnar
+
+
+def _map_chunk(start_idx: int, rows: list[dict[str, Any]]) -> list[MappedRow]:
+    engine = _worker_engine
+    assert engine is not None, "worker not initialized"
+    return _map_chunk_with(engine, _worker_prepare, _worker_columnar, start_idx, rows)
+
+
+def _iter_chunks(
+    rows: Iterable[dict[str, Any]], size: int
+) -> Iterator[tuple[int, list[dict[str, Any]]]]:
+    """
+    (idx da 1.ª linha, linhas) por chunk; idx começa em 1.
+    """
+    it = iter(rows)
+    start = 1
+    while chunk := list(islice(it, size)):
+        yield start, chunk
+        start += len(chunk)
+
+
+def _timed_chunks(
+    rows: Iterable[dict[str, Any]], size: int, timer: StageTimer | None
+) -> tuple[Iterator[tuple[int, list[dict[str, Any]]]], Any]:
+    """
+    Chunks + fábrica do bloco "map". Com timer, a leitura de cada chunk conta
+    como "parse" e o mapping como "map" (medido por chunk, não por linha).
+    """
+    chunks = _iter_chunks(rows, size)
+    if timer is None:
+        return chunks, _no_stage
+    return timer.wrap_iter("parse", chunks), timer.stage
+
+
+def _no_stage(_name: str) -> AbstractContextManager[None]:
+    return nullcontext()
+
+
+def _map_parallel(
+    rows: Iterable[dict[str, Any]],
+    *,
+    profile: dict[str, Any],
+    prepare: Prepare,
+    columnar: bool,
+    workers: int,
+    chunk_size: int,
+    timer: StageTimer | None = None,
+) -> Iterator[MappedRow]:
+    """
+    Lê `rows` em chunks, mapeia-os num ProcessPoolExecutor e devolve os resultados
+    pela ordem original. No máximo 2 chunks por worker em voo (memória limitada).
+    """
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),  # sem fork de um processo com threads
+        initializer=_init_worker,
+        initargs=(profile, prepare, columnar),
+    )
+    chunks, stage = _timed_chunks(rows, chunk_size, timer)
+    try:
+        pending: deque[Future[list[MappedRow]]] = deque()
+        for start, chunk in chunks:
+            with stage("map"):
+                pending.append(pool.submit(_map_chunk, start, chunk))
+                done = pending.popleft().result() if len(pending) >= workers * 2 else None
+            if done is not None:
+                yield from done
+        while pending:
+            with stage("map"):
+                done = pending.popleft().result()
+            yield from done
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def map_rows(
+    rows: Iterable[dict[str, Any]],
+    *,
+    profile: dict[str, Any],
+    prepare: Prepare,
+    columnar: bool = True,
+    workers: int = 0,
+    chunk_size: int = 2000,
+    timer: StageTimer | None = None,
+) -> Generator[MappedRow, None, None]:
+    """
+    Mapeia e prepara as linhas do feed (CPU puro: map_row, normalize_images,
+    split_payload, normalizações). Devolve (idx, preparado | None, erro) por
+    linha, pela ordem do feed (idx começa em 1).
+
+    Linhas tratadas em chunks de `chunk_size`; columnar → IngestEngine.map_batch
+    por chunk, senão map_row linha a linha (mesmo resultado).
+    workers <= 1 → no próprio processo; caso contrário process pool.
+    timer: tempos "parse"/"map" por chunk (com workers, "map" = espera pelos processos).
+    """
+    chunk_size = max(1, chunk_size)
+    if workers <= 1:
+        engine = IngestEngine(profile)
+        chunks, stage = _timed_chunks(rows, chunk_size, timer)
+        for start, chunk in chunks:
+            with stage("map"):
+                done = _map_chunk_with(engine, prepare, columnar, start, chunk)
+            yield from done
+        return
+
+    yield from _map_parallel(
+        rows,
+        profile=profile,
+        prepare=prepare,
+        columnar=columnar,
+        workers=workers,
+        chunk_size=chunk_size,
+        timer=timer,
+    )
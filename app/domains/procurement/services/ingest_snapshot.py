@@ -0,0 +1,216 @@
+# app/domains/procurement/services/ingest_snapshot.py
+from __future__ import annotations
+
+import logging
+import os
+import struct
+import tempfile
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any
+
+from app.core.config import settings
+from app.domains.procurement.services.ingest_rows import row_fingerprint, row_sku
+
+log = logging.getLogger("gsm.ingest")
+
+# Ficheiro por feed: cabeçalho + registos (sku, fingerprint) ordenados por sku
+#   cabeçalho: magic | id_feed | id_run | mapper_version (-1 = sem mapper) | nº registos
+#   registo:   len(sku) u16 | sku utf-8 | fingerprint 8 bytes
+_MAGIC = b"GSMSNAP1"
+_HEADER = struct.Struct("<8sQQqQ")
+_SKU_LEN = struct.Struct("<H")
+_FP_BYTES = 8
+_BUFFER_BYTES = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class SnapshotInfo:
+    id_feed: int
+    id_run: int
+    mapper_version: int | None
+    count: int
+    written_at: float  # epoch (mtime do ficheiro)
+
+
+def snapshot_dir() -> Path:
+    base = settings.INGEST_SNAPSHOT_DIR or os.path.join(tempfile.gettempdir(), "gsm_snapshots")
+    return Path(base)
+
+
+def snapshot_path(id_feed: int) -> Path:
+    return snapshot_dir() / f"feed_{int(id_feed)}.snap"
+
+
+def read_info(path: Path) -> SnapshotInfo | None:
+    """
+    Cabeçalho do snapshot; None se não existir ou não for um snapshot válido.
+    """
+    try:
+        with path.open("rb") as f:
+            raw = f.read(_HEADER.size)
+            written_at = os.fstat(f.fileno()).st_mtime
+    except OSError:
+        return None
+    if len(raw) != _HEADER.size:
+        return None
+    magic, id_feed, id_run, mapper_version, count = _HEADER.unpack(raw)
+    if magic != _MAGIC:
+        return None
+    return SnapshotInfo(
+        id_feed=id_feed,
+        id_run=id_run,
+        mapper_version=None if mapper_version < 0 else mapper_version,
+        count=count,
+        written_at=written_at,
+    )
+
+
+def load_entries(path: Path) -> dict[str, bytes]:
+    """
+    sku → fingerprint de todos os registos (leitura sequencial, por blocos).
+    """
+    out: dict[str, bytes] = {}
+    with path.open("rb", buffering=_BUFFER_BYTES) as f:
+        magic, _id_feed, _id_run, _mv, count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f"not a feed snapshot: {path}")
+        for _ in range(count):
+            (n,) = _SKU_LEN.unpack(f.read(_SKU_LEN.size))
+            sku = f.read(n).decode("utf-8")
+            fp = f.read(_FP_BYTES)
+            if len(fp) != _FP_BYTES:
+                raise ValueError(f"truncated feed snapshot: {path}")
+            out[sku] = fp
+    return out
+
+
+def _write_entries(
+    f: IO[bytes],
+    *,
+    id_feed: int,
+    id_run: int,
+    mapper_version: int | None,
+    entries: dict[str, bytes],
+) -> None:
+    encoded = sorted((sku.encode("utf-8"), fp) for sku, fp in entries.items())
+    f.write(
+        _HEADER.pack(
+            _MAGIC,
+            id_feed,
+            id_run,
+            -1 if mapper_version is None else mapper_version,
+            len(encoded),
+        )
+    )
+    for sku, fp in encoded:
+        f.write(_SKU_LEN.pack(len(sku)))
+        f.write(sku)
+        f.write(fp)
+
+
+@dataclass
+class FeedDelta:
+    """
+    Diferença da run atual contra o snapshot da última run completa do feed.
+
+    - skip(): chamado pelo persist por cada linha mapeada; linha com o mesmo
+      fingerprint que no snapshot → saltada (não vai ao persist);
+    - removed(): SKUs do snapshot que deixaram de vir no feed (ou que vieram
+      mas falharam o persist) → EOL direto, sem percorrer os supplier_items;
+    - prepare()/publish(): novo snapshot (ficheiro .tmp → rename depois do commit).
+
+    Sem snapshot anterior (old=None) só regista os fingerprints: a run é completa
+    e o snapshot fica pronto para a próxima.
+    """
+
+    id_feed: int
+    old: dict[str, bytes] | None = None
+    new: dict[str, bytes] = field(default_factory=dict)
+    skipped: int = 0
+    _forwarded: set[str] = field(default_factory=set)  # (delta) SKUs enviados ao persist
+    _known: set[str] = field(default_factory=set)  # (delta) SKUs enviados que já existiam
+    _tmp: Path | None = None
+
+    @property
+    def active(self) -> bool:
+        return self.old is not None
+
+    def skip(self, prepared: Any) -> bool:
+        if prepared is None:
+            return False
+        sku = row_sku(prepared)
+        fp = row_fingerprint(prepared)
+        # SKU repetido no feed compara com a ocorrência anterior (fica a última)
+        if sku in self.new:
+            ref = self.new[sku]
+        elif self.old is not None:
+            ref = self.old.pop(sku, None)
+            if ref is not None:
+                self._known.add(sku)
+        else:
+            ref = None
+        self.new[sku] = fp
+        if ref is not None and ref == fp:
+            self.skipped += 1
+            return True
+        if self.active:
+            self._forwarded.add(sku)
+        return False
+
+    def settle(self, persisted_skus: Iterable[str]) -> list[str]:
+        """
+        Fecha a run com o seen set do persist (SKUs gravados nesta run): o novo
+        snapshot fica só com SKUs gravados (agora ou numa run anterior).
+        Devolve os SKUs a marcar como EOL (modo delta; vazio numa run completa).
+        """
+        persisted = set(persisted_skus)
+        if not self.active:
+            self.new = {sku: fp for sku, fp in self.new.items() if sku in persisted}
+            return []
+
+        removed = list(self.old or ())
+        for sku in self._forwarded - persisted:
+            del self.new[sku]
+            if sku in self._known:
+                removed.append(sku)
+        self.old, self._forwarded, self._known = {}, set(), set()
+        return removed
+
+    def prepare(self, *, id_run: int, mapper_version: int | None) -> None:
+        """
+        Escreve o novo snapshot num ficheiro temporário ao lado do definitivo.
+        """
+        path = snapshot_path(self.id_feed)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        t0 = time.monotonic()
+        with tmp.open("wb", buffering=_BUFFER_BYTES) as f:
+            _write_entries(
+                f,
+                id_feed=self.id_feed,
+                id_run=id_run,
+                mapper_version=mapper_version,
+                entries=self.new,
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        self._tmp = tmp
+        log.info(
+            "[feed=%s] snapshot prepared skus=%s ms=%s",
+            self.id_feed,
+            len(self.new),
+            int((time.monotonic() - t0) * 1000),
+        )
+
+    def publish(self) -> None:
+        tmp, self._tmp = self._tmp, None
+        if tmp is not None:
+            os.replace(tmp, snapshot_path(self.id_feed))
+
+    def discard(self) -> None:
+        tmp, self._tmp = self._tmp, None
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
@@ -0,0 +1,157 @@
+# app/domains/procurement/services/ingest_timings.py
+from __future__ import annotations
+
+import os
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import IO, Any, TypeVar
+
+T = TypeVar("T")
+
+try:
+    _PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+except (AttributeError, ValueError, OSError):  # pragma: no cover - não-POSIX
+    _PAGE_KB = 4
+
+
+def current_rss_kb() -> int | None:
+    """
+    RSS atual do processo (KB): /proc/self/statm; fora de Linux, o pico do
+    processo (getrusage).
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_KB
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    except Exception:
+        return None
+
+
+class StageTimer:
+    """
+    Tempo (exclusivo) por etapa de uma run de ingest + pico de RSS amostrado.
+
+    As etapas do pipeline em streaming estão encaixadas (o persist puxa o map,
+    que puxa o parse, que lê do descompressor): cada intervalo conta só para a
+    etapa no topo da pilha, pelo que a soma das etapas ≈ tempo total medido.
+
+    - stage(name): bloco (ex.: EOL); amostra o RSS à entrada e à saída;
+    - enter(name)/exit(): o mesmo sem RSS (barato o suficiente para ir por linha);
+    - wrap_iter(name, it): tempo passado dentro de next() do iterador (ex.: por chunk);
+    - wrap_stream(name, stream): tempo passado em read*() do stream.
+
+    Não é thread-safe: uma instância por run (o ingest corre em sequência).
+    Com INGEST_MAP_WORKERS o "map" é o tempo à espera dos processos, e o RSS
+    só conta o processo principal.
+    """
+
+    def __init__(self) -> None:
+        self._ns: dict[str, int] = {}
+        self._stack: list[str] = []
+        self._mark = time.perf_counter_ns()
+        self.peak_rss_kb: int | None = None
+
+    # -------------------- medição --------------------
+
+    def _switch(self) -> None:
+        now = time.perf_counter_ns()
+        if self._stack:
+            top = self._stack[-1]
+            self._ns[top] = self._ns.get(top, 0) + now - self._mark
+        self._mark = now
+
+    def enter(self, name: str) -> None:
+        self._switch()
+        self._stack.append(name)
+
+    def exit(self) -> None:
+        self._switch()
+        self._stack.pop()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        self.sample_rss()
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+            self.sample_rss()
+
+    def add_ms(self, name: str, ms: int) -> None:
+        """Etapa medida fora do timer (ex.: download no event loop)."""
+        self._ns[name] = self._ns.get(name, 0) + int(ms) * 1_000_000
+
+    def wrap_iter(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        it = iter(iterable)
+        try:
+            while True:
+                self.enter(name)
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    self.exit()
+                yield item
+        finally:
+            # fechar o wrapper fecha o iterador de origem (ex.: process pool do map_rows)
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()
+
+    def wrap_stream(self, name: str, stream: IO[bytes]) -> IO[bytes]:
+        return _TimedStream(self, name, stream)  # type: ignore[return-value]
+
+    def sample_rss(self) -> None:
+        rss = current_rss_kb()
+        if rss is not None and (self.peak_rss_kb is None or rss > self.peak_rss_kb):
+            self.peak_rss_kb = rss
+
+    # -------------------- resultado --------------------
+
+    def as_ms(self) -> dict[str, int]:
+        """
+        Etapa → ms (ordem de primeira medição, que segue a ordem do pipeline).
+        """
+        return {k: v // 1_000_000 for k, v in self._ns.items()}
+
+
+class _TimedStream:
+    """
+    Proxy de um stream binário que conta o tempo das leituras numa etapa.
+    """
+
+    def __init__(self, timer: StageTimer, name: str, raw: IO[bytes]) -> None:
+        self._timer = timer
+        self._name = name
+        self._raw = raw
+
+    def _timed(self, fn: Any, *args: Any) -> Any:
+        self._timer.enter(self._name)
+        try:
+            return fn(*args)
+        finally:
+            self._timer.exit()
+
+    def read(self, *args: Any) -> bytes:
+        return self._timed(self._raw.read, *args)
+
+    def read1(self, *args: Any) -> bytes:
+        read1 = getattr(self._raw, "read1", self._raw.read)
+        return self._timed(read1, *args)
+
+    def readinto(self, b: Any) -> int:
+        return self._timed(self._raw.readinto, b)
+
+    def readline(self, *args: Any) -> bytes:
+        return self._timed(self._raw.readline, *args)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
@@ -0,0 +1,11 @@
+# app/domains/procurement/usecases/runs/get_run.py
+from __future__ import annotations
+
+from app.infra.uow import UoW
+from app.repositories.procurement.read.feed_run_read_repo import FeedRunReadRepository
+from app.schemas.runs import FeedRunOut
+
+
+def execute(uow: UoW, *, id_run: int) -> FeedRunOut:
+    run = FeedRunReadRepository(uow.db).get_required(id_run)
+    return FeedRunOut.from_entity(run)
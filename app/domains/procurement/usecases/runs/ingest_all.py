@@ -0,0 +1,191 @@
+# app/domains/procurement/usecases/runs/ingest_all.py
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any
+
+from app.core.config import settings
+from app.core.errors import NotFound
+from app.domains.procurement.usecases.runs.ingest_supplier import (
+    refresh_active_offers,
+    resolve_mode,
+)
+from app.domains.procurement.usecases.runs.submit_ingest import create_run, run_ingest_job
+from app.infra.jobs import ingest_jobs
+from app.infra.session import SessionLocal
+from app.infra.uow import UoW
+from app.repositories.procurement.read.supplier_feed_read_repo import (
+    SupplierFeedReadRepository,
+)
+
+log = logging.getLogger("gsm.ingest")
+
+
+def _create_runs(
+    id_suppliers: list[int] | None,
+) -> tuple[list[tuple[int, int, int]], list[dict[str, Any]]]:
+    """
+    Cria (e commita) uma FeedRun por supplier; None → todos os feeds ativos.
+    Devolve ([(id_supplier, id_feed, id_run)], [erros por supplier]).
+    """
+    runs: list[tuple[int, int, int]] = []
+    errors: list[dict[str, Any]] = []
+    with SessionLocal() as db:
+        if id_suppliers is None:
+            feeds = SupplierFeedReadRepository(db).list_active_for_schedule()
+            id_suppliers = [id_supplier for _id_feed, id_supplier, _extra in feeds]
+
+        for id_supplier in dict.fromkeys(id_suppliers):
+            try:
+                id_run, id_feed = create_run(UoW(db), id_supplier=id_supplier)
+            except NotFound as e:
+                db.rollback()
+                errors.append({"ok": False, "id_supplier": id_supplier, "error": str(e)})
+                continue
+            runs.append((id_supplier, id_feed, id_run))
+    return runs, errors
+
+
+def _refresh_offers(product_ids: set[int]) -> tuple[int, int, int]:
+    with SessionLocal() as db:
+        uow = UoW(db)
+        out = refresh_active_offers(db, product_ids, reason="ingest_all")
+        uow.commit()
+        return out
+
+
+async def _refresh_all(affected: set[int], per_run: list[tuple[int, set[int]]]) -> dict[str, Any]:
+    """
+    Recalcula/emite uma vez para a união dos produtos afetados. Se falhar, tenta
+    run a run (cada conjunto na sua transação), para uma run problemática não
+    deixar as outras sem active offers/eventos; as que falharem ficam em
+    "failed_runs" (e no log, com o nº de produtos por recalcular).
+    """
+    offers: dict[str, Any] = {"products": len(affected)}
+    try:
+        recalculated, changed, enqueued = await ingest_jobs.run_blocking(_refresh_offers, affected)
+        offers.update(recalculated=recalculated, changed=changed, enqueued=enqueued)
+        return offers
+    except Exception as e:
+        log.exception("ingest_all: active offer refresh failed, retrying run by run")
+        error = str(e)
+
+    totals = [0, 0, 0]
+    failed_runs: list[int] = []
+    for id_run, products in per_run:
+        if not products:
+            continue
+        try:
+            out = await ingest_jobs.run_blocking(_refresh_offers, products)
+        except Exception:
+            log.exception(
+                "ingest_all: active offer refresh failed run=%s products=%s",
+                id_run,
+                len(products),
+            )
+            failed_runs.append(id_run)
+            continue
+        totals = [a + b for a, b in zip(totals, out, strict=True)]
+
+    offers.update(recalculated=totals[0], changed=totals[1], enqueued=totals[2], fallback="per_run")
+    if failed_runs:
+        offers.update(error=error, failed_runs=failed_runs)
+    return offers
+
+
+async def _run_all(
+    runs: list[tuple[int, int, int]],
+    *,
+    limit: int | None,
+    mode: str,
+) -> dict[str, Any]:
+    """
+    Corre as runs em paralelo (até INGEST_MAX_CONCURRENT_JOBS), cada uma sem
+    recálculo de active offers; no fim recalcula/emite uma única vez para a
+    união dos produtos afetados. Uma run que rebente não interrompe as outras
+    (as que terminaram continuam a ter o recálculo).
+    """
+    sem = asyncio.Semaphore(max(1, int(settings.INGEST_MAX_CONCURRENT_JOBS)))
+
+    async def one(id_supplier: int, id_feed: int, id_run: int) -> dict[str, Any]:
+        async with sem:
+            return await run_ingest_job(
+                id_supplier=id_supplier,
+                id_feed=id_feed,
+                id_run=id_run,
+                limit=limit,
+                mode=mode,
+                defer_offers=True,
+            )
+
+    outcomes = await asyncio.gather(*(one(*r) for r in runs), return_exceptions=True)
+
+    results: list[dict[str, Any]] = []
+    per_run: list[tuple[int, set[int]]] = []
+    affected: set[int] = set()
+    for (id_supplier, _id_feed, id_run), res in zip(runs, outcomes, strict=True):
+        if isinstance(res, BaseException):
+            log.error("ingest_all: run=%s failed", id_run, exc_info=res)
+            res = {"ok": False, "id_run": id_run, "error": f"{type(res).__name__}: {res}"}
+        res["id_supplier"] = id_supplier
+        products = set(res.pop("affected_products", ()))
+        per_run.append((id_run, products))
+        affected.update(products)
+        results.append(res)
+
+    offers = await _refresh_all(affected, per_run)
+
+    log.info(
+        "ingest_all done runs=%s ok=%s products=%s offers=%s",
+        len(results),
+        sum(1 for r in results if r.get("ok")),
+        len(affected),
+        offers,
+    )
+    return {
+        "ok": all(r.get("ok") for r in results) and "error" not in offers,
+        "runs": results,
+        "active_offers": offers,
+    }
+
+
+async def execute(
+    *,
+    id_suppliers: list[int] | None = None,
+    limit: int | None = None,
+    mode: str | None = None,
+    wait: bool = False,
+) -> dict[str, Any]:
+    """
+    Ingest de vários suppliers (todos os feeds ativos se id_suppliers=None):
+
+    - cria uma FeedRun por supplier (os inválidos vão para "errors");
+    - download + persistência em paralelo, limitados por semáforo;
+    - ProductActiveOffer + product_state_changed calculados uma só vez por
+      produto no fim (em vez de uma vez por supplier que o vende).
+
+    wait=False → agenda a orquestração e devolve logo os ids das runs.
+    """
+    mode = resolve_mode(mode)
+    runs, errors = await ingest_jobs.run_short(_create_runs, id_suppliers)
+
+    if wait:
+        out = await _run_all(runs, limit=limit, mode=mode)
+        out["errors"] = errors
+        out["ok"] = out["ok"] and not errors
+        return out
+
+    if runs:
+        # a orquestração não ocupa vaga: as runs dela já são limitadas pelo semáforo próprio
+        ingest_jobs.submit(
+            f"ingest_all:runs={len(runs)}",
+            lambda: _run_all(runs, limit=limit, mode=mode),
+            throttle=False,
+        )
+    log.info("ingest_all queued runs=%s errors=%s", len(runs), len(errors))
+    return {
+        "ok": not errors,
+        "runs": [{"id_supplier": s, "id_run": r} for s, _f, r in runs],
+        "errors": errors,
+    }
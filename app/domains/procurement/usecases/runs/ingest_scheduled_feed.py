@@ -0,0 +1,61 @@
+# app/domains/procurement/usecases/runs/ingest_scheduled_feed.py
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Any
+
+from app.domains.procurement.usecases.runs.submit_ingest import create_run, run_ingest_job
+from app.infra.base import utcnow
+from app.infra.jobs import ingest_jobs
+from app.infra.locks import LOCK_NS_FEED_INGEST, advisory_lock
+from app.infra.session import SessionLocal
+from app.infra.uow import UoW
+from app.repositories.procurement.read.feed_run_read_repo import FeedRunReadRepository
+
+log = logging.getLogger("gsm.worker")
+
+
+def _start_if_due(*, id_feed: int, id_supplier: int, min_gap_s: float) -> int | None:
+    """
+    Cria a run se a última deste feed começou há mais de min_gap_s (evita que
+    réplicas com o mesmo agendamento ingiram o feed duas vezes seguidas).
+    """
+    with SessionLocal() as db:
+        last = FeedRunReadRepository(db).last_started_at(id_feed)
+        if last is not None and utcnow() - last < timedelta(seconds=min_gap_s):
+            return None
+        id_run, _id_feed = create_run(UoW(db), id_supplier=id_supplier)
+        return id_run
+
+
+async def execute(*, id_feed: int, id_supplier: int, min_gap_s: float = 0) -> dict[str, Any] | None:
+    """
+    Ingest agendado de um feed (worker):
+    - advisory lock por feed, mantido durante todo o ingest: se outra réplica
+      (ou a API) já o estiver a ingerir, salta;
+    - salta também se houve uma run deste feed há menos de min_gap_s;
+    - cria a run e corre o ingest até ao fim.
+    Devolve o resumo da run, ou None se saltou.
+    """
+    async with advisory_lock(LOCK_NS_FEED_INGEST, id_feed, runner=ingest_jobs) as acquired:
+        if not acquired:
+            log.info("feed=%s skipped: ingest already running elsewhere", id_feed)
+            return None
+
+        id_run = await ingest_jobs.run_short(
+            _start_if_due,
+            id_feed=id_feed,
+            id_supplier=id_supplier,
+            min_gap_s=min_gap_s,
+        )
+        if id_run is None:
+            log.info("feed=%s skipped: ran less than %ss ago", id_feed, int(min_gap_s))
+            return None
+
+        return await run_ingest_job(
+            id_supplier=id_supplier,
+            id_feed=id_feed,
+            id_run=id_run,
+            lock=False,
+        )
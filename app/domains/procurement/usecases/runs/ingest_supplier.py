@@ -2,18 +2,33 @@ from __future__ import annotations
 
 import json
 import logging
-from contextlib import suppress
-from sqlalchemy.exc import IntegrityError
+import time
+from collections.abc import Iterable
+from contextlib import closing, suppress
+from itertools import islice
+from dataclasses import dataclass, field
+from sqlalchemy.orm import Session
 from typing import Any
 
+from app.core.config import settings
 from app.core.errors import InvalidArgument, NotFound
-from app.core.normalize import normalize_images, normalize_simple, to_int, to_decimal_str
 from app.domains.catalog.services.active_offer import (
-    recalculate_active_offer_for_product,
+    recalculate_active_offers_for_products,
 )
-from app.domains.catalog.services.sync_events import emit_product_state_event
-from app.domains.mapping.engine import IngestEngine
-from app.external.feed_downloader import FeedDownloader, parse_rows_json, parse_rows_csv
+from app.domains.catalog.services.product_key_index import PendingProduct, ProductKeyIndex
+from app.domains.catalog.services.sync_events import emit_product_state_events
+from app.domains.procurement.services.ingest_progress import IngestProgress
+from app.domains.procurement.services.ingest_rows import MappedRow, RowWork, map_rows
+from app.domains.procurement.services.ingest_timings import StageTimer
+from app.domains.procurement.services.ingest_snapshot import (
+    FeedDelta,
+    load_entries,
+    read_info,
+    snapshot_path,
+)
+from app.external.feed_downloader import FeedDownloader, iter_rows_csv, iter_rows_json
+from app.external.feed_payload import DownloadStats, FeedPayload
+from app.infra.jobs import ingest_jobs
 from app.infra.uow import UoW
 from app.repositories.catalog.read.products_read_repo import ProductsReadRepository
 from app.repositories.catalog.write.product_write_repo import ProductWriteRepository
@@ -22,413 +37,971 @@ from app.repositories.procurement.read.mapper_read_repo import MapperReadReposit
 from app.repositories.procurement.read.supplier_feed_read_repo import (
     SupplierFeedReadRepository,
 )
+from app.repositories.procurement.read.supplier_item_read_repo import (
+    SupplierItemReadRepository,
+)
 from app.repositories.procurement.read.supplier_read_repo import SupplierReadRepository
 from app.repositories.procurement.write.feed_run_write_repo import (
     FeedRunWriteRepository,
 )
+from app.repositories.procurement.write.ingest_stage_write_repo import (
+    IngestGoneWriteRepository,
+    IngestSeenWriteRepository,
+    IngestStageWriteRepository,
+)
 from app.repositories.procurement.write.product_event_write_repo import (
     ProductEventWriteRepository,
 )
+from app.repositories.procurement.write.supplier_feed_write_repo import (
+    SupplierFeedWriteRepository,
+)
 from app.repositories.procurement.write.supplier_item_write_repo import (
     SupplierItemWriteRepository,
 )
 
 log = logging.getLogger("gsm.ingest")
 
-CANON_PRODUCT_KEYS = {
-    "gtin",
-    "mpn",
-    "partnumber",
-    "name",
-    "description",
-    "image_url",
-    "image_urls",
-    "category",
-    "weight",
-    "brand",
-}
-CANON_OFFER_KEYS = {"price", "stock", "sku"}
-
-
-def _split_payload(mapped: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any], dict[str, Any]]:
+
+@dataclass
+class _PersistResult:
+    rows: int = 0  # linhas lidas do feed (já com limit aplicado)
+    ok: int = 0
+    bad: int = 0
+    changed: int = 0
+    unchanged: int = 0  # linhas com fingerprint igual ao guardado (sem fills/upsert/eventos)
+    affected_products: set[int] = field(default_factory=set)
+
+
+def _persist_bulk(
+    db: Session,
+    *,
+    mapped_rows: Iterable[MappedRow],
+    id_feed: int,
+    id_supplier: int,
+    id_run: int,
+    default_margin: float,
+    progress: IngestProgress,
+    delta: FeedDelta | None = None,
+    timer: StageTimer | None = None,
+) -> _PersistResult:
     """
-    Separa o resultado do mapper em:
-    - product_payload (campos canónicos de produto)
-    - offer_payload   (preço/stock/sku + chaves técnicas)
-    - meta_payload    (resto dos campos, não-canónicos)
+    Modo bulk: COPY das linhas mapeadas para a staging temporária e resolução
+    set-based (brands, categories, products, meta, supplier_items, events).
+    Itens inalterados saem da staging logo após a resolução de produtos;
+    com delta, linhas iguais ao snapshot nem chegam à staging.
+    Tempos: "copy" (COPY + analyze), "resolve" (brands/categories/products),
+    "upsert" (restantes passos set-based).
     """
-    out_product = {
-        "gtin": (mapped.get("gtin") or "") or None,
-        "partnumber": (mapped.get("mpn") or mapped.get("partnumber") or "") or None,
-        "name": mapped.get("name"),
-        "description": mapped.get("description"),
-        "image_url": mapped.get("image_url"),
-        "weight_str": mapped.get("weight"),
-    }
+    res = _PersistResult()
+    timer = timer if timer is not None else StageTimer()
+    stage = IngestStageWriteRepository(db)
+    stage.create()
+
+    batch_size = max(1, int(settings.INGEST_COPY_BATCH_ROWS))
+    batch: list[tuple[Any, ...]] = []
+    staged = 0
+
+    for idx, staged_row, err in mapped_rows:
+        res.rows = idx
+        progress.update(rows=idx, ok=staged + len(batch) + res.unchanged, bad=res.bad, changed=0)
+        if staged_row is None:
+            res.bad += 1
+            log.warning("[run=%s] row#%s invalid (mapper): %s", id_run, idx, err)
+            continue
+        if delta is not None and delta.skip(staged_row):
+            res.unchanged += 1
+            continue
+
+        batch.append(staged_row)
+        if len(batch) >= batch_size:
+            with timer.stage("copy"):
+                staged += stage.copy_rows(batch)
+            batch.clear()
+            log.info("[run=%s] staged %s/%s bad=%s", id_run, staged, idx, res.bad)
+
+    with timer.stage("copy"):
+        staged += stage.copy_rows(batch)
+        stage.analyze()
+    progress.set_stage("resolve")
+
+    with timer.stage("resolve"):
+        stage.resolve_brands()
+        stage.resolve_categories()
+        stage.resolve_products(default_margin=default_margin)
+        no_key = stage.discard_unresolved()
+    if no_key:
+        log.warning("[run=%s] %s rows skipped (no product key)", id_run, no_key)
+    res.bad += no_key
+    res.ok = staged - no_key + res.unchanged
+
+    with timer.stage("upsert"):
+        # SKUs repetidos → fica a última linha; seen set do EOL; short-circuit dos inalterados
+        stage.dedupe_skus()
+        seen_w = IngestSeenWriteRepository(db)
+        seen_w.create()
+        seen_w.add_from_stage()
+        stage.mark_existing_items(id_feed=id_feed)
+        res.unchanged += stage.skip_unchanged_items()
+
+        stage.fill_products()
+        res.changed += stage.insert_meta()
+
+        stage.upsert_supplier_items(id_feed=id_feed, id_feed_run=id_run)
+        res.changed += stage.record_item_events(id_supplier=id_supplier, id_feed_run=id_run)
+
+        res.affected_products.update(stage.affected_products())
+    return res
+
+
+def _is_unchanged(
+    fingerprints: dict[str, bytes],
+    work: RowWork,
+    *,
+    id_feed: int,
+    id_product: int,
+) -> bool:
+    known = fingerprints.get(work.sku)
+    if known is None:
+        return False
+    fp = SupplierItemWriteRepository.fingerprint(
+        id_feed=id_feed,
+        id_product=id_product,
+        sku=work.sku,
+        gtin=work.gtin,
+        partnumber=work.pn,
+        price=work.offer_payload["price"],
+        stock=work.offer_payload["stock"],
+    )
+    return bytes.fromhex(fp) == known
+
+
+def _persist_rows(
+    db: Session,
+    *,
+    mapped_rows: Iterable[MappedRow],
+    id_feed: int,
+    id_supplier: int,
+    id_run: int,
+    default_margin: float,
+    progress: IngestProgress,
+    delta: FeedDelta | None = None,
+    timer: StageTimer | None = None,
+) -> _PersistResult:
+    """
+    Modo linha-a-linha: produto resolvido pelo ProductKeyIndex (em memória) +
+    fills + meta + SupplierItem.upsert + evento por linha válida.
+
+    Linhas cujo produto ainda não existe ficam em espera até ao INSERT em lote
+    dos produtos novos (INGEST_PRODUCT_INSERT_BATCH); um SKU que reaparece com
+    uma linha ainda em espera força o flush, para as linhas do mesmo SKU serem
+    aplicadas pela ordem do feed.
+
+    Short-circuit: se o fingerprint da linha for igual ao do SupplierItem guardado,
+    a linha só entra no seen set e não toca em mais nada. Com delta, linhas iguais
+    ao snapshot são saltadas antes da resolução do produto (e os fingerprints dos
+    supplier_items não são carregados).
+    O seen set (SKUs válidos) é copiado uma vez no fim para a tabela temporária do EOL.
+    Tempos: "resolve" (índice + lookup + INSERT dos produtos novos), "upsert" (fills,
+    meta, SupplierItem e eventos).
+    """
+    res = _PersistResult()
+    timer = timer if timer is not None else StageTimer()
+    prod_w = ProductWriteRepository(db)
+    item_w = SupplierItemWriteRepository(db)
+    ev_w = ProductEventWriteRepository(db)
 
-    # Preço: normalizar para decimal string “limpa” (39,99 € → "39.99")
-    raw_price = mapped.get("price")
-    price_str = to_decimal_str(raw_price) or "" if raw_price is not None else ""
-
-    # Stock: aguentar porcarias tipo "10+", " 5 ", "N/A" → 10, 5, 0
-    raw_stock = mapped.get("stock")
-    stock_int = to_int(raw_stock)
-    if stock_int is None:
-        stock_int = 0
-
-    out_offer = {
-        "price": price_str,
-        "stock": stock_int,
-        "sku": (mapped.get("sku") or mapped.get("partnumber") or mapped.get("gtin") or "").strip(),
-        "gtin": out_product["gtin"],
-        "partnumber": out_product["partnumber"],
-    }
+    index = ProductKeyIndex(db, default_margin=default_margin)
+    with timer.stage("resolve"):
+        indexed = index.load()
+        fingerprints = (
+            {}
+            if delta is not None and delta.active
+            else SupplierItemReadRepository(db).map_fingerprints_by_sku(id_feed)
+        )
+    log.info(
+        "[run=%s] product index loaded products=%s items=%s",
+        id_run,
+        indexed,
+        len(fingerprints),
+    )
 
-    used = set(CANON_PRODUCT_KEYS) | set(CANON_OFFER_KEYS)
-    meta = {k: v for k, v in mapped.items() if k not in used and v not in (None, "", [])}
-    return out_product, out_offer, meta
+    batch_size = max(1, int(settings.INGEST_PRODUCT_INSERT_BATCH))
+    deferred: list[tuple[RowWork, PendingProduct]] = []
+    deferred_skus: set[str] = set()
+    seen: set[str] = set()
 
+    def _apply(work: RowWork, id_product: int) -> None:
+        timer.enter("upsert")
+        try:
+            _upsert(work, id_product)
+        finally:
+            timer.exit()
+
+    def _upsert(work: RowWork, id_product: int) -> None:
+        gtin, pn = work.gtin, work.pn
+
+        # 3.2) Preencher campos canónicos vazios + brand/category
+        prod_w.fill_canonicals_if_empty(
+            id_product,
+            name=work.product_payload.get("name"),
+            description=work.product_payload.get("description"),
+            image_url=work.product_payload.get("image_url"),
+            weight_str=work.product_payload.get("weight_str"),
+            partnumber=pn,
+            gtin=gtin,
+        )
+        prod_w.fill_brand_category_if_empty(
+            id_product,
+            brand_name=work.brand_name,
+            category_name=work.category_name,
+        )
+        p = prod_w.get(id_product)  # identity map (já carregado pelos fills)
+        if p is not None:
+            index.observe(p.id, gtin=p.gtin, id_brand=p.id_brand, partnumber=p.partnumber)
 
-async def execute(uow: UoW, *, id_supplier: int, limit: int | None = None) -> dict[str, Any]:
-    """
-    Orquestra uma run de ingest para um supplier:
+        # 3.3) Meta não-canónica
+        for k, v in work.meta_payload.items():
+            if v in (None, "", []):
+                continue
+            inserted, _conflict = prod_w.add_meta_if_missing(
+                id_product,
+                name=str(k),
+                value=str(v),
+            )
+            if inserted:
+                res.changed += 1
+
+        # 3.4) Upsert da oferta do fornecedor
+        price = work.offer_payload["price"]
+        stock = work.offer_payload["stock"]
+
+        _item, created, changed_item, old_price, old_stock = item_w.upsert(
+            id_feed=id_feed,
+            id_product=id_product,
+            sku=work.sku,
+            price=price,
+            stock=stock,
+            gtin=gtin,
+            partnumber=pn,
+            id_feed_run=id_run,
+        )
+        # SKU repetido mais à frente já não pode comparar com o fingerprint antigo
+        fingerprints.pop(work.sku, None)
+        seen.add(work.sku)
 
-    1) Valida supplier/feed e cria FeedRun.
-    2) Faz download + parse do feed (CSV/JSON).
-    3) Mapeia linhas via IngestEngine e, por cada linha válida:
-       - Product.get_or_create + fill canonicals + brand/category + meta.
-       - SupplierItem.upsert → deteta created/changed.
-       - ProductSupplierEvent.record_from_item_change (init/change).
-    4) mark_eol_for_unseen_items → regista events "eol" + devolve products afetados.
-    5) Para cada produto afetado com id_ecommerce:
-       - recalcula ProductActiveOffer com base nas SupplierItem atuais;
-       - compara snapshot anterior vs novo;
-       - se mudou (supplier/preço_enviado/stock) → emite product_state_changed
-         no CatalogUpdateStream (prioridade em função da transição de stock).
-    6) Finaliza FeedRun (ok/erro) e devolve resumo.
-    """
-    db = uow.db
+        res.affected_products.add(id_product)
 
-    # --- Repositórios (CQRS) ---
-    run_r = FeedRunReadRepository(db)
-    run_w = FeedRunWriteRepository(db)
+        # 3.5) Evento por criação/alteração da oferta do supplier
+        res.changed += ev_w.record_from_item_change(
+            id_product=id_product,
+            id_supplier=id_supplier,
+            gtin=gtin,
+            new_price=price,
+            new_stock=stock,
+            created=created,
+            changed=changed_item,
+            id_feed_run=id_run,
+        )
 
-    sup_r = SupplierReadRepository(db)
-    feed_r = SupplierFeedReadRepository(db)
-    mapper_r = MapperReadRepository(db)
-    prod_r = ProductsReadRepository(db)
+        res.ok += 1
+
+    def _flush_new_products() -> None:
+        with timer.stage("resolve"):
+            created = index.flush()
+        if created:
+            log.info("[run=%s] inserted %s new products", id_run, len(created))
+        for work, pending in deferred:
+            if pending.id is None:
+                res.bad += 1
+                log.warning("[run=%s] row#%s skipped (product key conflict)", id_run, work.idx)
+                continue
+            _apply(work, pending.id)
+        deferred.clear()
+        deferred_skus.clear()
+
+    for idx, work, err in mapped_rows:
+        res.rows = idx
+        progress.update(rows=idx, ok=res.ok, bad=res.bad, changed=res.changed)
+        if work is None:
+            res.bad += 1
+            log.warning("[run=%s] row#%s invalid (mapper): %s", id_run, idx, err)
+            continue
+        if delta is not None and delta.skip(work):
+            res.ok += 1
+            res.unchanged += 1
+            continue
+
+        # 3.1) Produto canónico (lookup em memória; novos ficam pendentes)
+        timer.enter("resolve")
+        try:
+            ref = index.resolve(gtin=work.gtin, partnumber=work.pn, brand_name=work.brand_name)
+        except InvalidArgument:
+            res.bad += 1
+            log.warning("[run=%s] row#%s skipped (no product key)", id_run, idx)
+            continue
+        finally:
+            timer.exit()
+
+        if isinstance(ref, PendingProduct):
+            fingerprints.pop(work.sku, None)
+            deferred.append((work, ref))
+            deferred_skus.add(work.sku)
+            if len(deferred) >= batch_size:
+                _flush_new_products()
+        elif work.sku in deferred_skus:
+            # SKU repetido com uma linha anterior ainda pendente: aplica-se primeiro
+            # essa (ordem do feed → a última linha do SKU prevalece)
+            _flush_new_products()
+            _apply(work, ref)
+        elif _is_unchanged(fingerprints, work, id_feed=id_feed, id_product=ref):
+            res.ok += 1
+            res.unchanged += 1
+            seen.add(work.sku)
+        else:
+            _apply(work, ref)
 
-    prod_w = ProductWriteRepository(db)
-    item_w = SupplierItemWriteRepository(db)
-    ev_w = ProductEventWriteRepository(db)
+        if idx % 500 == 0:
+            log.info(
+                "[run=%s] progress rows=%s ok=%s bad=%s unchanged=%s",
+                id_run,
+                idx,
+                res.ok,
+                res.bad,
+                res.unchanged,
+            )
 
-    # --- 1) Supplier + Feed + Run ---
-    supplier = sup_r.get_required(id_supplier)
-    supplier_margin = float(supplier.margin or 0.0)
+    _flush_new_products()
+
+    with timer.stage("upsert"):
+        seen_w = IngestSeenWriteRepository(db)
+        seen_w.create()
+        seen_w.copy_skus(seen)
+    return res
+
+
+def resolve_mode(mode: str | None) -> str:
+    mode = (mode or settings.INGEST_MODE or "row").lower()
+    if mode not in ("row", "bulk"):
+        raise InvalidArgument("Ingest mode must be 'row' or 'bulk'")
+    return mode
+
+
+@dataclass
+class _OpenRun:
+    """
+    Run aberta pelo passo 1 (feed já carregado na sessão do ingest).
+    """
 
-    feed = feed_r.get_by_supplier(id_supplier)
+    id_run: int
+    feed: Any
+    supplier_margin: float
+    progress: IngestProgress
+    download: DownloadStats | None = None  # preenchido depois do download
+    download_ms: int | None = None
+    timer: StageTimer = field(default_factory=StageTimer)
+
+
+def _open_run(
+    db: Session,
+    *,
+    id_supplier: int,
+    id_run: int | None,
+    mode: str,
+) -> _OpenRun:
+    supplier = SupplierReadRepository(db).get_required(id_supplier)
+    feed = SupplierFeedReadRepository(db).get_by_supplier(id_supplier)
     if not feed or not feed.active:
         raise NotFound("Feed not found for supplier")
 
-    run = run_w.start(id_feed=feed.id)
-    id_run = run.id
+    if id_run is None:
+        run = FeedRunWriteRepository(db).start(id_feed=feed.id)
+        progress = IngestProgress(run.id, enabled=False)
+        progress.set_stage("download")
+    else:
+        run = FeedRunReadRepository(db).get_required(id_run)
+        if run.id_feed != feed.id or run.status != "running":
+            raise InvalidArgument("Run does not belong to this feed or is not running")
+        progress = IngestProgress(run.id)
+        # a run esteve em fila desde o submit: started_at = agora (escrito pela sessão
+        # do progresso, sem bloquear a linha nesta transação) e recarregado para o finalize
+        progress.start("download")
+        db.refresh(run, ["started_at"])
 
     log.info(
-        "[run=%s] start ingest id_supplier=%s id_feed=%s format=%s url=%s",
-        id_run,
+        "[run=%s] start ingest id_supplier=%s id_feed=%s format=%s mode=%s url=%s",
+        run.id,
         id_supplier,
         feed.id,
         feed.format,
+        mode,
         feed.url,
     )
+    return _OpenRun(
+        id_run=run.id,
+        feed=feed,
+        supplier_margin=float(supplier.margin or 0.0),
+        progress=progress,
+    )
 
+
+def _record_metrics(db: Session, opened: _OpenRun) -> None:
+    """
+    Download (tentativas/bytes/ms) + tempo por etapa e pico de RSS, gravados
+    com o finalize da run.
+    """
+    run_w = FeedRunWriteRepository(db)
+    if opened.download is not None:
+        run_w.record_download(
+            opened.id_run,
+            attempts=opened.download.attempts,
+            bytes_received=opened.download.bytes_received,
+            duration_ms=opened.download_ms,
+        )
+    timer = opened.timer
+    timer.sample_rss()
+    run_w.record_timings(opened.id_run, stage_ms=timer.as_ms(), peak_rss_kb=timer.peak_rss_kb)
+
+
+def _finish_http_error(
+    uow: UoW, *, opened: _OpenRun, status_code: int, err_text: str | None
+) -> None:
+    _record_metrics(uow.db, opened)
+    FeedRunWriteRepository(uow.db).finalize_http_error(
+        opened.id_run,
+        http_status=status_code,
+        error_msg=err_text or f"HTTP {status_code}",
+    )
+    uow.commit()
+
+
+def _finish_unchanged(
+    uow: UoW,
+    *,
+    opened: _OpenRun,
+    reason: str,
+    http_status: int | None,
+    defer_offers: bool,
+    payload_sha256: str | None = None,
+    mapper_version: int | None = None,
+) -> dict[str, Any]:
+    """
+    Feed igual ao da última run completa: termina a run como ok sem parse,
+    mapping, EOL nem active offers (os SupplierItems ficam como estão).
+    """
+    id_run = opened.id_run
+    run_w = FeedRunWriteRepository(uow.db)
+    _record_metrics(uow.db, opened)
+    run_w.finalize_unchanged(
+        id_run,
+        reason=reason,
+        http_status=http_status,
+        payload_sha256=payload_sha256,
+        mapper_version=mapper_version,
+    )
+    uow.commit()
+    log.info("[run=%s] feed unchanged (%s), nothing to ingest", id_run, reason)
+
+    summary: dict[str, Any] = {
+        "ok": True,
+        "id_run": id_run,
+        "rows_total": 0,
+        "rows_processed": 0,
+        "rows_valid": 0,
+        "rows_invalid": 0,
+        "changes": 0,
+        "rows_unchanged_skipped": 0,
+        "eol_unseen": 0,
+        "eol_marked": 0,
+        "status": "ok",
+        "unchanged_reason": reason,
+    }
+    if defer_offers:
+        summary["affected_products"] = set()
+    return summary
+
+
+def _same_payload_as_last_run(db: Session, *, feed: Any, mapper: Any, digest: str) -> bool:
+    """
+    True se a última run que gravou linhas no feed ingeriu exatamente este conteúdo
+    com a mesma versão do mapper, e nem o feed nem o mapper foram alterados desde
+    então. Uma run com limit (sem hash) pelo meio nunca é saltada: o EOL dela
+    deixou o feed incompleto e só uma run completa o repõe.
+    """
+    last = FeedRunReadRepository(db).last_ingested(feed.id)
+    if last is None or last.payload_sha256 != digest:
+        return False
+    if last.mapper_version != (mapper.version if mapper is not None else None):
+        return False
+    changed_at = [feed.updated_at, mapper.updated_at if mapper is not None else None]
+    return all(t is None or t <= last.started_at for t in changed_at)
+
+
+def _open_delta(
+    db: Session, *, feed: Any, mapper: Any, mapper_version: int | None, id_run: int
+) -> FeedDelta | None:
+    """
+    Delta ingest (só runs completas): carrega o snapshot do feed se ainda descrever
+    o que está gravado — escrito pela última run que gravou linhas, com o mesmo
+    mapper, sem alterações ao feed/mapper desde então e com menos de
+    INGEST_DELTA_MAX_AGE_H. Caso contrário a run é completa (e escreve snapshot novo).
+    """
+    if not settings.INGEST_DELTA:
+        return None
+    delta = FeedDelta(id_feed=feed.id)
+    path = snapshot_path(feed.id)
+    info = read_info(path)
+    if info is None:
+        return delta
+
+    last = FeedRunReadRepository(db).last_ingested(feed.id)
+    changed_at = (getattr(feed, "updated_at", None), getattr(mapper, "updated_at", None))
+    if last is None or info.id_feed != feed.id or info.id_run != last.id:
+        reason = "stale"
+    elif info.mapper_version != mapper_version:
+        reason = "mapper"
+    elif any(t is not None and t > last.started_at for t in changed_at):
+        reason = "config"
+    elif time.time() - info.written_at > float(settings.INGEST_DELTA_MAX_AGE_H) * 3600:
+        reason = "age"
+    else:
+        try:
+            delta.old = load_entries(path)
+        except (OSError, ValueError) as e:
+            log.warning("[run=%s] snapshot unreadable, full run: %s", id_run, e)
+            return delta
+        log.info("[run=%s] delta ingest vs run=%s skus=%s", id_run, info.id_run, info.count)
+        return delta
+
+    log.info("[run=%s] snapshot not usable (%s), full run", id_run, reason)
+    return delta
+
+
+def _finish_error(uow: UoW, *, opened: _OpenRun, exc: Exception) -> None:
+    # Hard-fail da run
+    db = uow.db
+    with suppress(Exception):
+        db.rollback()
     try:
-        # --- 2) Download + parse feed ---
-        headers = json.loads(feed.headers_json) if getattr(feed, "headers_json", None) else None
-        params = json.loads(feed.params_json) if getattr(feed, "params_json", None) else None
-        auth = json.loads(feed.auth_json) if getattr(feed, "auth_json", None) else None
-        extra = json.loads(feed.extra_json) if getattr(feed, "extra_json", None) else None
+        _record_metrics(db, opened)
+        FeedRunWriteRepository(db).finalize_error(
+            opened.id_run,
+            error_msg=f"{type(exc).__name__}: {exc}",
+        )
+        uow.commit()
+    except Exception:
+        with suppress(Exception):
+            db.rollback()
 
-        downloader = FeedDownloader()
 
-        status_code, content_type, raw, err_text = await downloader.download_feed(
-            kind=getattr(feed, "kind", None),
-            url=feed.url,
-            headers=headers,
-            params=params,
-            auth_kind=getattr(feed, "auth_kind", None),
-            auth=auth,
-            extra=extra,
-            timeout_s=60,
+def refresh_active_offers(
+    db: Session,
+    product_ids: Iterable[int],
+    *,
+    reason: str,
+    timer: StageTimer | None = None,
+) -> tuple[int, int, int]:
+    """
+    Recalcula o ProductActiveOffer dos produtos (só os com id_ecommerce) e emite
+    product_state_changed (em lote) para os snapshots efetivamente alterados.
+    Não faz commit. Devolve (recalculados, alterados, enfileirados).
+    Tempos: "active_offers" (recálculo) e "enqueue" (eventos no stream).
+    """
+    timer = timer if timer is not None else StageTimer()
+    with timer.stage("active_offers"):
+        recalcs = recalculate_active_offers_for_products(
+            db,
+            product_ids=product_ids,
+            only_linked=True,
+        )
+    offers_changed = [r for r in recalcs if r.changed]
+
+    with timer.stage("enqueue"):
+        products = ProductsReadRepository(db).list_by_ids([r.id_product for r in offers_changed])
+        enqueued = emit_product_state_events(
+            db,
+            [
+                (products[r.id_product], r.active_offer, r.prev_snapshot)
+                for r in offers_changed
+                if r.id_product in products
+            ],
+            reason=reason,
         )
+    return len(recalcs), len(offers_changed), enqueued
 
-        if status_code < 200 or status_code >= 300:
-            run_w.finalize_http_error(
-                id_run,
-                http_status=status_code,
-                error_msg=err_text or f"HTTP {status_code}",
-            )
-            uow.commit()
-            log.error(
-                "[run=%s] download error: HTTP %s msg=%s",
-                id_run,
-                status_code,
-                err_text,
-            )
-            return {"ok": False, "id_run": id_run, "error": f"HTTP {status_code}"}
 
-        fmt = (feed.format or "").lower()
-        if fmt == "json":
-            rows: list[dict[str, Any]] = parse_rows_json(raw)
-        else:
-            rows = parse_rows_csv(
-                raw,
-                delimiter=(feed.csv_delimiter or ","),
-                max_rows=None,
-            )
+def _process(uow: UoW, *, payload: FeedPayload, **kwargs: Any) -> dict[str, Any]:
+    """
+    Corre no thread pool dos jobs e é dono do payload (fecha-o no fim), para que
+    um cancelamento do lado do event loop não o feche a meio da leitura.
+    """
+    with payload:
+        return _process_payload(uow, payload=payload, **kwargs)
+
+
+def _process_payload(
+    uow: UoW,
+    *,
+    opened: _OpenRun,
+    payload: FeedPayload,
+    id_supplier: int,
+    limit: int | None,
+    mode: str,
+    defer_offers: bool,
+) -> dict[str, Any]:
+    """
+    Passos 2 (parse) a 6 (finalize + commit): todo o trabalho de CPU/BD da run.
+    Síncrono: nunca corre no event loop.
+    """
+    db = uow.db
+    feed = opened.feed
+    id_run = opened.id_run
+    progress = opened.progress
+    timer = opened.timer
 
-        total = len(rows)
-        if limit is not None:
-            rows = rows[:limit]
+    run_r = FeedRunReadRepository(db)
+    run_w = FeedRunWriteRepository(db)
+    mapper_r = MapperReadRepository(db)
+    ev_w = ProductEventWriteRepository(db)
 
-        log.info(
-            "[run=%s] fetched rows: total=%s using=%s",
-            id_run,
-            total,
-            len(rows),
+    # Conteúdo igual ao da última run completa (hash do feed já descomprimido) → nada a fazer
+    mapper = mapper_r.get_by_feed(feed.id)
+    mapper_version = mapper.version if mapper is not None else None
+    # (feed comprimido: custa uma passagem de descompressão; só runs completas o usam)
+    digest = None
+    if limit is None:
+        with timer.stage("hash"):
+            digest = payload.sha256
+    if (
+        digest is not None
+        and settings.INGEST_SKIP_SAME_PAYLOAD
+        and _same_payload_as_last_run(db, feed=feed, mapper=mapper, digest=digest)
+    ):
+        SupplierFeedWriteRepository(db).set_http_validators(
+            feed.id, etag=payload.etag, last_modified=payload.last_modified
+        )
+        return _finish_unchanged(
+            uow,
+            opened=opened,
+            reason="same_content",
+            http_status=None,
+            defer_offers=defer_offers,
+            payload_sha256=digest,
+            mapper_version=mapper_version,
         )
 
-        # --- 3) Mapping + persistência linha-a-linha ---
-        profile = mapper_r.profile_for_feed(feed.id)  # {} se não existir/for inválido
-        engine = IngestEngine(profile)
+    # Linhas são consumidas em streaming pelo passo 3; o limit corta a leitura.
+    # JSON malformado (strict) rebenta a meio e a run é marcada como erro (sem EOL).
+    # feed comprimido: o tempo das leituras do stream descomprimido conta como "decompress"
+    fmt = (feed.format or "").lower()
+    src = payload.open()
+    if payload.decoder is not None:
+        src = timer.wrap_stream("decompress", src)
+    rows: Iterable[dict[str, Any]]
+    if fmt == "json":
+        rows = iter_rows_json(src)
+        if limit is not None:
+            rows = islice(rows, limit)
+    else:
+        rows = iter_rows_csv(
+            src,
+            delimiter=(feed.csv_delimiter or ","),
+            max_rows=limit,
+        )
 
-        affected_products: set[int] = set()
-        ok = bad = changed = 0
+    log.info(
+        "[run=%s] fetched %s bytes (spooled_to_disk=%s limit=%s)",
+        id_run,
+        payload.size,
+        payload.on_disk,
+        limit,
+    )
 
-        for idx, raw_row in enumerate(rows, 1):
-            mapped, err = engine.map_row(raw_row)
-            if not mapped:
-                bad += 1
-                log.warning("[run=%s] row#%s invalid (mapper): %s", id_run, idx, err)
-                continue
+    # --- 3) Mapping + persistência (linha-a-linha ou bulk/staging) ---
+    progress.set_stage("persist")
+    profile = mapper_r.profile_for_feed(feed.id)  # {} se não existir/for inválido
+    mapped_rows = map_rows(
+        rows,
+        profile=profile,
+        prepare="stage" if mode == "bulk" else "work",
+        columnar=settings.INGEST_MAP_COLUMNAR,
+        workers=settings.INGEST_MAP_WORKERS,
+        chunk_size=settings.INGEST_MAP_CHUNK_ROWS,
+        timer=timer,
+    )
 
-            mapped = normalize_images(mapped)
-            product_payload, offer_payload, meta_payload = _split_payload(mapped)
-
-            gtin = product_payload.get("gtin") or None
-            pn = product_payload.get("partnumber") or None
-
-            raw_brand_name = mapped.get("brand") or None
-            raw_category_name = mapped.get("category") or None
-
-            brand_name = normalize_simple(raw_brand_name) if raw_brand_name else None
-            category_name = normalize_simple(raw_category_name) if raw_category_name else None
-
-            # 3.1) Produto canónico
-            try:
-                p = prod_w.get_or_create(
-                    gtin=gtin,
-                    partnumber=pn,
-                    brand_name=brand_name,
-                    default_margin=supplier_margin,
-                )
-            except InvalidArgument:
-                bad += 1
-                log.warning("[run=%s] row#%s skipped (no product key)", id_run, idx)
-                continue
-            except IntegrityError as ie:
-                # race/unique — tenta recuperar
-                db.rollback()
-                p = prod_w.get_by_gtin(gtin) if gtin else None
-                if not p and (brand_name and pn):
-                    try:
-                        p = prod_w.get_or_create(
-                            gtin=None,
-                            partnumber=pn,
-                            brand_name=brand_name,
-                            default_margin=supplier_margin,
-                        )
-                    except Exception:
-                        p = None
-
-                if not p:
-                    bad += 1
-                    log.warning(
-                        "[run=%s] row#%s skipped after IntegrityError: %s",
-                        id_run,
-                        idx,
-                        ie,
-                    )
-                    continue
-
-            # 3.2) Preencher campos canónicos vazios + brand/category
-            prod_w.fill_canonicals_if_empty(
-                p.id,
-                name=product_payload.get("name"),
-                description=product_payload.get("description"),
-                image_url=product_payload.get("image_url"),
-                weight_str=product_payload.get("weight_str"),
-                partnumber=pn,
-                gtin=gtin,
-            )
-            prod_w.fill_brand_category_if_empty(
-                p.id,
-                brand_name=brand_name,
-                category_name=category_name,
-            )
+    # com limit o feed não é lido todo: sem delta nem snapshot novo
+    delta = (
+        _open_delta(db, feed=feed, mapper=mapper, mapper_version=mapper_version, id_run=id_run)
+        if limit is None
+        else None
+    )
+    persist = _persist_bulk if mode == "bulk" else _persist_rows
+    # "persist" = o que sobra do loop (contadores, progresso, delta) fora das etapas aninhadas
+    with closing(mapped_rows), timer.stage("persist"):  # erro a meio → fecha já o process pool
+        persisted = persist(
+            db,
+            mapped_rows=mapped_rows,
+            id_feed=feed.id,
+            id_supplier=id_supplier,
+            id_run=id_run,
+            default_margin=opened.supplier_margin,
+            progress=progress,
+            delta=delta,
+            timer=timer,
+        )
 
-            # 3.3) Meta não-canónica
-            for k, v in meta_payload.items():
-                if v in (None, "", []):
-                    continue
-                inserted, _conflict = prod_w.add_meta_if_missing(
-                    p.id,
-                    name=str(k),
-                    value=str(v),
-                )
-                if inserted:
-                    changed += 1
-
-            # 3.4) Upsert da oferta do fornecedor
-            price = offer_payload["price"]
-            stock = offer_payload["stock"]
-            sku = offer_payload["sku"] or (pn or gtin or f"row-{idx}")
-
-            _item, created, changed_item, old_price, old_stock = item_w.upsert(
+    total, ok, bad, changed = persisted.rows, persisted.ok, persisted.bad, persisted.changed
+    unchanged = persisted.unchanged
+    affected_products = persisted.affected_products
+    progress.update(rows=total, ok=ok, bad=bad, changed=changed, force=True)
+
+    # --- 4) EOL dos itens não vistos neste run ---
+    # delta: só os SKUs que saíram do snapshot; senão todos os supplier_items fora do seen set
+    progress.set_stage("eol")
+    with timer.stage("eol"):
+        gone = delta.settle(IngestSeenWriteRepository(db).skus()) if delta is not None else []
+        if delta is not None and delta.active:
+            gone_w = IngestGoneWriteRepository(db)
+            gone_w.create()
+            gone_w.copy_skus(gone)
+            eol_res = ev_w.mark_eol_for_gone_items(
                 id_feed=feed.id,
-                id_product=p.id,
-                sku=sku,
-                price=price,
-                stock=stock,
-                gtin=gtin,
-                partnumber=pn,
+                id_supplier=id_supplier,
                 id_feed_run=id_run,
             )
-
-            affected_products.add(p.id)
-
-            # 3.5) Evento por criação/alteração da oferta do supplier
-            changed += ev_w.record_from_item_change(
-                id_product=p.id,
+        else:
+            eol_res = ev_w.mark_eol_for_unseen_items(
+                id_feed=feed.id,
                 id_supplier=id_supplier,
-                gtin=gtin,
-                new_price=price,
-                new_stock=stock,
-                created=created,
-                changed=changed_item,
                 id_feed_run=id_run,
             )
-
-            ok += 1
-            if idx % 500 == 0:
-                log.info(
-                    "[run=%s] progress %s/%s ok=%s bad=%s",
-                    id_run,
-                    idx,
-                    len(rows),
-                    ok,
-                    bad,
-                )
-
-        # --- 4) EOL dos itens não vistos neste run ---
-        eol_res = ev_w.mark_eol_for_unseen_items(
-            id_feed=feed.id,
-            id_supplier=id_supplier,
-            id_feed_run=id_run,
+    eol_marked = eol_res.items_stock_changed  # “mudanças reais”
+    eol_unseen = eol_res.items_total  # “desaparecidos do feed”
+    affected_products.update(eol_res.affected_products)
+
+    log.info("[run=%s] EOL marked=%s", id_run, eol_marked)
+
+    # --- 5) Active offer + eventos de estado (apenas para produtos com id_ecommerce) ---
+    # defer_offers: quem orquestra várias runs (ingest_all) recalcula uma vez no fim
+    if not defer_offers:
+        progress.set_stage("active_offers")
+        recalculated, offers_changed, enqueued = refresh_active_offers(
+            db, affected_products, reason="ingest_supplier", timer=timer
+        )
+        log.info(
+            "[run=%s] active offers recalculated=%s changed=%s enqueued=%s",
+            id_run,
+            recalculated,
+            offers_changed,
+            enqueued,
         )
-        eol_marked = eol_res.items_stock_changed  # “mudanças reais”
-        eol_unseen = eol_res.items_total  # “desaparecidos do feed”
-        affected_products.update(eol_res.affected_products)
 
-        log.info("[run=%s] EOL marked=%s", id_run, eol_marked)
+    # --- 6) Finalizar run + commit (a partir daqui sem escritas de progresso) ---
+    # validadores HTTP só depois de uma ingestão completa. Com limit o feed não foi todo
+    # lido mas o EOL correu: apagam-se, para a próxima run não receber um 304 e ficar
+    # com o EOL parcial desta
+    feed_w = SupplierFeedWriteRepository(db)
+    if limit is None:
+        feed_w.set_http_validators(feed.id, etag=payload.etag, last_modified=payload.last_modified)
+    else:
+        feed_w.set_http_validators(feed.id, etag=None, last_modified=None)
+    run_w.finalize_ok(
+        id_run,
+        rows_total=total,
+        rows_changed=changed,
+        partial=bool(bad and ok),
+        rows_ok=ok,
+        rows_bad=bad,
+        # hash só conta como "ingerido" se o feed foi lido todo
+        payload_sha256=digest,
+        mapper_version=mapper_version,
+    )
+    # snapshot escrito ao lado e só trocado depois do commit (falha → próxima run é completa)
+    if delta is not None:
+        try:
+            with timer.stage("snapshot"):
+                delta.prepare(id_run=id_run, mapper_version=mapper_version)
+        except OSError as e:
+            log.warning("[run=%s] snapshot not written: %s", id_run, e)
+    _record_metrics(db, opened)
+    log.info("[run=%s] stage_ms=%s peak_rss_kb=%s", id_run, timer.as_ms(), timer.peak_rss_kb)
+    try:
+        uow.commit()
+    except BaseException:
+        if delta is not None:
+            delta.discard()
+        raise
+    if delta is not None:
+        try:
+            delta.publish()
+        except OSError as e:
+            log.warning("[run=%s] snapshot not published: %s", id_run, e)
 
-        # --- 5) Active offer + eventos de estado (apenas para produtos com id_ecommerce) ---
-        for id_product in affected_products:
-            product = prod_r.get(id_product)
+    status = run_r.get_required(id_run).status
+    log.info(
+        "[run=%s] done status=%s total=%s ok=%s bad=%s changed=%s unchanged=%s eol=%s",
+        id_run,
+        status,
+        total,
+        ok,
+        bad,
+        changed,
+        unchanged,
+        eol_marked,
+    )
 
-            if not product:
-                continue
+    summary: dict[str, Any] = {
+        "ok": True,
+        "id_run": id_run,
+        "rows_total": total,
+        "rows_processed": ok + bad,
+        "rows_valid": ok,
+        "rows_invalid": bad,
+        "changes": changed,
+        "rows_unchanged_skipped": unchanged,
+        "delta": bool(delta is not None and delta.active),
+        "eol_unseen": eol_unseen,
+        "eol_marked": eol_marked,
+        "status": status,
+    }
+    if defer_offers:
+        summary["affected_products"] = affected_products
+    return summary
+
+
+async def execute(
+    uow: UoW,
+    *,
+    id_supplier: int,
+    limit: int | None = None,
+    mode: str | None = None,
+    id_run: int | None = None,
+    defer_offers: bool = False,
+) -> dict[str, Any]:
+    """
+    Orquestra uma run de ingest para um supplier:
 
-            # snapshot da oferta ativa ANTES do recálculo
-            prev_active_snapshot: dict[str, Any] | None = None
-            if product.active_offer is not None:
-                ao = product.active_offer
-                prev_active_snapshot = {
-                    "id_supplier": ao.id_supplier,
-                    "id_supplier_item": ao.id_supplier_item,
-                    "unit_price_sent": float(ao.unit_price_sent)
-                    if ao.unit_price_sent is not None
-                    else None,
-                    "stock_sent": int(ao.stock_sent or 0),
-                }
-
-            # se o produto não está ligado ao PrestaShop, não há nada para emitir
-            if not product.id_ecommerce or product.id_ecommerce <= 0:
-                continue
+    1) Valida supplier/feed e cria FeedRun (ou usa a FeedRun `id_run` já criada
+       e commitada pelo submit_ingest; só nesse caso o progresso é publicado).
+    2) Faz download + parse do feed (CSV/JSON). Download HTTP condicional
+       (ETag/Last-Modified guardados no feed): 304 → run termina logo como ok
+       com unchanged_reason="not_modified" (sem parse/mapping/EOL).
+       Sem validadores (FTP, servidores sem ETag): SHA-256 do conteúdo igual ao
+       da última run completa, com o mesmo mapper → unchanged_reason="same_content".
+    3) Mapeia linhas via IngestEngine (opcionalmente num process pool,
+       INGEST_MAP_WORKERS) e persiste:
+       - mode="row": por cada linha válida
+         Product.get_or_create + fill canonicals + brand/category + meta,
+         SupplierItem.upsert (created/changed) e evento init/change;
+       - mode="bulk": COPY para staging temporária + resolução set-based
+         (INSERT ... ON CONFLICT / UPDATE ... FROM), mesmos contadores.
+       Delta (INGEST_DELTA, runs sem limit): linhas com o fingerprint do snapshot
+       da última run completa do feed não chegam ao persist.
+    4) mark_eol_for_unseen_items → regista events "eol" + devolve products afetados
+       (delta: mark_eol_for_gone_items só com os SKUs que saíram do snapshot).
+    5) Para cada produto afetado com id_ecommerce:
+       - recalcula ProductActiveOffer com base nas SupplierItem atuais;
+       - compara snapshot anterior vs novo;
+       - se mudou (supplier/preço_enviado/stock) → emite product_state_changed
+         no CatalogUpdateStream (prioridade em função da transição de stock).
+       Com defer_offers=True este passo é saltado e o resumo inclui
+       "affected_products" (set) para quem orquestra (ingest_all).
+    6) Finaliza FeedRun (ok/erro), troca o snapshot do feed e devolve resumo.
+
+    Só o download (I/O de rede) corre no event loop; todo o acesso à BD e o
+    parse/mapping correm no thread pool dos jobs (ingest_jobs.run_blocking; os
+    passos curtos de abrir/terminar a run em ingest_jobs.run_short), sempre em
+    sequência, pelo que a sessão nunca é usada em simultâneo.
+    """
+    db = uow.db
+    mode = resolve_mode(mode)
+    short = ingest_jobs.run_short
 
-            # recalcula ProductActiveOffer com base nas SupplierItem atuais
-            new_active = recalculate_active_offer_for_product(
-                db,
-                id_product=id_product,
-            )
+    # --- 1) Supplier + Feed + Run ---
+    opened = await short(_open_run, db, id_supplier=id_supplier, id_run=id_run, mode=mode)
+    feed = opened.feed
+    id_run = opened.id_run
 
-            # emite evento apenas se o snapshot efetivo mudou
-            emit_product_state_event(
-                db,
-                product=product,
-                active_offer=new_active,
-                reason="ingest_supplier",
-                prev_active_snapshot=prev_active_snapshot,
-            )
+    payload: FeedPayload | None = None
+    try:
+        # --- 2) Download (event loop) ---
+        headers = json.loads(feed.headers_json) if getattr(feed, "headers_json", None) else None
+        params = json.loads(feed.params_json) if getattr(feed, "params_json", None) else None
+        auth = json.loads(feed.auth_json) if getattr(feed, "auth_json", None) else None
+        extra = json.loads(feed.extra_json) if getattr(feed, "extra_json", None) else None
 
-        # --- 6) Finalizar run + commit ---
-        run_w.finalize_ok(
-            id_run,
-            rows_total=total,
-            rows_changed=changed,
-            partial=bool(bad and ok),
-        )
-        uow.commit()
+        downloader = FeedDownloader()
+        conditional = settings.INGEST_HTTP_CONDITIONAL
+        t0 = time.monotonic()
 
-        status = (run_r.get(id_run) or run).status
+        status_code, content_type, payload, err_text = await downloader.download_feed(
+            kind=getattr(feed, "kind", None),
+            url=feed.url,
+            headers=headers,
+            params=params,
+            auth_kind=getattr(feed, "auth_kind", None),
+            auth=auth,
+            extra=extra,
+            timeout_s=60,
+            etag=feed.http_etag if conditional else None,
+            last_modified=feed.http_last_modified if conditional else None,
+        )
+        opened.download = payload.stats
+        opened.download_ms = int((time.monotonic() - t0) * 1000)
+        opened.timer.add_ms("download", opened.download_ms)
         log.info(
-            "[run=%s] done status=%s total=%s ok=%s bad=%s changed=%s eol=%s",
+            "[run=%s] download status=%s bytes=%s attempts=%s resumes=%s ms=%s",
             id_run,
-            status,
-            total,
-            ok,
-            bad,
-            changed,
-            eol_marked,
+            status_code,
+            payload.stats.bytes_received,
+            payload.stats.attempts,
+            payload.stats.resumes,
+            opened.download_ms,
         )
 
-        return {
-            "ok": True,
-            "id_run": id_run,
-            "rows_total": total,
-            "rows_processed": ok + bad,
-            "rows_valid": ok,
-            "rows_invalid": bad,
-            "changes": changed,
-            "eol_unseen": eol_unseen,
-            "eol_marked": eol_marked,
-            "status": status,
-        }
-
-    except Exception as e:
-        # Hard-fail da run
-        with suppress(Exception):
-            db.rollback()
+        if status_code == 304:
+            return await short(
+                _finish_unchanged,
+                uow,
+                opened=opened,
+                reason="not_modified",
+                http_status=status_code,
+                defer_offers=defer_offers,
+            )
 
-        try:
-            run_w.finalize_error(
+        if status_code < 200 or status_code >= 300:
+            await short(
+                _finish_http_error,
+                uow,
+                opened=opened,
+                status_code=status_code,
+                err_text=err_text,
+            )
+            log.error(
+                "[run=%s] download error: HTTP %s msg=%s",
                 id_run,
-                error_msg=f"{type(e).__name__}: {e}",
+                status_code,
+                err_text,
             )
-            uow.commit()
-        except Exception:
-            with suppress(Exception):
-                db.rollback()
+            return {"ok": False, "id_run": id_run, "error": f"HTTP {status_code}"}
+
+        # --- 2..6) Parse, mapping, persistência, EOL, active offers (thread pool) ---
+        owned, payload = payload, None  # a partir daqui quem fecha é o _process
+        return await ingest_jobs.run_blocking(
+            _process,
+            uow,
+            opened=opened,
+            payload=owned,
+            id_supplier=id_supplier,
+            limit=limit,
+            mode=mode,
+            defer_offers=defer_offers,
+        )
 
+    except Exception as e:
+        await short(_finish_error, uow, opened=opened, exc=e)
         log.exception("[run=%s] ingest failed", id_run)
         return {"ok": False, "id_run": id_run, "error": str(e)}
+    finally:
+        if payload is not None:
+            payload.close()
@@ -0,0 +1,24 @@
+# app/domains/procurement/usecases/runs/list_runs.py
+from __future__ import annotations
+
+from app.infra.uow import UoW
+from app.repositories.procurement.read.feed_run_read_repo import FeedRunReadRepository
+from app.repositories.procurement.read.supplier_read_repo import SupplierReadRepository
+from app.schemas.runs import FeedRunListOut, FeedRunOut
+
+
+def execute(uow: UoW, *, id_supplier: int, page: int, page_size: int) -> FeedRunListOut:
+    """
+    Histórico de runs do supplier (mais recentes primeiro), com tempos por etapa,
+    débito e pico de memória de cada uma.
+    """
+    SupplierReadRepository(uow.db).get_required(id_supplier)
+    rows, total = FeedRunReadRepository(uow.db).list_for_supplier(
+        id_supplier, page=page, page_size=page_size
+    )
+    return FeedRunListOut(
+        items=[FeedRunOut.from_entity(r) for r in rows],
+        total=total,
+        page=page,
+        page_size=page_size,
+    )
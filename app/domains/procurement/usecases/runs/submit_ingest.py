@@ -0,0 +1,158 @@
+# app/domains/procurement/usecases/runs/submit_ingest.py
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Any
+
+from app.core.errors import NotFound
+from app.domains.procurement.usecases.runs.ingest_supplier import (
+    execute as ingest_supplier,
+    resolve_mode,
+)
+from app.infra.jobs import ingest_jobs
+from app.infra.locks import LOCK_NS_FEED_INGEST, advisory_lock
+from app.infra.session import SessionLocal
+from app.infra.uow import UoW
+from app.repositories.procurement.read.supplier_feed_read_repo import (
+    SupplierFeedReadRepository,
+)
+from app.repositories.procurement.read.supplier_read_repo import SupplierReadRepository
+from app.repositories.procurement.write.feed_run_write_repo import (
+    FeedRunWriteRepository,
+)
+
+log = logging.getLogger("gsm.ingest")
+
+
+def create_run(uow: UoW, *, id_supplier: int) -> tuple[int, int]:
+    """
+    Valida supplier/feed ativo, cria a FeedRun (running/queued) e faz commit.
+    Devolve (id_run, id_feed).
+    """
+    db = uow.db
+    SupplierReadRepository(db).get_required(id_supplier)
+    feed = SupplierFeedReadRepository(db).get_by_supplier(id_supplier)
+    if not feed or not feed.active:
+        raise NotFound("Feed not found for supplier")
+
+    run = FeedRunWriteRepository(db).start(id_feed=feed.id, stage="queued")
+    id_run, id_feed = run.id, feed.id
+    uow.commit()
+    return id_run, id_feed
+
+
+def _abort_run(id_run: int, error_msg: str) -> None:
+    with SessionLocal() as db:
+        uow = UoW(db)
+        FeedRunWriteRepository(db).abort_if_running(id_run, error_msg=error_msg)
+        uow.commit()
+
+
+async def run_ingest_job(
+    *,
+    id_supplier: int,
+    id_feed: int,
+    id_run: int,
+    limit: int | None = None,
+    mode: str | None = None,
+    lock: bool = True,
+    defer_offers: bool = False,
+) -> dict[str, Any]:
+    """
+    Executa o ingest de uma run já criada, numa sessão própria (fora do request).
+
+    lock=True → advisory lock do feed durante todo o ingest (até o trabalho da
+    thread do ingest acabar, mesmo que o job seja cancelado); se outro processo
+    (API/worker) já o tiver, a run termina logo em erro. lock=False quando quem
+    chama já tem o lock (worker).
+
+    Erros antes de o ingest abrir a run (ex.: feed desativado entretanto) marcam-na
+    como erro e devolvem {"ok": False, ...}.
+
+    Se o job for cancelado (ex.: shutdown) a run é marcada como erro numa sessão
+    nova, e só se ainda estiver 'running': o trabalho já entregue à thread do
+    ingest continua e, se acabar, o finalize dele prevalece.
+    """
+    if lock:
+        async with advisory_lock(LOCK_NS_FEED_INGEST, id_feed, runner=ingest_jobs) as acquired:
+            if not acquired:
+                error = "Another ingest of this feed is already running"
+                await ingest_jobs.run_short(_abort_run, id_run, error)
+                log.warning("[run=%s] %s (id_feed=%s)", id_run, error, id_feed)
+                return {"ok": False, "id_run": id_run, "error": error}
+            return await run_ingest_job(
+                id_supplier=id_supplier,
+                id_feed=id_feed,
+                id_run=id_run,
+                limit=limit,
+                mode=mode,
+                lock=False,
+                defer_offers=defer_offers,
+            )
+
+    db = SessionLocal()
+    cancelled = False
+    try:
+        return await ingest_supplier(
+            UoW(db),
+            id_supplier=id_supplier,
+            limit=limit,
+            mode=mode,
+            id_run=id_run,
+            defer_offers=defer_offers,
+        )
+    except asyncio.CancelledError:
+        cancelled = True
+        with suppress(Exception):
+            _abort_run(id_run, "Cancelled")
+        raise
+    except Exception as e:
+        # falhou antes de a run ficar a cargo do ingest (ex.: feed desativado/apagado
+        # ou run abortada enquanto estava em fila): não a deixar 'running' para sempre
+        log.exception("[run=%s] ingest could not start", id_run)
+        try:
+            await ingest_jobs.run_short(_abort_run, id_run, f"{type(e).__name__}: {e}")
+        except Exception:
+            log.exception("[run=%s] failed to mark run as error", id_run)
+        return {"ok": False, "id_run": id_run, "error": str(e)}
+    finally:
+        # cancelado: a sessão pode ainda estar em uso pela thread do ingest
+        if not cancelled:
+            db.close()
+
+
+async def execute(
+    uow: UoW,
+    *,
+    id_supplier: int,
+    limit: int | None = None,
+    mode: str | None = None,
+    wait: bool = False,
+) -> dict[str, Any]:
+    """
+    Cria a FeedRun (status running, stage queued), faz commit e:
+    - wait=False → agenda o ingest no pool de jobs e devolve logo o id da run
+      (progresso em GET /runs/{id});
+    - wait=True  → corre o ingest no próprio request e devolve o resumo final.
+    Supplier/feed/mode são validados aqui para os erros chegarem ao cliente.
+    """
+    mode = resolve_mode(mode)
+    id_run, id_feed = await ingest_jobs.run_short(create_run, uow, id_supplier=id_supplier)
+
+    async def job() -> dict[str, Any]:
+        return await run_ingest_job(
+            id_supplier=id_supplier,
+            id_feed=id_feed,
+            id_run=id_run,
+            limit=limit,
+            mode=mode,
+        )
+
+    if wait:
+        return await job()
+
+    ingest_jobs.submit(f"ingest:run={id_run}", job)
+    log.info("[run=%s] ingest queued id_supplier=%s mode=%s", id_run, id_supplier, mode)
+    return {"ok": True, "id_run": id_run, "status": "running", "stage": "queued"}
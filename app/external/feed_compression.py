@@ -0,0 +1,207 @@
+# app/external/feed_compression.py
+from __future__ import annotations
+
+import bz2
+import fnmatch
+import gzip
+import io
+import lzma
+import zipfile
+from collections.abc import Iterator
+from typing import IO
+
+COMPRESSIONS = ("zip", "gzip", "bz2", "xz")
+
+_ALIASES = {
+    "zip": "zip",
+    "gzip": "gzip",
+    "gz": "gzip",
+    "bz2": "bz2",
+    "bzip2": "bz2",
+    "xz": "xz",
+}
+_DISABLED = {"none", "off", "no", "false", "0"}
+
+_READ_BUFFER_BYTES = 1024 * 1024
+_UTF8_BOM = b"\xef\xbb\xbf"
+_HEADER_MAX_BYTES = 64 * 1024
+
+
+def detect_compression(head: bytes, *, hint: str | None = None) -> str | None:
+    """
+    Compressão do payload: zip | gzip | bz2 | xz | None.
+
+    - hint (extra.compression) explícito manda, mas tem de bater com os magic bytes;
+      "none"/"off" desliga a deteção;
+    - sem hint (ou "auto") decide pelos magic bytes.
+
+    Content-Encoding HTTP não chega aqui: o httpx descomprime-o em streaming
+    durante o download (o payload já fica com o corpo original).
+    """
+    h = str(hint or "").strip().lower()
+    if h in _DISABLED:
+        return None
+
+    sniffed = _sniff(head)
+    if not h or h == "auto":
+        return sniffed
+
+    compression = _ALIASES.get(h)
+    if compression is None:
+        raise ValueError(f"unsupported compression '{hint}'")
+    if not head:
+        raise ValueError(f"empty payload for {compression} decompression")
+    if sniffed != compression:
+        raise ValueError(f"payload does not look like a {compression} file")
+    return compression
+
+
+def _sniff(head: bytes) -> str | None:
+    if head.startswith((b"PK\x03\x04", b"PK\x05\x06")):
+        return "zip"
+    if head.startswith(b"\x1f\x8b"):
+        return "gzip"
+    if head.startswith(b"BZh") and head[3:4].isdigit():
+        return "bz2"
+    if head.startswith(b"\xfd7zXZ\x00"):
+        return "xz"
+    return None
+
+
+def open_decompressed(
+    raw: IO[bytes],
+    compression: str,
+    *,
+    entry_name: str | None = None,
+) -> IO[bytes]:
+    """
+    Stream binário com o conteúdo descomprimido de raw (lido por blocos, nada
+    é extraído para memória/disco). Fechar o stream não fecha raw.
+
+    gzip/bz2/xz aceitam vários membros seguidos (ex.: `cat a.gz b.gz`).
+    zip: ver zip_members (entrada única ou várias concatenadas).
+    """
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if compression == "bz2":
+        return bz2.BZ2File(raw, mode="rb")
+    if compression == "xz":
+        return lzma.LZMAFile(raw, mode="rb")
+    if compression == "zip":
+        zf = zipfile.ZipFile(raw)
+        try:
+            members = zip_members(zf, entry_name)
+        except Exception:
+            zf.close()
+            raise
+        return io.BufferedReader(_ZipEntriesReader(zf, members), _READ_BUFFER_BYTES)
+    raise ValueError(f"unsupported compression '{compression}'")
+
+
+def zip_members(zf: zipfile.ZipFile, entry_name: str | None) -> list[zipfile.ZipInfo]:
+    """
+    Entradas a ler do zip (extra.zip_entry_name):
+      - nome exato (fallback case-insensitive) → essa entrada;
+      - padrão glob (ex.: "*.csv", "*") → todas as que batem, pela ordem do arquivo;
+      - sem nome → o primeiro ficheiro (não diretório).
+    """
+    files = [i for i in zf.infolist() if not i.is_dir()]
+    if not zf.infolist():
+        raise ValueError("zip archive is empty")
+
+    if entry_name:
+        for info in files:
+            if info.filename == entry_name:
+                return [info]
+        low = entry_name.lower()
+        for info in files:
+            if info.filename.lower() == low:
+                return [info]
+        if any(c in entry_name for c in "*?["):
+            matched = [
+                i
+                for i in files
+                if not i.filename.startswith("__MACOSX/")
+                and fnmatch.fnmatch(i.filename.lower(), low)
+            ]
+            if matched:
+                return matched
+        raise ValueError(f"zip entry '{entry_name}' not found")
+
+    if not files:
+        raise ValueError("no file entries found inside zip archive")
+    return files[:1]
+
+
+class _ZipEntriesReader(io.RawIOBase):
+    """
+    Lê as entradas escolhidas de um zip como um único stream.
+
+    Com várias entradas (partes do mesmo feed) o cabeçalho repetido no início
+    das seguintes é descartado (CSV) e garante-se uma quebra de linha entre
+    partes (NDJSON/CSV continuam válidos). JSON em array não é concatenável.
+    """
+
+    def __init__(self, zf: zipfile.ZipFile, members: list[zipfile.ZipInfo]) -> None:
+        super().__init__()
+        self._zf = zf
+        self._members: Iterator[zipfile.ZipInfo] = iter(members)
+        self._multi = len(members) > 1
+        self._cur: IO[bytes] | None = None
+        self._pending = b""
+        self._header: bytes | None = None
+        self._last = b"\n"
+        # nome da 1ª entrada (content-type por extensão)
+        self.name = members[0].filename if members else ""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:  # type: ignore[override]
+        while True:
+            if self._pending:
+                n = min(len(b), len(self._pending))
+                b[:n] = self._pending[:n]
+                self._pending = self._pending[n:]
+                self._last = bytes(b[n - 1 : n])
+                return n
+
+            if self._cur is None:
+                info = next(self._members, None)
+                if info is None:
+                    return 0
+                self._cur = self._zf.open(info)
+                self._start_entry()
+                continue
+
+            n = self._cur.readinto(b)
+            if n:
+                self._last = bytes(b[n - 1 : n])
+                return n
+            self._cur.close()
+            self._cur = None
+
+    def _start_entry(self) -> None:
+        assert self._cur is not None
+        if not self._multi:
+            return
+        # limitado: JSON minificado numa só linha não vem todo para memória
+        first = self._cur.readline(_HEADER_MAX_BYTES)
+        if self._header is None:
+            self._header = first.rstrip(b"\r\n")
+            self._pending = first
+            return
+        if first.removeprefix(_UTF8_BOM).rstrip(b"\r\n") == self._header.removeprefix(_UTF8_BOM):
+            first = b""
+        sep = b"" if self._last == b"\n" else b"\n"
+        self._pending = sep + first
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._cur is not None:
+                self._cur.close()
+            self._zf.close()
+        finally:
+            super().close()
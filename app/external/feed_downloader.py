@@ -1,19 +1,39 @@
 # app/external/feed_downloader.py
 from __future__ import annotations
 
+import asyncio
 import csv
 import io
 import json
-import zipfile
-from typing import Any
+import re
+from collections.abc import Iterator
+from functools import partial
+from typing import IO, Any, ClassVar
 from urllib.parse import urlparse
 
-from app.external.http_downloader import HttpDownloader
-from app.external.ftp_downloader import FtpDownloader
+from app.external.feed_compression import detect_compression, open_decompressed
+from app.external.feed_payload import FeedPayload
+from app.external.http_downloader import HttpClientPool, HttpDownloader
+from app.external.ftp_downloader import FtpDownloader, FtpSessionPool
 from app.schemas.feeds import FeedTestRequest, FeedTestResponse
 
 MAX_PREVIEW_BYTES = 256 * 1024
 
+JSON_LIST_KEYS = ("data", "items", "results", "products", "rows", "list")
+_JSON_CHUNK_CHARS = 64 * 1024
+_NDJSON_PROBE_CHARS = 1024 * 1024
+_JSON_WS_RE = re.compile(r"[ \t\n\r]*")
+
+_COMPRESSED_CT = {
+    "application/zip",
+    "application/x-zip-compressed",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/octet-stream",
+}
+
 
 def _looks_like_html(raw: bytes) -> bool:
     if not raw:
@@ -79,17 +99,47 @@ class FeedDownloader:
         * trigger_http_headers
         * trigger_http_params
         * trigger_http_body_json
-    - Suporta compressão ZIP via extra_json:
-        * compression = "zip"
-        * zip_entry_name = "ficheiro.csv" (opcional)
+    - Suporta compressão zip/gzip/bz2/xz (descompressão em streaming na leitura):
+        * compression = "zip" | "gzip" | "bz2" | "xz" | "none" (omisso → magic bytes)
+        * zip_entry_name = "ficheiro.csv" ou padrão "*.csv" (várias partes concatenadas)
+
+    O cliente HTTP é partilhado por todas as instâncias (open_http_pool no arranque,
+    close_http_pool no fim: lifespan da API / worker). Sem pool aberto, cada pedido
+    HTTP usa um cliente próprio. O mesmo para as sessões FTP (open_ftp_sessions /
+    close_ftp_sessions): sem pool, cada download FTP faz o seu login.
     """
 
+    _http_pool: ClassVar[HttpClientPool | None] = None
+    _ftp_sessions: ClassVar[FtpSessionPool | None] = None
+
     def __init__(self, timeout_s: int | None = None) -> None:
         from app.core.config import settings  # import tardio para evitar ciclos
 
         self.timeout_s = int(timeout_s or getattr(settings, "FEED_DOWNLOAD_TIMEOUT", 30))
-        self._http = HttpDownloader(timeout_s=self.timeout_s)
-        self._ftp = FtpDownloader(timeout_s=self.timeout_s)
+        self._http = HttpDownloader(timeout_s=self.timeout_s, pool=FeedDownloader._http_pool)
+        self._ftp = FtpDownloader(timeout_s=self.timeout_s, sessions=FeedDownloader._ftp_sessions)
+
+    @classmethod
+    def open_http_pool(cls) -> None:
+        if cls._http_pool is None:
+            cls._http_pool = HttpClientPool()
+
+    @classmethod
+    async def close_http_pool(cls) -> None:
+        pool, cls._http_pool = cls._http_pool, None
+        if pool is not None:
+            await pool.aclose()
+
+    @classmethod
+    def open_ftp_sessions(cls) -> None:
+        if cls._ftp_sessions is None:
+            cls._ftp_sessions = FtpSessionPool()
+
+    @classmethod
+    def close_ftp_sessions(cls) -> None:
+        sessions, cls._ftp_sessions = cls._ftp_sessions, None
+        if sessions is not None:
+            sessions.close()
 
     # -------------------- API principal --------------------
 
@@ -104,11 +154,17 @@ class FeedDownloader:
         auth: dict[str, Any] | None,
         extra: dict[str, Any] | None,
         timeout_s: int | None = None,
-    ) -> tuple[int, str | None, bytes, str | None]:
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> tuple[int, str | None, FeedPayload, str | None]:
         """
-        Faz o download do feed, aplicando trigger_http e compressão (zip) se configurados.
+        Faz o download do feed, aplicando trigger_http e compressão se configurados.
+
+        etag/last_modified (só HTTP): pedido condicional; 304 → feed inalterado,
+        payload vazio. Os validadores da resposta seguem em payload.etag/last_modified.
 
-        Devolve: (status_code, content_type, raw_bytes, error_text).
+        Devolve: (status_code, content_type, payload, error_text).
+        O payload é um ficheiro temporário (memória/disco); quem chama faz payload.close().
         """
         timeout = int(timeout_s or self.timeout_s)
         url = url or ""
@@ -125,7 +181,7 @@ class FeedDownloader:
 
         # 2) Download principal
         if is_ftp:
-            status_code, content_type, raw, err_text = await self._ftp.fetch(
+            status_code, content_type, payload, err_text = await self._ftp.fetch(
                 url=url,
                 auth_kind=auth_kind,
                 auth=auth,
@@ -143,7 +199,7 @@ class FeedDownloader:
                 if isinstance(body, (dict, list)):
                     body_json = body
 
-            status_code, content_type, raw, err_text = await self._http.fetch(
+            status_code, content_type, payload, err_text = await self._http.fetch(
                 url=url,
                 method=method or "GET",
                 headers=headers,
@@ -152,18 +208,24 @@ class FeedDownloader:
                 auth=auth,
                 json_body=body_json,
                 timeout_s=timeout,
+                etag=etag,
+                last_modified=last_modified,
             )
 
-        # 3) Compressão (zip) opcional
-        if 200 <= status_code < 300 and extra:
-            compression = str(extra.get("compression") or "").lower()
-            if compression == "zip":
-                try:
-                    raw, content_type = self._decompress_zip(raw, content_type, extra)
-                except Exception as e:
-                    return 599, content_type, b"", f"zip decompression failed: {e}"
-
-        return status_code, content_type, raw, err_text
+        # 3) Compressão: o payload fica comprimido, payload.open() descomprime em streaming
+        if 200 <= status_code < 300:
+            try:
+                content_type = await asyncio.to_thread(
+                    self._prepare_decompression, payload, content_type, extra, url
+                )
+            except Exception as e:
+                hint = str((extra or {}).get("compression") or "").lower() or "feed"
+                payload.close()
+                failed = FeedPayload()
+                failed.stats = payload.stats
+                return 599, content_type, failed, f"{hint} decompression failed: {e}"
+
+        return status_code, content_type, payload, err_text
 
     async def preview(self, req: FeedTestRequest) -> FeedTestResponse:
         """
@@ -171,7 +233,7 @@ class FeedDownloader:
         devolvendo apenas uma amostra de linhas.
         """
         try:
-            status_code, ct, raw, err_text = await self.download_feed(
+            status_code, ct, payload, err_text = await self.download_feed(
                 kind=req.kind,
                 url=req.url,
                 headers=req.headers,
@@ -192,27 +254,30 @@ class FeedDownloader:
                 error=str(e)[:300],
             )
 
+        # preview só precisa do início: lê a amostra e liberta já o ficheiro temporário
+        with payload:
+            bytes_read = payload.size
+            sample = payload.head(MAX_PREVIEW_BYTES)
+
         # falha HTTP/FTP → devolve erro + pequeno corpo para debug
         if status_code < 200 or status_code >= 300:
             return FeedTestResponse(
                 ok=False,
                 status_code=status_code,
                 content_type=ct,
-                bytes_read=len(raw or b""),
+                bytes_read=bytes_read,
                 preview_type=None,
                 rows_preview=[],
-                error=(err_text or self._decode_best(raw, ct))[:300],
+                error=(err_text or self._decode_best(sample, ct))[:300],
             )
 
-        sample = (raw or b"")[:MAX_PREVIEW_BYTES]
-
         # HTML → snippet curto apenas para debug/login-pages
         if _looks_like_html(sample):
             return FeedTestResponse(
                 ok=True,
                 status_code=status_code,
                 content_type=ct,
-                bytes_read=len(raw or b""),
+                bytes_read=bytes_read,
                 preview_type=None,
                 rows_preview=[{"html_snippet": self._decode_best(sample, ct)[:1200]}],
                 error=None,
@@ -228,7 +293,7 @@ class FeedDownloader:
                 ok=True,
                 status_code=status_code,
                 content_type=ct,
-                bytes_read=len(raw or b""),
+                bytes_read=bytes_read,
                 preview_type="json",
                 rows_preview=rows,
                 error=None,
@@ -244,7 +309,7 @@ class FeedDownloader:
             ok=True,
             status_code=status_code,
             content_type=ct,
-            bytes_read=len(raw or b""),
+            bytes_read=bytes_read,
             preview_type="csv",
             rows_preview=rows,
             error=None,
@@ -294,7 +359,7 @@ class FeedDownloader:
         if not isinstance(body_json, (dict, list)):
             body_json = None
 
-        status, _ct, _raw, err = await self._http.fetch(
+        status, _ct, payload, err = await self._http.fetch(
             url=url,
             method=method or "GET",
             headers=headers,
@@ -304,67 +369,48 @@ class FeedDownloader:
             json_body=body_json,
             timeout_s=timeout_s,
         )
+        payload.close()
         if status < 200 or status >= 300:
             msg = err or f"trigger_http failed with HTTP {status}"
             raise RuntimeError(msg)
 
-    def _decompress_zip(
+    def _prepare_decompression(
         self,
-        raw: bytes,
+        payload: FeedPayload,
         content_type: str | None,
-        extra: dict[str, Any],
-    ) -> tuple[bytes, str | None]:
+        extra: dict[str, Any] | None,
+        url: str,
+    ) -> str | None:
         """
-        Descomprime ZIP em memória e devolve (conteúdo_extraído, content_type_ajustado).
+        Deteta a compressão (extra.compression ou magic bytes) e liga o decoder ao
+        payload: nada é extraído, o parser lê as linhas já descomprimidas.
+        Lê o 1º byte para validar já aqui (zip/entrada inexistente, cabeçalho inválido).
+        Devolve o content_type ajustado ao conteúdo descomprimido.
         """
-        if not raw:
-            raise ValueError("empty payload for zip decompression")
-
-        # verificação leve de assinatura ZIP
-        if len(raw) < 4 or not raw.startswith(b"PK\x03\x04"):
-            raise ValueError("payload does not look like a ZIP file")
-
-        bio = io.BytesIO(raw)
-        with zipfile.ZipFile(bio) as zf:
-            members = zf.infolist()
-            if not members:
-                raise ValueError("zip archive is empty")
-
-            entry_name = extra.get("zip_entry_name")
-            chosen = None
-
-            if isinstance(entry_name, str) and entry_name:
-                # tenta match exato primeiro
-                for info in members:
-                    if info.filename == entry_name:
-                        chosen = info
-                        break
-                # fallback: case-insensitive se não encontrar exato
-                if chosen is None:
-                    low = entry_name.lower()
-                    for info in members:
-                        if info.filename.lower() == low:
-                            chosen = info
-                            break
-                if chosen is None:
-                    raise ValueError(f"zip entry '{entry_name}' not found")
-            else:
-                # escolhe o primeiro ficheiro "real" (não diretório)
-                for info in members:
-                    # ZipInfo em 3.11 tem .is_dir(); se não existir, infere pelo nome
-                    is_dir = getattr(info, "is_dir", lambda: info.filename.endswith("/"))()
-                    if is_dir:
-                        continue
-                    chosen = info
-                    break
-                if chosen is None:
-                    raise ValueError("no file entries found inside zip archive")
+        extra = extra or {}
+        compression = detect_compression(payload.head(8), hint=extra.get("compression"))
+        if compression is None:
+            return content_type
+
+        entry_name = extra.get("zip_entry_name")
+        payload.set_decoder(
+            partial(
+                open_decompressed,
+                compression=compression,
+                entry_name=entry_name if isinstance(entry_name, str) and entry_name else None,
+            )
+        )
+        src = payload.open()
+        src.read(1)
 
-            data = zf.read(chosen.filename)
-            new_ct = content_type
-            if not new_ct or new_ct == "application/zip":
-                new_ct = _guess_content_type_from_path(chosen.filename)
-            return data, new_ct
+        if content_type and content_type.split(";")[0].strip().lower() not in _COMPRESSED_CT:
+            return content_type
+        if compression == "zip":
+            name = getattr(src, "name", None)
+        else:
+            # feed.csv.gz → feed.csv
+            name = urlparse(url).path.rsplit(".", 1)[0]
+        return _guess_content_type_from_path(name)
 
     @staticmethod
     def _decode_best(raw: bytes, ct: str | None) -> str:
@@ -400,7 +446,7 @@ async def http_download(
     """
     downloader = FeedDownloader(timeout_s=timeout_s)
     try:
-        status, ct, raw, _err = await downloader.download_feed(
+        status, ct, payload, _err = await downloader.download_feed(
             kind=None,
             url=url,
             headers=headers,
@@ -412,41 +458,303 @@ async def http_download(
         )
     except Exception:
         return 599, None, b""
-    return status, ct, raw
+    with payload:
+        return status, ct, payload.read_bytes()
+
+
+class _JsonRowReader:
+    """
+    Leitor incremental de JSON: mantém apenas um buffer com o elemento atual
+    e usa JSONDecoder.raw_decode para extrair um valor de cada vez.
+    """
+
+    def __init__(self, text: IO[str]) -> None:
+        self._text = text
+        self._decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.pinned = False  # True → não compactar (offsets guardados continuam válidos)
+
+    def _fill(self, min_chars: int = 1) -> bool:
+        """Lê mais texto para o buffer; devolve False se já não houver nada."""
+        if self.eof:
+            return False
+        if self.pos > _JSON_CHUNK_CHARS and not self.pinned:
+            self.buf = self.buf[self.pos :]
+            self.pos = 0
+        want = max(min_chars, _JSON_CHUNK_CHARS)
+        chunk = self._text.read(want)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def peek(self) -> str:
+        """Salta whitespace e devolve o próximo carácter ('' no fim)."""
+        while True:
+            self.pos = _JSON_WS_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"invalid JSON: expected {chars!r} at offset {self.pos}")
+        self.pos += 1
+        return c
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                val, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise ValueError(f"invalid JSON: {e}") from e
+            # número/literal no fim do buffer pode continuar no próximo chunk
+            if end >= len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return val
+
+    def line(self) -> str | None:
+        """Próxima linha (para NDJSON); None no fim."""
+        while True:
+            nl = self.buf.find("\n", self.pos)
+            if nl >= 0:
+                out = self.buf[self.pos : nl]
+                self.pos = nl + 1
+                return out
+            if not self._fill():
+                if self.pos >= len(self.buf):
+                    return None
+                out = self.buf[self.pos :]
+                self.pos = len(self.buf)
+                return out
+
+    def looks_like_ndjson(self) -> bool:
+        """
+        NDJSON se uma das primeiras linhas for, sozinha, um objeto JSON completo
+        seguido de mais conteúdo que não ',', ']' ou '}' (em JSON válido nada mais
+        pode vir depois de um valor completo). Linhas inválidas à cabeça são
+        ignoradas, como no parse por linhas. Só espreita até _NDJSON_PROBE_CHARS (linhas de NDJSON são
+        pequenas; JSON minificado numa só linha não chega ao fim).
+        """
+        saved = self.pos
+        self.pinned = True
+        try:
+            while self.pos - saved < _NDJSON_PROBE_CHARS:
+                while (
+                    self.buf.find("\n", self.pos) < 0
+                    and len(self.buf) - saved < _NDJSON_PROBE_CHARS
+                ):
+                    if not self._fill():
+                        break
+                nl = self.buf.find("\n", self.pos)
+                if nl < 0:
+                    return False
+                line = self.buf[self.pos : nl].strip()
+                self.pos = nl + 1
+                if not line.startswith("{"):
+                    continue
+                try:
+                    first = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(first, dict) and self.peek() not in ("", ",", "]", "}"):
+                    return True
+            return False
+        finally:
+            self.pos = saved
+            self.pinned = False
+
+    def skip(self) -> None:
+        """Salta o próximo valor; arrays elemento a elemento (sem os materializar)."""
+        if self.peek() == "[":
+            for _ in self.iter_array():
+                pass
+        else:
+            self.value()
+
+    def scan_object(self, *, keep_rows: bool, strict: bool) -> tuple[dict, int | None, list | None]:
+        """
+        Percorre o objeto no topo e escolhe a lista de linhas pela prioridade de
+        JSON_LIST_KEYS (como parse_rows_json sobre o JSON completo), seja qual for a
+        ordem das chaves no documento; com chave repetida vale a 1.ª lista.
+
+        Devolve (objeto sem as listas, índice do membro escolhido ou None, linhas
+        da lista escolhida se keep_rows). A 1.ª chave da prioridade não pode ser
+        ultrapassada: pára logo antes do array (linhas None, ler com iter_array).
+        Com strict=False e JSON truncado fica a melhor lista vista até aí.
+        """
+        obj: dict[str, Any] = {}
+        best_rank, best_idx, rows = len(JSON_LIST_KEYS), None, []
+        try:
+            self.expect("{")
+            if self.peek() == "}":
+                self.pos += 1
+                return obj, None, rows
+            idx = 0
+            while True:
+                key = self.value()
+                self.expect(":")
+                rank = JSON_LIST_KEYS.index(key) if key in JSON_LIST_KEYS else best_rank
+                if rank == 0 and self.peek() == "[":
+                    return obj, idx, None
+                if rank < best_rank and self.peek() == "[":
+                    best_rank, best_idx, rows = rank, idx, []
+                    for val in self.iter_array():
+                        if keep_rows and isinstance(val, dict):
+                            rows.append(val)
+                elif key in JSON_LIST_KEYS and self.peek() == "[":
+                    self.skip()
+                else:
+                    obj[str(key)] = self.value()
+                idx += 1
+                if self.expect(",}") == "}":
+                    break
+        except ValueError:
+            if strict or best_idx is None:
+                raise
+        return obj, best_idx, rows
+
+    def iter_member_array(self, idx: int) -> Iterator[Any]:
+        """Elementos do array que é o valor do idx-ésimo membro do objeto no topo."""
+        self.expect("{")
+        for _ in range(idx):
+            self.value()
+            self.expect(":")
+            self.skip()
+            self.expect(",")
+        self.value()
+        self.expect(":")
+        yield from self.iter_array()
+
+    def iter_array(self) -> Iterator[Any]:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_rows_json(raw: bytes | IO[bytes], *, strict: bool = True) -> Iterator[dict]:
+    """
+    Extrai linhas (dicts) de JSON em streaming, com memória limitada ao elemento atual:
+
+    - lista no topo → um dict por elemento;
+    - objeto no topo → elementos da lista em {data|items|results|products|rows|list}
+      (por esta ordem de prioridade); sem lista conhecida → o próprio objeto é a
+      única linha;
+    - NDJSON (detetado à cabeça) → um dict por linha (linhas inválidas são ignoradas).
+
+    Num objeto a lista só é conhecida depois de o ler todo: com stream seekable
+    faz-se uma 1.ª passagem para a escolher e outra para a devolver; caso
+    contrário a lista escolhida fica em memória.
+
+    strict=False devolve apenas o que foi possível ler de JSON truncado/inválido
+    (útil para previews sobre um sample); strict=True levanta ValueError.
+    """
+    stream = io.BytesIO(raw) if isinstance(raw, bytes | bytearray | memoryview) else raw
+    origin = stream.tell() if stream.seekable() else None
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="ignore")
+    reader = _JsonRowReader(text)
+    try:
+        first = reader.peek()
+        if first == "[":
+            for val in reader.iter_array():
+                if isinstance(val, dict):
+                    yield val
+        elif first and reader.looks_like_ndjson():
+            while (line := reader.line()) is not None:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    val = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(val, dict):
+                    yield val
+        elif first == "{":
+            obj, idx, rows = reader.scan_object(keep_rows=origin is None, strict=strict)
+            if idx is None:
+                yield obj
+            elif rows is None:
+                for val in reader.iter_array():
+                    if isinstance(val, dict):
+                        yield val
+            elif origin is None:
+                yield from rows
+            else:
+                # 2.ª passagem: só a lista escolhida
+                text.detach()
+                stream.seek(origin)
+                text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="ignore")
+                reader = _JsonRowReader(text)
+                for val in reader.iter_member_array(idx):
+                    if isinstance(val, dict):
+                        yield val
+    except ValueError:
+        if strict:
+            raise
+    finally:
+        text.detach()
 
 
 def parse_rows_json(raw: bytes) -> list[dict]:
     """
     Extrai linhas (dicts) de JSON (lista, {data|items|results|products|rows|list}, objeto único),
-    ou NDJSON (uma linha JSON por linha).
+    ou NDJSON (uma linha JSON por linha). Versão tolerante (preview) de iter_rows_json.
+    """
+    return list(iter_rows_json(raw, strict=False))
+
+
+def iter_rows_csv(
+    raw: bytes | IO[bytes],
+    *,
+    delimiter: str = ",",
+    max_rows: int | None = None,
+) -> Iterator[dict]:
+    """
+    Lê CSV em streaming (1ª linha = cabeçalho) e devolve um dict por linha.
+
+    - aceita bytes ou um stream binário (não é fechado no fim);
+    - descodifica incrementalmente (utf-8, BOM removido, bytes inválidos ignorados);
+    - pára assim que atingir max_rows.
     """
-    # 1) JSON tradicional
+    stream = io.BytesIO(raw) if isinstance(raw, bytes | bytearray | memoryview) else raw
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="ignore", newline="")
     try:
-        obj = json.loads(raw.decode(errors="ignore"))
-        if isinstance(obj, list):
-            return [x for x in obj if isinstance(x, dict)]
-        if isinstance(obj, dict):
-            for key in ("data", "items", "results", "products", "rows", "list"):
-                v = obj.get(key)
+        reader = csv.DictReader(
+            text,
+            delimiter=(delimiter or ","),
+            restkey="_extra",
+            restval="",
+        )
+        for i, row in enumerate(reader, 1):
+            clean: dict[str, Any] = {}
+            for k, v in row.items():
+                if k is None:
+                    continue
+                key = str(k).strip() or f"col_{len(clean) + 1}"
                 if isinstance(v, list):
-                    return [x for x in v if isinstance(x, dict)]
-            return [obj]
-    except Exception:
-        pass
-
-    # 2) NDJSON (cada linha um JSON por linha)
-    out: list[dict] = []
-    for line in raw.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            val = json.loads(line.decode(errors="ignore"))
-            if isinstance(val, dict):
-                out.append(val)
-        except Exception:
-            continue
-    return out
+                    v = ",".join("" if x is None else str(x) for x in v)
+                clean[key] = "" if v is None else v
+            yield clean
+            if max_rows and i >= max_rows:
+                break
+    finally:
+        # devolve o stream ao chamador sem o fechar
+        text.detach()
 
 
 def parse_rows_csv(
@@ -457,31 +765,6 @@ def parse_rows_csv(
 ) -> list[dict]:
     """
     Converte CSV → lista de dicts (usando 1ª linha como cabeçalho).
+    Para feeds grandes usar iter_rows_csv (não materializa o ficheiro).
     """
-    text = FeedDownloader._decode_best(raw, ct="text/csv; charset=utf-8")
-    # Remove BOM se existir
-    if text.startswith("\ufeff"):
-        text = text.lstrip("\ufeff")
-
-    sio = io.StringIO(text)
-    reader = csv.DictReader(
-        sio,
-        delimiter=(delimiter or ","),
-        restkey="_extra",
-        restval="",
-    )
-
-    out: list[dict] = []
-    for i, row in enumerate(reader, 1):
-        clean: dict[str, Any] = {}
-        for k, v in row.items():
-            if k is None:
-                continue
-            key = str(k).strip() or f"col_{len(clean) + 1}"
-            if isinstance(v, list):
-                v = ",".join("" if x is None else str(x) for x in v)
-            clean[key] = "" if v is None else v
-        out.append(clean)
-        if max_rows and i >= max_rows:
-            break
-    return out
+    return list(iter_rows_csv(raw, delimiter=delimiter, max_rows=max_rows))
@@ -0,0 +1,166 @@
+# app/external/feed_payload.py
+from __future__ import annotations
+
+import hashlib
+import tempfile
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import IO
+
+from app.core.config import settings
+
+_COPY_CHUNK_BYTES = 1024 * 1024
+
+
+@dataclass
+class DownloadStats:
+    """
+    Tráfego do download: tentativas e bytes recebidos da rede (inclui bytes
+    descartados quando uma tentativa recomeça do zero).
+    """
+
+    attempts: int = 0
+    bytes_received: int = 0
+    resumes: int = 0  # tentativas que continuaram a partir do já recebido (Range/REST)
+
+
+class FeedPayload:
+    """
+    Conteúdo de um feed descarregado, guardado num SpooledTemporaryFile.
+
+    - Até FEED_SPOOL_MAX_MEMORY_BYTES fica em memória; acima disso passa para disco;
+    - Downloaders escrevem por chunks (write/copy_from), sem juntar tudo num bytes;
+    - Parsers leem via open() (file handle), sem cópias intermédias;
+    - Payload comprimido (set_decoder): guardado tal como veio, open() devolve
+      o conteúdo descomprimido em streaming (zip/gzip/bz2/xz);
+    - SHA-256 do conteúdo calculado à medida que é escrito (sha256).
+
+    O handle é partilhado: um leitor de cada vez (open() volta sempre ao início).
+    """
+
+    def __init__(self, max_memory_bytes: int | None = None) -> None:
+        if max_memory_bytes is None:
+            max_memory_bytes = int(getattr(settings, "FEED_SPOOL_MAX_MEMORY_BYTES", 0) or 0)
+        self._file: IO[bytes] = tempfile.SpooledTemporaryFile(
+            max_size=max_memory_bytes,
+            mode="w+b",
+            dir=getattr(settings, "FEED_SPOOL_DIR", None) or None,
+        )
+        self.size = 0
+        self._sha = hashlib.sha256()
+        # validadores HTTP da resposta (ETag / Last-Modified), se o servidor os enviou
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.stats = DownloadStats()
+        # raw → stream descomprimido (None = conteúdo guardado tal e qual)
+        self.decoder: Callable[[IO[bytes]], IO[bytes]] | None = None
+        self._reader: IO[bytes] | None = None
+        self._content_sha: str | None = None
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> FeedPayload:
+        payload = cls()
+        payload.write(data)
+        return payload
+
+    # -------------------- escrita --------------------
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self._file.write(chunk)
+        self._sha.update(chunk)
+        self.size += len(chunk)
+
+    def copy_from(self, src: IO[bytes]) -> None:
+        """
+        Copia um stream (ex.: entrada de um zip) por blocos.
+        """
+        self._file.seek(0, 2)
+        while chunk := src.read(_COPY_CHUNK_BYTES):
+            self.write(chunk)
+
+    @property
+    def sha256(self) -> str:
+        """
+        SHA-256 (hex) do conteúdo. Sem decoder: de tudo o que foi escrito até agora;
+        com decoder: do conteúdo descomprimido (1 passagem extra, calculado uma vez;
+        invalida um leitor aberto por open()).
+        """
+        if self.decoder is None:
+            return self._sha.hexdigest()
+        if self._content_sha is None:
+            sha = hashlib.sha256()
+            src = self.open()
+            while chunk := src.read(_COPY_CHUNK_BYTES):
+                sha.update(chunk)
+            self._close_reader()
+            self._content_sha = sha.hexdigest()
+        return self._content_sha
+
+    def set_decoder(self, decoder: Callable[[IO[bytes]], IO[bytes]] | None) -> None:
+        """
+        Define como ler o conteúdo guardado (ex.: descompressão); open()/head()/sha256
+        passam a ver o resultado do decoder.
+        """
+        self._close_reader()
+        self.decoder = decoder
+        self._content_sha = None
+
+    def reset(self) -> None:
+        """
+        Descarta o conteúdo (download recomeça do zero).
+        """
+        self._close_reader()
+        self._file.seek(0)
+        self._file.truncate()
+        self._sha = hashlib.sha256()
+        self.size = 0
+        self._content_sha = None
+
+    # -------------------- leitura --------------------
+
+    @property
+    def on_disk(self) -> bool:
+        return bool(getattr(self._file, "_rolled", False))
+
+    def open(self) -> IO[bytes]:
+        """
+        Devolve o conteúdo desde o início (não fechar; usar close() do payload):
+        o file handle ou, com decoder, um stream descomprimido sobre ele.
+        """
+        self._close_reader()
+        self._file.seek(0)
+        if self.decoder is None:
+            return self._file
+        self._reader = self.decoder(self._file)
+        return self._reader
+
+    def head(self, n: int) -> bytes:
+        return self.open().read(n)
+
+    def read_bytes(self) -> bytes:
+        """
+        Lê tudo para memória (apenas para APIs de compatibilidade que exigem bytes).
+        """
+        return self.open().read()
+
+    def _close_reader(self) -> None:
+        reader, self._reader = self._reader, None
+        if reader is not None:
+            reader.close()
+
+    # -------------------- ciclo de vida --------------------
+
+    def close(self) -> None:
+        self._close_reader()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __enter__(self) -> FeedPayload:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
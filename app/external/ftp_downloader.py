@@ -2,10 +2,27 @@
 from __future__ import annotations
 
 import asyncio
+import ftplib
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
 from typing import Any
 from urllib.parse import urlparse
 
 from app.core.config import settings
+from app.external.feed_payload import FeedPayload
+from app.external.http_downloader import backoff_delay
+
+log = logging.getLogger("gsm.ftp")
+
+# (scheme, host, port, user, password)
+_SessionKey = tuple[str, str, int, str, str]
+
+# REST não suportado/recusado
+_REST_REJECTED = {"500", "501", "502", "504", "554"}
 
 
 def _guess_content_type_from_path(path: str | None) -> str | None:
@@ -23,6 +40,125 @@ def _guess_content_type_from_path(path: str | None) -> str | None:
     return None
 
 
+class _TransferIncomplete(Exception):
+    pass
+
+
+# falhas que justificam nova tentativa (rede, 4xx FTP, resposta inesperada, transferência cortada)
+_TRANSIENT_ERRORS = (
+    OSError,
+    EOFError,
+    ftplib.error_temp,
+    ftplib.error_reply,
+    _TransferIncomplete,
+)
+
+
+@dataclass
+class _RemoteFile:
+    path: str
+    modified: str | None = None  # YYYYMMDDHHMMSS[.sss] (UTC), comparável como texto
+    size: int | None = None
+
+
+def _list_files(ftp: ftplib.FTP, dir_path: str, ext: str) -> list[_RemoteFile]:
+    """
+    Ficheiros da diretoria (filtrados pela extensão), com data de modificação e tamanho.
+    MLSD quando o servidor suporta; senão NLST + MDTM/SIZE por candidato.
+    """
+    prefix = "" if dir_path in {"", "."} else dir_path.rstrip("/") + "/"
+
+    def _keep(base: str) -> bool:
+        if base in {".", "..", ".ftpquota"}:
+            return False
+        return not ext or base.lower().endswith("." + ext)
+
+    try:
+        entries = list(ftp.mlsd(dir_path, facts=["type", "size", "modify"]))
+    except ftplib.error_perm:
+        entries = None
+
+    if entries is not None:
+        files: list[_RemoteFile] = []
+        for name, facts in entries:
+            if facts.get("type", "file").lower() != "file" or not _keep(name):
+                continue
+            size = facts.get("size")
+            files.append(
+                _RemoteFile(
+                    path=prefix + name,
+                    modified=facts.get("modify"),
+                    size=int(size) if size and size.isdigit() else None,
+                )
+            )
+        return files
+
+    files = []
+    for name in ftp.nlst(dir_path):
+        if not name or not _keep(name.rsplit("/", 1)[-1]):
+            continue
+        f = _RemoteFile(path=name)
+        with suppress(ftplib.error_perm, ftplib.error_reply):
+            f.modified = ftp.voidcmd(f"MDTM {name}")[4:].strip() or None
+        files.append(f)
+    return files
+
+
+class FtpSessionPool:
+    """
+    Sessões FTP autenticadas reutilizadas dentro do processo (API / worker):
+    vários feeds no mesmo servidor evitam novo connect + login a cada download.
+
+    Uma sessão é usada por um download de cada vez; ao devolver fica inativa
+    (até FEED_FTP_MAX_IDLE_PER_HOST por servidor/credenciais) e é validada com
+    NOOP antes de voltar a ser usada. Sessões com erro são descartadas.
+    """
+
+    def __init__(self) -> None:
+        self._idle: dict[_SessionKey, list[tuple[float, ftplib.FTP]]] = {}
+        self._lock = threading.Lock()
+        self.keepalive_s = float(settings.FEED_FTP_KEEPALIVE_S)
+        self.max_idle = max(0, int(settings.FEED_FTP_MAX_IDLE_PER_HOST))
+
+    def acquire(self, key: _SessionKey) -> ftplib.FTP | None:
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                since, ftp = idle.pop()
+            if time.monotonic() - since <= self.keepalive_s:
+                try:
+                    ftp.voidcmd("NOOP")
+                    return ftp
+                except Exception:
+                    pass
+            _close_quietly(ftp)
+
+    def release(self, key: _SessionKey, ftp: ftplib.FTP) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((time.monotonic(), ftp))
+                return
+        _close_quietly(ftp)
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = [ftp for idle in self._idle.values() for _, ftp in idle]
+            self._idle.clear()
+        for ftp in sessions:
+            _close_quietly(ftp, quit=True)
+
+
+def _close_quietly(ftp: ftplib.FTP, *, quit: bool = False) -> None:
+    if quit:
+        with suppress(Exception):
+            ftp.quit()
+    with suppress(Exception):
+        ftp.close()
+
+
 class FtpDownloader:
     """
     Downloader FTP/FTPS simples para feeds.
@@ -34,12 +170,35 @@ class FtpDownloader:
 
     Suporta ainda campos extra (diretamente ou em extra["extra_fields"]):
       - ftp_file_ext: "csv", "zip", ...
-      - ftp_auto_latest: "1"/"true"/"yes"/"on" → escolhe ficheiro mais "recente"
+      - ftp_auto_latest: "1"/"true"/"yes"/"on" → escolhe o ficheiro mais recente
+        (data de modificação via MLSD/MDTM; sem ela, o último por nome)
       - ftp_dir: diretoria específica (ex.: "/feeds")
+
+    O RETR escreve diretamente no FeedPayload; transferência cortada é retomada
+    com REST a partir dos bytes já recebidos (FEED_DOWNLOAD_RETRIES, com backoff).
+    Com pool (FtpSessionPool) a sessão autenticada é reutilizada entre downloads.
     """
 
-    def __init__(self, timeout_s: int | None = None) -> None:
+    def __init__(
+        self, timeout_s: int | None = None, sessions: FtpSessionPool | None = None
+    ) -> None:
         self.timeout_s = int(timeout_s or getattr(settings, "FEED_DOWNLOAD_TIMEOUT", 30))
+        self._sessions = sessions
+
+    @contextmanager
+    def _session(self, key: _SessionKey, connect: Callable[[], ftplib.FTP]) -> Iterator[ftplib.FTP]:
+        ftp = self._sessions.acquire(key) if self._sessions is not None else None
+        if ftp is None:
+            ftp = connect()
+        try:
+            yield ftp
+        except BaseException:
+            _close_quietly(ftp)
+            raise
+        if self._sessions is not None:
+            self._sessions.release(key, ftp)
+        else:
+            _close_quietly(ftp, quit=True)
 
     async def fetch(
         self,
@@ -49,18 +208,17 @@ class FtpDownloader:
         auth: dict[str, Any] | None = None,
         timeout_s: int | None = None,
         extra: dict[str, Any] | None = None,
-    ) -> tuple[int, str | None, bytes, str | None]:
+    ) -> tuple[int, str | None, FeedPayload, str | None]:
         """
         Faz download via FTP/FTPS.
 
-        Devolve (status_code, content_type_guess, raw_bytes, error_text).
+        Devolve (status_code, content_type_guess, payload, error_text); o RETR escreve
+        diretamente no FeedPayload (spool memória/disco), quem chama faz payload.close().
         Em caso de erro devolve status_code 599 e error_text com a mensagem.
         """
         timeout = int(timeout_s or self.timeout_s)
 
-        def _run_sync() -> tuple[int, str | None, bytes, str | None]:
-            import ftplib  # stdlib
-
+        def _run_sync() -> tuple[int, str | None, FeedPayload, str | None]:
             # helper: lê de extra ou extra["extra_fields"]
             def _get_extra(key: str, default: Any = None) -> Any:
                 if not isinstance(extra, dict):
@@ -104,7 +262,7 @@ class FtpDownloader:
                 pwd = auth.get("password") or auth.get("pass") or auth.get("ftp_password") or pwd
 
             if not host:
-                return 599, None, b"", "FTP host not provided"
+                return 599, None, FeedPayload(), "FTP host not provided"
 
             user = user or "anonymous"
             pwd = pwd or "anonymous@"
@@ -128,86 +286,128 @@ class FtpDownloader:
             ftp_dir_extra = _get_extra("ftp_dir")
 
             path_local = path or ""
-            ftp_cls = ftplib.FTP_TLS if scheme == "ftps" else ftplib.FTP
+            key: _SessionKey = (scheme, host, port, str(user), str(pwd))
 
-            try:
-                with ftp_cls() as ftp:
+            def _connect() -> ftplib.FTP:
+                ftp_cls = ftplib.FTP_TLS if scheme == "ftps" else ftplib.FTP
+                ftp = ftp_cls()
+                try:
                     ftp.connect(host, port, timeout=timeout)
                     ftp.login(user, pwd)
-                    ftp.set_pasv(True)
-
-                    target_path = path_local
-                    is_dir = False
-                    dir_path: str | None = None
-
-                    if ftp_auto_latest:
-                        # modo auto-latest: vamos sempre listar diretoria
-                        if isinstance(ftp_dir_extra, str) and ftp_dir_extra.strip():
-                            dir_path = ftp_dir_extra
-                        else:
-                            # se o path começa por '/', assumimos que é diretoria; senão, root
-                            if path_local.startswith("/"):
-                                dir_path = path_local
+                except Exception:
+                    ftp.close()
+                    raise
+                return ftp
+
+            if ftp_auto_latest:
+                # modo auto-latest: vamos sempre listar diretoria
+                if isinstance(ftp_dir_extra, str) and ftp_dir_extra.strip():
+                    dir_path: str | None = ftp_dir_extra
+                else:
+                    # se o path começa por '/', assumimos que é diretoria; senão, root
+                    dir_path = path_local if path_local.startswith("/") else "."
+            elif path_local in {"", "/", "."} or path_local.endswith("/"):
+                # comportamento antigo: diretoria se vazio, '/', '.', ou terminar em '/'
+                dir_path = path_local or "."
+            else:
+                dir_path = None
+
+            payload = FeedPayload()
+            stats = payload.stats
+            target_path = path_local
+            expected_size: int | None = None
+            selected = dir_path is None
+            rest_ok = True
+            max_attempts = 1 + max(0, int(settings.FEED_DOWNLOAD_RETRIES))
+
+            def _write(chunk: bytes) -> None:
+                payload.write(chunk)
+                stats.bytes_received += len(chunk)
+
+            for attempt in range(1, max_attempts + 1):
+                stats.attempts = attempt
+                try:
+                    with self._session(key, _connect) as ftp:
+                        ftp.set_pasv(True)
+
+                        if not selected:
+                            candidates = _list_files(ftp, dir_path or ".", ftp_file_ext)
+                            if not candidates:
+                                payload.close()
+                                return (
+                                    404,
+                                    None,
+                                    FeedPayload(),
+                                    "No matching files found in FTP directory",
+                                )
+                            if ftp_auto_latest:
+                                chosen = max(candidates, key=lambda c: (c.modified or "", c.path))
                             else:
-                                dir_path = "."
-                        is_dir = True
-                    else:
-                        # comportamento antigo: diretoria se vazio, '/', '.', ou terminar em '/'
-                        is_dir = path_local in {"", "/", "."} or path_local.endswith("/")
-                        if is_dir:
-                            dir_path = path_local or "."
-
-                    if is_dir:
-                        listing = ftp.nlst(dir_path or ".")
-                        candidates: list[str] = []
-
-                        for name in listing:
-                            if not name:
-                                continue
-                            base = name.rsplit("/", 1)[-1]
-                            if base in {".", "..", ".ftpquota"}:
-                                continue
-
-                            if ftp_file_ext and not base.lower().endswith("." + ftp_file_ext):
-                                continue
-
-                            candidates.append(name)
-
-                        if not candidates:
-                            return (
-                                404,
-                                None,
-                                b"",
-                                "No matching files found in FTP directory",
+                                chosen = min(candidates, key=lambda c: c.path)
+                            target_path, expected_size = chosen.path, chosen.size
+                            selected = True
+
+                        ftp.voidcmd("TYPE I")
+                        if expected_size is None:
+                            with suppress(ftplib.Error):
+                                expected_size = ftp.size(target_path)
+
+                        rest = payload.size if rest_ok and payload.size else None
+                        if rest:
+                            stats.resumes += 1
+                        elif payload.size:
+                            payload.reset()
+                        try:
+                            ftp.retrbinary(f"RETR {target_path}", _write, rest=rest)
+                        except ftplib.error_perm as e:
+                            if rest and str(e)[:3] in _REST_REJECTED:
+                                rest_ok = False  # servidor sem REST → recomeça do zero
+                                raise _TransferIncomplete(str(e)) from e
+                            raise
+
+                        if expected_size is not None and payload.size < expected_size:
+                            raise _TransferIncomplete(
+                                f"transfer ended at {payload.size} of {expected_size} bytes"
                             )
 
-                        candidates_sorted = sorted(candidates)
-                        chosen = candidates_sorted[-1] if ftp_auto_latest else candidates_sorted[0]
-                        target_path = chosen
-
-                    # se não for diretoria nem auto-latest, target_path = path_local
-
-                    chunks: list[bytes] = []
-
-                    def _collector(data: bytes) -> None:
-                        chunks.append(data)
-
-                    ftp.retrbinary(f"RETR {target_path}", _collector)
-                    raw = b"".join(chunks)
-
-                    # ⚠️ Se não quiseres apagar os ficheiros da Globomatik, comenta isto:
-                    try:
-                        ftp.delete(target_path)
-                    except Exception:
-                        pass
+                        # ⚠️ Se não quiseres apagar os ficheiros da Globomatik, comenta isto:
+                        try:
+                            ftp.delete(target_path)
+                        except Exception:
+                            pass
 
                     ct = _guess_content_type_from_path(target_path)
-                    return 200, ct, raw, None
-            except Exception as e:
-                return 599, None, b"", str(e)
+                    return 200, ct, payload, None
+                except _TRANSIENT_ERRORS as e:
+                    if attempt >= max_attempts:
+                        payload.close()
+                        failed = FeedPayload()
+                        failed.stats = stats
+                        return 599, None, failed, str(e)
+                    delay = backoff_delay(attempt)
+                    log.warning(
+                        "FTP %s%s failed at %s bytes (attempt %s/%s: %s), retrying in %.1fs",
+                        host,
+                        f" {target_path}" if selected else "",
+                        payload.size,
+                        attempt,
+                        max_attempts,
+                        e,
+                        delay,
+                    )
+                    time.sleep(delay)
+                except Exception as e:
+                    payload.close()
+                    failed = FeedPayload()
+                    failed.stats = stats
+                    return 599, None, failed, str(e)
+
+            # inalcançável (a última tentativa devolve sempre)
+            payload.close()
+            return 599, None, FeedPayload(), "FTP download failed"
 
         # 👇 ISTO É O QUE TE ESTAVA A FALTAR SE ESTIVERES A VER O "NoneType":
         try:
             return await asyncio.to_thread(_run_sync)
         except Exception as e:
-            return 599, None, b"", str(e)
+            return 599, None, FeedPayload(), str(e)
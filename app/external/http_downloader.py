@@ -1,21 +1,134 @@
 # app/external/http_downloader.py
 from __future__ import annotations
 
+import asyncio
+import importlib.util
+import logging
+import random
+import re
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from http.cookiejar import CookieJar, DefaultCookiePolicy
 from typing import Any
 
 import httpx
 
 from app.core.config import settings
+from app.external.feed_payload import DownloadStats, FeedPayload
+
+log = logging.getLogger("gsm.http")
+
+# respostas que justificam nova tentativa (sobrecarga / gateway / timeout)
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+_CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-\d+/(?:\d+|\*)")
+
+
+def backoff_delay(attempt: int, retry_after: str | None = None) -> float:
+    """
+    Espera antes da tentativa attempt+1: exponencial com jitter, limitada a
+    FEED_DOWNLOAD_BACKOFF_MAX_S; Retry-After (segundos) do servidor tem prioridade.
+    """
+    cap = float(settings.FEED_DOWNLOAD_BACKOFF_MAX_S)
+    if retry_after and retry_after.strip().isdigit():
+        return min(cap, float(retry_after))
+    base = float(settings.FEED_DOWNLOAD_BACKOFF_S) * (2 ** (attempt - 1))
+    return min(cap, base) * random.uniform(0.5, 1.0)
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status: int) -> None:
+        super().__init__(f"HTTP {status}")
+
+
+def _resumable(resp: httpx.Response) -> bool:
+    """
+    Pode continuar com Range: bytes sem content-encoding (offsets = bytes do
+    payload) e com validador para o If-Range (garante que é o mesmo ficheiro).
+    """
+    h = resp.headers
+    return (
+        h.get("accept-ranges", "").lower() == "bytes"
+        and not h.get("content-encoding")
+        and bool(h.get("etag") or h.get("last-modified"))
+    )
+
+
+def _range_start(resp: httpx.Response) -> int | None:
+    m = _CONTENT_RANGE_RE.fullmatch(resp.headers.get("content-range", "").strip())
+    return int(m.group(1)) if m else None
+
+
+def _timeout(read_s: float) -> httpx.Timeout:
+    # read/write = timeout do download; connect e espera pelo pool configurados à parte
+    return httpx.Timeout(
+        read_s,
+        connect=settings.FEED_HTTP_CONNECT_TIMEOUT_S,
+        pool=settings.FEED_HTTP_POOL_TIMEOUT_S,
+    )
+
+
+class HttpClientPool:
+    """
+    httpx.AsyncClient partilhado durante a vida do processo (keep-alive, HTTP/2
+    opcional) + limite de pedidos em simultâneo por host.
+
+    Cookies não são guardados: cada pedido continua isolado (como com um cliente
+    por pedido), sem sessões a passar entre fornecedores.
+    """
+
+    def __init__(self) -> None:
+        http2 = bool(settings.FEED_HTTP2)
+        if http2 and importlib.util.find_spec("h2") is None:
+            log.warning("FEED_HTTP2 enabled but 'h2' is not installed; using HTTP/1.1")
+            http2 = False
+
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            timeout=_timeout(float(settings.FEED_DOWNLOAD_TIMEOUT)),
+            limits=httpx.Limits(
+                max_connections=max(1, settings.FEED_HTTP_MAX_CONNECTIONS),
+                max_keepalive_connections=max(1, settings.FEED_HTTP_MAX_CONNECTIONS),
+                keepalive_expiry=settings.FEED_HTTP_KEEPALIVE_S,
+            ),
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        )
+        self._per_host = max(1, settings.FEED_HTTP_MAX_PER_HOST)
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+
+    @asynccontextmanager
+    async def host_slot(self, url: str) -> AsyncIterator[None]:
+        host = httpx.URL(url).host.lower()
+        sem = self._hosts.get(host)
+        if sem is None:
+            sem = self._hosts[host] = asyncio.Semaphore(self._per_host)
+        async with sem:
+            yield
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
 
 
 class HttpDownloader:
     """
     Cliente HTTP simples para download de feeds.
     Suporta auth_kind básico (basic, bearer, api_key/header, oauth_password).
+
+    Com `pool` usa o cliente partilhado (ligações reaproveitadas entre pedidos);
+    sem pool (scripts, processos sem lifespan) abre um cliente por pedido.
     """
 
-    def __init__(self, timeout_s: int | None = None) -> None:
+    def __init__(self, timeout_s: int | None = None, pool: HttpClientPool | None = None) -> None:
         self.timeout_s = int(timeout_s or getattr(settings, "FEED_DOWNLOAD_TIMEOUT", 30))
+        self.pool = pool
+
+    @asynccontextmanager
+    async def _client(self, url: str) -> AsyncIterator[httpx.AsyncClient]:
+        if self.pool is None:
+            async with httpx.AsyncClient(timeout=_timeout(self.timeout_s)) as cli:
+                yield cli
+            return
+        async with self.pool.host_slot(url):
+            yield self.pool.client
 
     async def fetch(
         self,
@@ -28,11 +141,24 @@ class HttpDownloader:
         auth: dict[str, Any] | None = None,
         json_body: Any = None,
         timeout_s: int | None = None,
-    ) -> tuple[int, str | None, bytes, str | None]:
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> tuple[int, str | None, FeedPayload, str | None]:
         """
-        Executa o pedido HTTP e devolve (status_code, content_type, raw_bytes, error_text).
+        Executa o pedido HTTP e devolve (status_code, content_type, payload, error_text).
+
+        O corpo é escrito por chunks num FeedPayload (spool memória/disco); quem chama
+        é responsável por payload.close().
+        etag/last_modified → pedido condicional (If-None-Match / If-Modified-Since);
+        se o servidor responder 304 o payload vem vazio. Os validadores da resposta
+        ficam em payload.etag / payload.last_modified.
 
-        Em caso de exceção de rede, devolve status_code 599 e error_text com a mensagem.
+        GET com falha transitória (erro de rede, 408/425/429/5xx) é repetido até
+        FEED_DOWNLOAD_RETRIES vezes com backoff exponencial. Se a ligação cair a
+        meio e o servidor aceitar ranges, a tentativa seguinte pede só o que falta
+        (Range + If-Range) e continua a escrever no mesmo payload; caso contrário
+        (ou se o 206 não começar no byte pedido) recomeça do zero. Tentativas/bytes recebidos ficam em payload.stats.
+        Se todas falharem por rede, devolve status_code 599 e error_text com a mensagem.
         """
         timeout = int(timeout_s or self.timeout_s)
 
@@ -72,24 +198,125 @@ class HttpDownloader:
         h.setdefault("Accept", "application/json,text/csv;q=0.9,*/*;q=0.1")
         h.setdefault("User-Agent", getattr(settings, "PS_USER_AGENT", "genesys/2.0"))
 
-        try:
-            async with httpx.AsyncClient(timeout=timeout) as cli:
-                resp = await cli.request(
-                    method=method or "GET",
-                    url=url,
-                    headers=h,
-                    params=params,
-                    json=json_body,
-                    auth=httpx_auth,
+        # pedido condicional (headers explícitos do feed têm prioridade)
+        if etag:
+            h.setdefault("If-None-Match", etag)
+        if last_modified:
+            h.setdefault("If-Modified-Since", last_modified)
+
+        method = (method or "GET").upper()
+        max_attempts = 1 + max(0, int(settings.FEED_DOWNLOAD_RETRIES)) if method == "GET" else 1
+        payload = FeedPayload()
+        stats = payload.stats
+        resume_from: str | None = None  # validador (If-Range) quando há bytes a aproveitar
+
+        while True:
+            stats.attempts += 1
+            last_try = stats.attempts >= max_attempts
+            req_h = dict(h)
+            if resume_from is not None:
+                # retoma: sem pedido condicional (304 aqui seria um falso "inalterado")
+                req_h.pop("If-None-Match", None)
+                req_h.pop("If-Modified-Since", None)
+                req_h["Range"] = f"bytes={payload.size}-"
+                req_h["If-Range"] = resume_from
+
+            resumable: str | None = None  # validador desta resposta, se der para retomar
+            retry_after: str | None = None
+            try:
+                async with (
+                    self._client(url) as cli,
+                    cli.stream(
+                        method=method,
+                        url=url,
+                        headers=req_h,
+                        params=params,
+                        json=json_body,
+                        auth=httpx_auth,
+                        timeout=_timeout(timeout),
+                    ) as resp,
+                ):
+                    status = resp.status_code
+                    resumed = (
+                        resume_from is not None
+                        and status == 206
+                        and _range_start(resp) == payload.size
+                        and not resp.headers.get("content-encoding")
+                    )
+                    if resumed:
+                        stats.resumes += 1
+                        resumable = resume_from
+                    else:
+                        payload.reset()  # servidor devolveu o ficheiro todo (ou outra coisa)
+                        if status == 206 or (resume_from is not None and status == 416):
+                            # range recusado, ou parcial que não continua onde ficámos
+                            # (offset errado / content-encoding): nova tentativa do zero;
+                            # um 206 nunca é aceite como download completo
+                            status = 599
+                        elif status in RETRY_STATUSES:
+                            retry_after = resp.headers.get("retry-after")
+                        if status < 300:
+                            payload.etag = resp.headers.get("etag")
+                            payload.last_modified = resp.headers.get("last-modified")
+                            if _resumable(resp):
+                                resumable = payload.etag or payload.last_modified
+
+                    if status == 599 and last_try:
+                        payload.close()
+                        return (
+                            599,
+                            None,
+                            self._failed(stats),
+                            f"invalid partial response (HTTP {resp.status_code})",
+                        )
+                    if not last_try and (status == 599 or status in RETRY_STATUSES):
+                        raise _RetryableStatus(status)
+
+                    async for chunk in resp.aiter_bytes():
+                        payload.write(chunk)
+                        stats.bytes_received += len(chunk)
+
+                    err_text = None
+                    if status >= 400:
+                        # usamos texto simples; preview depois faz decode melhor se precisar
+                        try:
+                            err_text = payload.head(4096).decode(
+                                resp.encoding or "utf-8", errors="ignore"
+                            )
+                        except Exception:
+                            err_text = None
+                    ct = resp.headers.get("content-type")
+                    return (200 if resumed else status), ct, payload, err_text
+
+            except (httpx.TransportError, _RetryableStatus) as e:
+                # erro de rede (inclui timeouts e ligação cortada a meio) ou resposta transitória
+                if last_try:
+                    payload.close()
+                    return 599, None, self._failed(stats), str(e)
+                resume_from = resumable if payload.size else None
+                if resume_from is None:
+                    payload.reset()
+                delay = backoff_delay(stats.attempts, retry_after)
+                log.warning(
+                    "%s %s failed at %s bytes (attempt %s/%s: %s), %s in %.1fs",
+                    method,
+                    url,
+                    payload.size,
+                    stats.attempts,
+                    max_attempts,
+                    e,
+                    "resuming" if resume_from else "retrying",
+                    delay,
                 )
-                ct = resp.headers.get("content-type")
-                err_text = None
-                if resp.status_code >= 400:
-                    # usamos texto simples; preview depois faz decode melhor se precisar
-                    try:
-                        err_text = resp.text[:4096]
-                    except Exception:
-                        err_text = None
-                return resp.status_code, ct, resp.content, err_text
-        except Exception as e:  # erros de rede
-            return 599, None, b"", str(e)
+                await asyncio.sleep(delay)  # fora do `async with`: ligação e slot do host livres
+
+            except Exception as e:  # outros erros (URL inválido, etc.)
+                payload.close()
+                return 599, None, self._failed(stats), str(e)
+
+    @staticmethod
+    def _failed(stats: DownloadStats) -> FeedPayload:
+        # payload vazio para o 599, com as estatísticas das tentativas feitas
+        empty = FeedPayload()
+        empty.stats = stats
+        return empty
@@ -2,6 +2,8 @@
 import logging
 from sqlalchemy import text
 
+from app.infra.base import utcnow
+
 log = logging.getLogger("gsm.bootstrap")
 
 
@@ -46,3 +48,98 @@ def ensure_brand_category_ci(engine):
             )
         else:
             log.warning("UNIQUE categories SKIPPED: duplicates exist (clean first).")
+
+
+def ensure_catalog_update_stream_pending_unique(engine):
+    """
+    Garante o índice único parcial (id_product, event_type) WHERE status='pending'
+    usado pelo enqueue em lote (ON CONFLICT).
+    - Antes de criar, colapsa pendentes duplicados: fica o mais recente com a
+      prioridade máxima do grupo; os restantes passam a 'done' (superseded).
+    - Dedupe + CREATE INDEX na mesma transação (curta).
+    """
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM pg_indexes WHERE indexname = 'ux_cus_pending_product_event'")
+        ).first()
+        if exists:
+            return
+
+        conn.execute(
+            text(
+                """
+                WITH ranked AS (
+                    SELECT id,
+                           row_number() OVER w AS rn,
+                           max(priority) OVER (PARTITION BY id_product, event_type) AS max_priority
+                    FROM catalog_update_stream
+                    WHERE status = 'pending'
+                    WINDOW w AS (
+                        PARTITION BY id_product, event_type
+                        ORDER BY created_at DESC, id DESC
+                    )
+                ),
+                keep AS (
+                    UPDATE catalog_update_stream c
+                    SET priority = r.max_priority
+                    FROM ranked r
+                    WHERE c.id = r.id AND r.rn = 1 AND c.priority <> r.max_priority
+                )
+                UPDATE catalog_update_stream c
+                SET status = 'done',
+                    processed_at = :now,
+                    last_error = 'superseded by newer pending event'
+                FROM ranked r
+                WHERE c.id = r.id AND r.rn > 1
+                """
+            ),
+            {"now": utcnow()},
+        )
+        conn.exec_driver_sql(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_cus_pending_product_event "
+            "ON catalog_update_stream (id_product, event_type) WHERE status = 'pending';"
+        )
+
+
+# create_all não altera tabelas existentes: colunas novas de feed_runs entram por aqui
+_FEED_RUN_COLUMNS = (
+    "stage varchar(32)",
+    "queued_at timestamp without time zone",
+    "rows_processed integer NOT NULL DEFAULT 0",
+    "rows_ok integer NOT NULL DEFAULT 0",
+    "rows_bad integer NOT NULL DEFAULT 0",
+    "progress_at timestamp without time zone",
+    "unchanged_reason varchar(32)",
+    "payload_sha256 varchar(64)",
+    "mapper_version integer",
+    "download_attempts integer",
+    "download_bytes bigint",
+    "download_ms integer",
+    "stage_ms_json text",
+    "peak_rss_kb bigint",
+)
+
+_SUPPLIER_FEED_COLUMNS = (
+    "http_etag varchar(255)",
+    "http_last_modified varchar(64)",
+)
+
+
+def _add_missing_columns(engine, table: str, columns: tuple[str, ...]) -> None:
+    with engine.begin() as conn:
+        for ddl in columns:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {ddl};")
+
+
+def ensure_feed_run_columns(engine):
+    """
+    Acrescenta a feed_runs as colunas em falta (ADD COLUMN IF NOT EXISTS, idempotente).
+    """
+    _add_missing_columns(engine, "feed_runs", _FEED_RUN_COLUMNS)
+
+
+def ensure_supplier_feed_columns(engine):
+    """
+    Acrescenta a supplier_feeds as colunas em falta (ADD COLUMN IF NOT EXISTS, idempotente).
+    """
+    _add_missing_columns(engine, "supplier_feeds", _SUPPLIER_FEED_COLUMNS)
@@ -0,0 +1,186 @@
+# app/infra/jobs.py
+# Pool simples de jobs assíncronos em background (no processo da API)
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from collections.abc import Awaitable, Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+from app.core.config import settings
+
+log = logging.getLogger("gsm.jobs")
+
+_SHORT_CALL_THREADS = 4
+
+# chamadas run_blocking feitas dentro de um track_blocking() (ver locks.advisory_lock)
+_tracked: contextvars.ContextVar[list[Future[Any]] | None] = contextvars.ContextVar(
+    "gsm_jobs_tracked", default=None
+)
+
+T = TypeVar("T")
+
+
+class JobRunner:
+    """
+    Executa coroutines em background no event loop da app:
+    - submit() agenda o job e devolve logo; run() corre-o e espera pelo fim;
+    - no máximo `max_concurrent` jobs em simultâneo (os restantes esperam em fila);
+    - exceções dos jobs vão para o log (o job é responsável pelo seu estado);
+    - run_blocking() corre trabalho síncrono (BD/CPU) num thread pool dedicado,
+      para não bloquear o event loop (o loop fica só com I/O de rede);
+    - run_short() corre chamadas curtas de BD (criar/abortar runs, locks, leituras)
+      num pool à parte, para não ficarem em fila atrás de ingests em curso;
+    - shutdown() cancela o que estiver pendente/em curso.
+    """
+
+    def __init__(self, *, max_concurrent: int, thread_name_prefix: str = "job") -> None:
+        max_concurrent = max(1, int(max_concurrent))
+        self._sem = asyncio.Semaphore(max_concurrent)
+        self._tasks: set[asyncio.Task[Any]] = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrent,
+            thread_name_prefix=thread_name_prefix,
+        )
+        self._short_executor = ThreadPoolExecutor(
+            max_workers=_SHORT_CALL_THREADS,
+            thread_name_prefix=f"{thread_name_prefix}-short",
+        )
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def submit(
+        self,
+        name: str,
+        job: Callable[[], Awaitable[Any]],
+        *,
+        throttle: bool = True,
+    ) -> asyncio.Task[Any]:
+        """
+        throttle=False → não ocupa vaga do limite (orquestradores que lançam
+        outros jobs e controlam a sua própria concorrência).
+        """
+        coro = self.run(name, job) if throttle else self._run(name, job)
+        task = asyncio.get_running_loop().create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def run_blocking(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        """
+        Equivalente a asyncio.to_thread, mas no pool dedicado (mantém contextvars, ex.: request id).
+        Cancelar o await não interrompe a função: a thread corre até ao fim.
+        Para o trabalho pesado do ingest (ocupa a thread durante toda a run).
+        """
+        ctx = contextvars.copy_context()
+        future = self._executor.submit(ctx.run, fn, *args, **kwargs)
+        tracked = _tracked.get()
+        if tracked is not None:
+            tracked.append(future)
+        return await asyncio.wrap_future(future)
+
+    async def run_short(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        """
+        Como run_blocking, mas para chamadas curtas (uma transação pequena): nunca
+        esperam por um ingest que esteja a ocupar o pool principal.
+        """
+        return await self._in_executor(self._short_executor, fn, *args, **kwargs)
+
+    @contextmanager
+    def track_blocking(self) -> Iterator[list[Future[Any]]]:
+        """
+        Junta numa lista os futures das chamadas run_blocking feitas dentro do bloco
+        (na mesma task): permitem saber se ainda há trabalho a correr numa thread
+        depois de o await ter sido cancelado.
+        """
+        futures: list[Future[Any]] = []
+        token = _tracked.set(futures)
+        try:
+            yield futures
+        finally:
+            _tracked.reset(token)
+
+    def call_when_done(self, futures: list[Future[Any]], fn: Callable[[], Any]) -> None:
+        """
+        Corre fn (sem esperar) quando todos os futures tiverem terminado: na thread
+        que termina o último ou, se já terminaram todos, no pool curto.
+        Exceções de fn vão para o log.
+        """
+
+        def call() -> None:
+            try:
+                fn()
+            except Exception:
+                log.exception("deferred call %r failed", fn)
+
+        pending = [f for f in futures if not f.done()]
+        if not pending:
+            try:
+                self._short_executor.submit(call)
+            except RuntimeError:  # pool já desligado (shutdown)
+                call()
+            return
+
+        remaining = len(pending)
+        guard = threading.Lock()
+
+        def on_done(_f: Future[Any]) -> None:
+            nonlocal remaining
+            with guard:
+                remaining -= 1
+                last = remaining == 0
+            if last:
+                call()
+
+        for f in pending:
+            f.add_done_callback(on_done)
+
+    @staticmethod
+    async def _in_executor(
+        executor: ThreadPoolExecutor, fn: Callable[..., T], /, *args: Any, **kwargs: Any
+    ) -> T:
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, fn, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+    async def run(self, name: str, job: Callable[[], Awaitable[Any]]) -> None:
+        """
+        Corre o job já (à espera de vaga no limite de concorrência) e só devolve no fim.
+        """
+        async with self._sem:
+            await self._run(name, job)
+
+    async def _run(self, name: str, job: Callable[[], Awaitable[Any]]) -> None:
+        log.info("job %s started (pending=%s)", name, self.pending)
+        try:
+            await job()
+        except asyncio.CancelledError:
+            log.warning("job %s cancelled", name)
+            raise
+        except Exception:
+            log.exception("job %s failed", name)
+        else:
+            log.info("job %s finished", name)
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks)
+        for t in tasks:
+            t.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._short_executor.shutdown(wait=False, cancel_futures=True)
+
+
+ingest_jobs = JobRunner(
+    max_concurrent=settings.INGEST_MAX_CONCURRENT_JOBS,
+    thread_name_prefix="ingest",
+)
@@ -0,0 +1,89 @@
+# app/infra/locks.py
+# Advisory locks do PostgreSQL (exclusão mútua entre processos/réplicas)
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.infra.jobs import JobRunner
+from app.infra.session import engine as default_engine
+
+# namespaces (1.º inteiro do pg_advisory_lock(int, int)); o 2.º é o id do recurso
+LOCK_NS_FEED_INGEST = 1001
+
+
+class AdvisoryLock:
+    """
+    pg_try_advisory_lock(ns, key) ao nível da sessão, numa ligação dedicada em
+    AUTOCOMMIT (não fica nenhuma transação aberta enquanto o lock é mantido).
+    Métodos síncronos (I/O de BD): em código async correr fora do event loop.
+    """
+
+    def __init__(self, ns: int, key: int, *, engine: Engine | None = None) -> None:
+        self._params = {"ns": ns, "key": key}
+        self._engine = engine or default_engine
+        self._conn: Connection | None = None
+
+    def try_acquire(self) -> bool:
+        """
+        Não bloqueia: devolve False se outro processo já tiver o lock.
+        """
+        conn = self._engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            acquired = bool(
+                conn.execute(text("SELECT pg_try_advisory_lock(:ns, :key)"), self._params).scalar()
+            )
+        except BaseException:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def release(self) -> None:
+        """
+        Liberta o lock (idempotente). Fechar a ligação também o liberta, pelo que
+        um unlock falhado não o deixa preso.
+        """
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            with suppress(Exception):
+                conn.execute(text("SELECT pg_advisory_unlock(:ns, :key)"), self._params)
+        finally:
+            conn.close()
+
+
+@asynccontextmanager
+async def advisory_lock(
+    ns: int, key: int, *, runner: JobRunner, engine: Engine | None = None
+) -> AsyncIterator[bool]:
+    """
+    AdvisoryLock para código async: ligação, lock e unlock correm no pool curto
+    do runner (nunca no event loop). Produz True/False (lock obtido ou não).
+
+    O lock acompanha o trabalho do bloco e não só o await: as chamadas
+    runner.run_blocking feitas lá dentro são seguidas e, se o bloco sair (ex.:
+    cancelamento no shutdown) com alguma ainda a correr numa thread, o unlock
+    só acontece quando ela terminar.
+    """
+    lock = AdvisoryLock(ns, key, engine=engine)
+    if not await runner.run_short(lock.try_acquire):
+        yield False
+        return
+
+    with runner.track_blocking() as futures:
+        try:
+            yield True
+        finally:
+            if all(f.done() for f in futures):
+                await runner.run_short(lock.release)
+            else:
+                runner.call_when_done(futures, lock.release)
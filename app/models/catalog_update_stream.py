@@ -1,7 +1,7 @@
 from __future__ import annotations
 from datetime import datetime
 
-from sqlalchemy import Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Integer, String, Text, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.infra.base import Base, utcnow
@@ -9,6 +9,16 @@ from app.infra.base import Base, utcnow
 
 class CatalogUpdateStream(Base):
     __tablename__ = "catalog_update_stream"
+    __table_args__ = (
+        # no máximo 1 evento pending por produto/tipo → alvo do ON CONFLICT no enqueue em lote
+        Index(
+            "ux_cus_pending_product_event",
+            "id_product",
+            "event_type",
+            unique=True,
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
@@ -1,6 +1,6 @@
 # app/models/feed_run.py
 
-from sqlalchemy import DateTime, ForeignKey, Integer, Text
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.infra.base import Base, utcnow
@@ -15,6 +15,8 @@ class FeedRun(Base):
         Integer, ForeignKey("supplier_feeds.id", ondelete="CASCADE"), index=True
     )
 
+    # queued_at: criação da run pelo submit (fica em fila); started_at: início real do ingest
+    queued_at: Mapped[DateTime | None] = mapped_column(DateTime, default=None)
     started_at: Mapped[DateTime] = mapped_column(DateTime, default=utcnow)
     finished_at: Mapped[DateTime | None] = mapped_column(DateTime, default=None)
     status: Mapped[str] = mapped_column(RUN_STATUS, default="running", nullable=False)
@@ -24,4 +26,26 @@ class FeedRun(Base):
     duration_ms: Mapped[int | None] = mapped_column(Integer, default=None)
     error_msg: Mapped[str | None] = mapped_column(Text, default=None)
 
+    # progresso (escrito durante a run numa sessão própria; ver IngestProgress)
+    stage: Mapped[str | None] = mapped_column(String(32), default=None)
+    rows_processed: Mapped[int] = mapped_column(Integer, default=0)
+    rows_ok: Mapped[int] = mapped_column(Integer, default=0)
+    rows_bad: Mapped[int] = mapped_column(Integer, default=0)
+    progress_at: Mapped[DateTime | None] = mapped_column(DateTime, default=None)
+
+    # run terminada sem processar o feed (ex.: "not_modified" → HTTP 304)
+    unchanged_reason: Mapped[str | None] = mapped_column(String(32), default=None)
+    # conteúdo ingerido por completo (feed descomprimido) + versão do mapper usada
+    payload_sha256: Mapped[str | None] = mapped_column(String(64), default=None)
+    mapper_version: Mapped[int | None] = mapped_column(Integer, default=None)
+
+    # download: tentativas (retries/retomas), bytes recebidos da rede e tempo gasto
+    download_attempts: Mapped[int | None] = mapped_column(Integer, default=None)
+    download_bytes: Mapped[int | None] = mapped_column(BigInteger, default=None)
+    download_ms: Mapped[int | None] = mapped_column(Integer, default=None)
+
+    # tempo por etapa da run (JSON etapa → ms, exclusivo) + pico de RSS do processo
+    stage_ms_json: Mapped[str | None] = mapped_column(Text, default=None)
+    peak_rss_kb: Mapped[int | None] = mapped_column(BigInteger, default=None)
+
     feed = relationship("SupplierFeed", back_populates="runs")
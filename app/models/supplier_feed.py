@@ -35,6 +35,10 @@ class SupplierFeed(Base):
     extra_json: Mapped[str | None] = mapped_column(Text, nullable=True)
     csv_delimiter: Mapped[str | None] = mapped_column(String(4), nullable=True)
 
+    # validadores HTTP do último download ingerido por completo (pedido condicional)
+    http_etag: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    http_last_modified: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, nullable=False)
     updated_at: Mapped[datetime | None] = mapped_column(
         DateTime, onupdate=utcnow, default=utcnow, nullable=True
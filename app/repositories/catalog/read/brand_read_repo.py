@@ -6,9 +6,9 @@ from sqlalchemy.orm import Session
 
 from app.core.errors import NotFound
 from app.models.brand import Brand
-from app.core.normalize import normalize_key_ci
+from app.core.normalize import BRAND_NAME_MAX_LEN, normalize_key_ci
 
-MAX_NAME_LEN = 200
+MAX_NAME_LEN = BRAND_NAME_MAX_LEN
 
 
 class BrandsReadRepository:
@@ -32,6 +32,17 @@ class BrandsReadRepository:
         stmt = select(Brand).where(func.lower(func.btrim(Brand.name)) == key).limit(1)
         return self.db.execute(stmt).scalars().first()
 
+    def map_ids_by_key(self) -> dict[str, int]:
+        """
+        {lower(btrim(name)): id} de todas as marcas (cache do ingest; mesma chave do get_by_name).
+        """
+        stmt = select(func.lower(func.btrim(Brand.name)), Brand.id).order_by(Brand.id.asc())
+        out: dict[str, int] = {}
+        for key, id_brand in self.db.execute(stmt):
+            if key:
+                out.setdefault(key, id_brand)
+        return out
+
     def list(self, *, q: str | None, page: int, page_size: int):
         page = max(1, page)
         page_size = max(1, min(page_size, 100))
@@ -4,10 +4,10 @@ from __future__ import annotations
 from sqlalchemy import select, func, and_
 from sqlalchemy.orm import Session
 
-from app.core.normalize import normalize_key_ci
+from app.core.normalize import CATEGORY_NAME_MAX_LEN, normalize_key_ci
 from app.models.category import Category
 
-MAX_NAME_LEN = 300
+MAX_NAME_LEN = CATEGORY_NAME_MAX_LEN
 
 
 class CategoryReadRepository:
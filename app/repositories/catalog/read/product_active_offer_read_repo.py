@@ -1,6 +1,8 @@
 # app/repositories/catalog/read/product_active_offer_read_repo.py
 from __future__ import annotations
 
+from typing import Any
+
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
@@ -34,3 +36,29 @@ class ProductActiveOfferReadRepository:
         stmt = select(ProductActiveOffer).where(ProductActiveOffer.id_product.in_(ids))
         rows = self.db.scalars(stmt).all()
         return {row.id_product: row for row in rows}
+
+    def snapshots_for_products(self, ids: list[int]) -> dict[int, dict[str, Any]]:
+        """
+        {id_product: snapshot} só com as colunas usadas na deteção de mudanças
+        (mesmo formato que sync_events._snapshot_active_offer), sem carregar ORM/joins.
+        """
+        if not ids:
+            return {}
+        stmt = select(
+            ProductActiveOffer.id_product,
+            ProductActiveOffer.id_supplier,
+            ProductActiveOffer.id_supplier_item,
+            ProductActiveOffer.unit_price_sent,
+            ProductActiveOffer.stock_sent,
+        ).where(ProductActiveOffer.id_product.in_(ids))
+        return {
+            r.id_product: {
+                "id_supplier": r.id_supplier,
+                "id_supplier_item": r.id_supplier_item,
+                "unit_price_sent": float(r.unit_price_sent)
+                if r.unit_price_sent is not None
+                else None,
+                "stock_sent": int(r.stock_sent or 0),
+            }
+            for r in self.db.execute(stmt)
+        }
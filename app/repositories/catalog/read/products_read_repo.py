@@ -34,6 +34,23 @@ class ProductsReadRepository:
         stmt = select(Product).where(Product.id_brand == id_brand, Product.partnumber == partnumber)
         return self.db.scalar(stmt)
 
+    def iter_keys(self, *, chunk_size: int = 10_000):
+        """
+        Stream (id, gtin, id_brand, partnumber) de todos os produtos com chave
+        (gtin ou brand+mpn), via cursor server-side. Usado pelo índice do ingest.
+        """
+        stmt = (
+            select(Product.id, Product.gtin, Product.id_brand, Product.partnumber)
+            .where(
+                or_(
+                    Product.gtin.is_not(None),
+                    and_(Product.id_brand.is_not(None), Product.partnumber.is_not(None)),
+                )
+            )
+            .execution_options(yield_per=chunk_size)
+        )
+        return self.db.execute(stmt)
+
     # Lista paginada com filtros/sort ----------------------------
     def list_products(
         self,
@@ -207,6 +224,33 @@ class ProductsReadRepository:
         stmt = select(Product.id).where(Product.gtin == gtin)
         return self.db.scalar(stmt)
 
+    def list_by_ids(self, ids: list[int]) -> dict[int, Product]:
+        """Mapa {id: Product} numa só query (ex.: emissão de eventos em lote)."""
+        if not ids:
+            return {}
+        rows = self.db.scalars(select(Product).where(Product.id.in_(ids))).all()
+        return {p.id: p for p in rows}
+
+    def map_margins(self, ids: list[int], *, only_linked: bool = False) -> dict[int, float]:
+        """
+        {id_product: margin} normalizada como em get_product_margin (None/inválida/<0 → 0.0).
+        only_linked=True → apenas produtos ligados ao PrestaShop (id_ecommerce > 0).
+        """
+        if not ids:
+            return {}
+        stmt = select(Product.id, Product.margin).where(Product.id.in_(ids))
+        if only_linked:
+            stmt = stmt.where(Product.id_ecommerce > 0)
+
+        out: dict[int, float] = {}
+        for id_product, raw in self.db.execute(stmt):
+            try:
+                margin = float(raw) if raw is not None else 0.0
+            except (TypeError, ValueError):
+                margin = 0.0
+            out[id_product] = max(margin, 0.0)
+        return out
+
     # Margem de produto
     def get_product_margin(self, id_product: int) -> float:
         """
@@ -2,7 +2,10 @@ from __future__ import annotations
 
 import json
 import logging
+from collections.abc import Sequence
 from datetime import datetime
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from typing import Any
 
@@ -12,6 +15,8 @@ from app.models.product_active_offer import ProductActiveOffer
 
 log = logging.getLogger("gsm.catalog.update_stream")
 
+ENQUEUE_BATCH = 1000  # eventos por INSERT ... ON CONFLICT
+
 
 class CatalogUpdateStreamWriteRepository:
     def __init__(self, db: Session) -> None:
@@ -90,12 +95,12 @@ class CatalogUpdateStreamWriteRepository:
         payload_dict = self._build_payload(product, active_offer, reason=reason)
         now = datetime.utcnow()
 
-        # Procura um evento pendente existente para este produto/ecommerce
+        # Procura um evento pendente existente para este produto
+        # (mesma chave do índice único parcial ux_cus_pending_product_event)
         existing = (
             self.db.query(CatalogUpdateStream)
             .filter(
                 CatalogUpdateStream.id_product == product.id,
-                CatalogUpdateStream.id_ecommerce == product.id_ecommerce,
                 CatalogUpdateStream.event_type == "product_state_changed",
                 CatalogUpdateStream.status == "pending",
             )
@@ -110,6 +115,7 @@ class CatalogUpdateStreamWriteRepository:
             new_priority = max(old_priority, priority)
 
             existing.priority = new_priority
+            existing.id_ecommerce = product.id_ecommerce
             existing.payload = payload_json
             existing.available_at = now
             # opcional: limpar erro/attempts, porque é um "novo" pedido lógico
@@ -150,6 +156,65 @@ class CatalogUpdateStreamWriteRepository:
 
         return evt
 
+    def enqueue_product_state_changes(
+        self,
+        items: Sequence[tuple[Product, Any, int]],
+        *,
+        reason: str,
+    ) -> int:
+        """
+        Versão em lote de enqueue_product_state_change: items = (product, active_offer, priority).
+
+        Um INSERT ... ON CONFLICT por lote contra o índice parcial
+        (id_product, event_type) WHERE status='pending':
+        - sem pending → insere;
+        - com pending → atualiza payload/available_at, limpa erro e fica com a
+          prioridade máxima (mesma regra de merge do caminho unitário).
+        Produtos repetidos no mesmo lote são colapsados antes (último payload, max priority).
+        Devolve o nº de eventos enviados para a BD. Não faz commit.
+        """
+        now = datetime.utcnow()
+        rows: dict[int, dict[str, Any]] = {}
+        for product, active_offer, priority in items:
+            payload_json = json.dumps(
+                self._build_payload(product, active_offer, reason=reason), ensure_ascii=False
+            )
+            prev = rows.get(product.id)
+            rows[product.id] = {
+                "id_product": product.id,
+                "id_ecommerce": product.id_ecommerce,
+                "event_type": "product_state_changed",
+                "priority": max(priority, prev["priority"]) if prev else priority,
+                "status": "pending",
+                "payload": payload_json,
+                "attempts": 0,
+                "created_at": now,
+                "available_at": now,
+            }
+
+        values = list(rows.values())
+        for start in range(0, len(values), ENQUEUE_BATCH):
+            stmt = pg_insert(CatalogUpdateStream).values(values[start : start + ENQUEUE_BATCH])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[CatalogUpdateStream.id_product, CatalogUpdateStream.event_type],
+                index_where=text("status = 'pending'"),
+                set_={
+                    "priority": func.greatest(CatalogUpdateStream.priority, stmt.excluded.priority),
+                    "id_ecommerce": stmt.excluded.id_ecommerce,
+                    "payload": stmt.excluded.payload,
+                    "available_at": stmt.excluded.available_at,
+                    "last_error": None,
+                },
+            )
+            self.db.execute(stmt)
+
+        log.info(
+            "catalog_update_stream: enqueue_product_state_changes count=%s reason=%s",
+            len(values),
+            reason,
+        )
+        return len(values)
+
     def claim_pending_batch(
         self,
         *,
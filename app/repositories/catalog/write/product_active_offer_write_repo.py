@@ -2,8 +2,10 @@
 from __future__ import annotations
 
 from datetime import datetime
+from typing import Any
 
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.infra.base import utcnow
@@ -67,3 +69,25 @@ class ProductActiveOfferWriteRepository:
 
         self.db.flush()
         return entity
+
+    def upsert_many(self, rows: list[dict[str, Any]]) -> None:
+        """
+        Upsert em lote por id_product (INSERT ... ON CONFLICT DO UPDATE).
+        Cada dict: id_product, id_supplier, id_supplier_item, unit_cost,
+        unit_price_sent, stock_sent, synced_at. Não faz commit.
+        """
+        if not rows:
+            return
+        stmt = pg_insert(ProductActiveOffer)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ProductActiveOffer.id_product],
+            set_={
+                "id_supplier": stmt.excluded.id_supplier,
+                "id_supplier_item": stmt.excluded.id_supplier_item,
+                "unit_cost": stmt.excluded.unit_cost,
+                "unit_price_sent": stmt.excluded.unit_price_sent,
+                "stock_sent": stmt.excluded.stock_sent,
+                "synced_at": stmt.excluded.synced_at,
+            },
+        )
+        self.db.execute(stmt, rows)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+from typing import Any
+
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.core.errors import InvalidArgument
@@ -71,6 +74,21 @@ class ProductWriteRepository:
         self.db.flush()
         return p
 
+    def insert_many(self, rows: list[dict[str, Any]]) -> list[Any]:
+        """
+        INSERT em lote de produtos novos (gtin/id_brand/partnumber/margin).
+        Conflitos com os índices únicos (corrida com outra run) são ignorados;
+        devolve apenas as linhas inseridas: (id, gtin, id_brand, partnumber).
+        """
+        if not rows:
+            return []
+        stmt = (
+            pg_insert(Product)
+            .on_conflict_do_nothing()
+            .returning(Product.id, Product.gtin, Product.id_brand, Product.partnumber)
+        )
+        return list(self.db.execute(stmt, rows))
+
     def fill_canonicals_if_empty(self, id_product: int, **fields):
         p = self.db.get(Product, id_product)
         if not p:
@@ -1,9 +1,14 @@
 # app/repositories/read/feed_run_read_repo.py
 from __future__ import annotations
 
+from collections.abc import Sequence
+from datetime import datetime
+
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from app.core.errors import NotFound
 from app.models.feed_run import FeedRun
+from app.models.supplier_feed import SupplierFeed
 
 
 class FeedRunReadRepository:
@@ -18,3 +23,54 @@ class FeedRunReadRepository:
         if not run:
             raise NotFound("Run not found")
         return run
+
+    def list_for_supplier(
+        self, id_supplier: int, page: int, page_size: int
+    ) -> tuple[Sequence[FeedRun], int]:
+        """
+        Runs do(s) feed(s) do supplier, da mais recente para a mais antiga.
+        """
+        page = max(1, page)
+        page_size = max(1, min(page_size, 100))
+
+        stmt = (
+            select(FeedRun)
+            .join(SupplierFeed, SupplierFeed.id == FeedRun.id_feed)
+            .where(SupplierFeed.id_supplier == id_supplier)
+        )
+        total = self.db.scalar(select(func.count()).select_from(stmt.subquery())) or 0
+        rows = (
+            self.db.execute(
+                stmt.order_by(FeedRun.id.desc()).limit(page_size).offset((page - 1) * page_size)
+            )
+            .scalars()
+            .all()
+        )
+        return rows, int(total)
+
+    def last_started_at(self, id_feed: int) -> datetime | None:
+        """
+        Início da run mais recente do feed (qualquer estado).
+        """
+        return self.db.execute(
+            select(func.max(FeedRun.started_at)).where(FeedRun.id_feed == id_feed)
+        ).scalar()
+
+    def last_ingested(self, id_feed: int) -> FeedRun | None:
+        """
+        Run ok/partial mais recente do feed que gravou linhas (exclui "unchanged").
+        """
+        return (
+            self.db.execute(
+                select(FeedRun)
+                .where(
+                    FeedRun.id_feed == id_feed,
+                    FeedRun.status.in_(("ok", "partial")),
+                    FeedRun.unchanged_reason.is_(None),
+                )
+                .order_by(FeedRun.id.desc())
+                .limit(1)
+            )
+            .scalars()
+            .first()
+        )
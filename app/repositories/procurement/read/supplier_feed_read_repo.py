@@ -36,6 +36,17 @@ class SupplierFeedReadRepository:
             .first()
         )
 
+    def list_active_for_schedule(self) -> list[tuple[int, int, str | None]]:
+        """
+        Feeds ativos para o scheduler do worker: (id_feed, id_supplier, extra_json).
+        """
+        rows = self.db.execute(
+            select(SupplierFeed.id, SupplierFeed.id_supplier, SupplierFeed.extra_json)
+            .where(SupplierFeed.active.is_(True))
+            .order_by(SupplierFeed.id)
+        ).all()
+        return [(r[0], r[1], r[2]) for r in rows]
+
     def get_by_url_ci(self, url: str) -> SupplierFeed | None:
         u = _norm_url(url)
         if not u:
@@ -2,7 +2,7 @@ from __future__ import annotations
 from typing import Any
 from collections.abc import Sequence
 
-from sqlalchemy import select
+from sqlalchemy import Numeric, cast, select
 from sqlalchemy.orm import Session
 
 from app.models.supplier_item import SupplierItem as SI
@@ -10,10 +10,35 @@ from app.models.supplier_feed import SupplierFeed as SF
 from app.models.supplier import Supplier as S
 
 
+# preços válidos (o que float() aceitaria num preço normalizado: "39.99", "-1", ".5")
+_PRICE_RE = r"^\s*[-+]?([0-9]+(\.[0-9]*)?|\.[0-9]+)\s*$"
+
+
 class SupplierItemReadRepository:
     def __init__(self, db: Session):
         self.db = db
 
+    def map_fingerprints_by_sku(
+        self, id_feed: int, *, chunk_size: int = 10_000
+    ) -> dict[str, bytes]:
+        """
+        {sku: fingerprint (digest sha256 em bytes)} de todos os itens do feed.
+        Lido em stream e guardado compacto (32 bytes por SKU) para o short-circuit do ingest.
+        """
+        stmt = (
+            select(SI.sku, SI.fingerprint)
+            .where(SI.id_feed == id_feed)
+            .execution_options(yield_per=chunk_size)
+        )
+        out: dict[str, bytes] = {}
+        for sku, fp in self.db.execute(stmt):
+            if sku and fp:
+                try:
+                    out[sku] = bytes.fromhex(fp)
+                except ValueError:
+                    continue
+        return out
+
     def list_offers_for_product_ids(
         self,
         product_ids: Sequence[int],
@@ -49,6 +74,43 @@ class SupplierItemReadRepository:
 
         return [dict(r._mapping) for r in self.db.execute(q).all()]
 
+    def best_offers_for_products(self, product_ids: Sequence[int]) -> dict[int, Any]:
+        """
+        Oferta vencedora por produto numa só query (DISTINCT ON), com o mesmo
+        critério de choose_active_offer_candidate: com stock primeiro, depois menor
+        preço, maior stock, menor id_supplier (id do item só para desempate estável).
+        Devolve {id_product: row(id_product, id_supplier, price, stock)}.
+        """
+        if not product_ids:
+            return {}
+
+        cost = cast(SI.price, Numeric)
+        q = (
+            select(
+                SI.id_product.label("id_product"),
+                SF.id_supplier.label("id_supplier"),
+                SI.price.label("price"),
+                SI.stock.label("stock"),
+            )
+            .join(SF, SF.id == SI.id_feed)
+            .join(S, S.id == SF.id_supplier)
+            .where(
+                SI.id_product.in_(list(product_ids)),
+                SI.price.regexp_match(_PRICE_RE),
+                SI.stock.is_not(None),
+            )
+            .distinct(SI.id_product)
+            .order_by(
+                SI.id_product,
+                (SI.stock > 0).desc(),
+                cost.asc(),
+                SI.stock.desc(),
+                SF.id_supplier.asc(),
+                SI.id.asc(),
+            )
+        )
+        return {r.id_product: r for r in self.db.execute(q)}
+
     def list_offers_for_product(
         self, id_product: int, *, only_in_stock: bool = False
     ) -> list[dict[str, Any]]:
@@ -1,8 +1,13 @@
 # app/repositories/write/feed_run_write_repo.py
 from __future__ import annotations
 
+import json
+from datetime import datetime
+
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from app.core.errors import NotFound
+from app.infra.base import utcnow
 from app.models.feed_run import FeedRun
 
 
@@ -17,19 +22,141 @@ class FeedRunWriteRepository:
             raise NotFound("Run not found")
         return run
 
-    def start(self, *, id_feed: int) -> FeedRun:
-        run = FeedRun(id_feed=id_feed, status="running")
+    @staticmethod
+    def _finish(run: FeedRun) -> None:
+        run.finished_at = utcnow()
+        if run.started_at is not None:
+            run.duration_ms = int((run.finished_at - run.started_at).total_seconds() * 1000)
+
+    def start(self, *, id_feed: int, stage: str | None = None) -> FeedRun:
+        # stage="queued": run criada para um job que ainda vai esperar por vaga
+        now = utcnow()
+        run = FeedRun(
+            id_feed=id_feed,
+            status="running",
+            stage=stage,
+            started_at=now,
+            queued_at=now if stage == "queued" else None,
+        )
         self.db.add(run)
         self.db.flush()
         return run
 
+    def update_progress(
+        self,
+        id_run: int,
+        *,
+        stage: str | None = None,
+        rows_processed: int | None = None,
+        rows_ok: int | None = None,
+        rows_bad: int | None = None,
+        rows_changed: int | None = None,
+        started_at: datetime | None = None,
+    ) -> bool:
+        """
+        UPDATE direto (sem carregar a entidade) dos campos de progresso.
+        Só toca em runs ainda 'running'; devolve False se nada foi atualizado.
+        """
+        values: dict[str, object] = {"progress_at": utcnow()}
+        if started_at is not None:
+            values["started_at"] = started_at
+        if stage is not None:
+            values["stage"] = stage
+        if rows_processed is not None:
+            values["rows_processed"] = rows_processed
+        if rows_ok is not None:
+            values["rows_ok"] = rows_ok
+        if rows_bad is not None:
+            values["rows_bad"] = rows_bad
+        if rows_changed is not None:
+            values["rows_changed"] = rows_changed
+
+        res = self.db.execute(
+            update(FeedRun)
+            .where(FeedRun.id == id_run, FeedRun.status == "running")
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        return bool(res.rowcount)
+
+    def abort_if_running(self, id_run: int, *, error_msg: str) -> bool:
+        """
+        Marca a run como erro apenas se ainda estiver 'running' (UPDATE condicional,
+        sem carregar a entidade). Devolve False se a run já tinha terminado.
+        """
+        res = self.db.execute(
+            update(FeedRun)
+            .where(FeedRun.id == id_run, FeedRun.status == "running")
+            .values(status="error", error_msg=(error_msg or "")[:500], finished_at=utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        return bool(res.rowcount)
+
+    def record_download(
+        self, id_run: int, *, attempts: int, bytes_received: int, duration_ms: int | None
+    ) -> None:
+        # gravado com o finalize da run (mesma transação)
+        run = self._get_required(id_run)
+        run.download_attempts = attempts
+        run.download_bytes = bytes_received
+        run.download_ms = duration_ms
+
+    def record_timings(
+        self, id_run: int, *, stage_ms: dict[str, int], peak_rss_kb: int | None
+    ) -> None:
+        # gravado com o finalize da run (mesma transação)
+        run = self._get_required(id_run)
+        run.stage_ms_json = json.dumps(stage_ms) if stage_ms else None
+        run.peak_rss_kb = peak_rss_kb
+
     def finalize_ok(
-        self, id_run: int, *, rows_total: int, rows_changed: int, partial: bool
+        self,
+        id_run: int,
+        *,
+        rows_total: int,
+        rows_changed: int,
+        partial: bool,
+        rows_ok: int | None = None,
+        rows_bad: int | None = None,
+        payload_sha256: str | None = None,
+        mapper_version: int | None = None,
     ) -> None:
         run = self._get_required(id_run)
         run.status = "partial" if partial else "ok"
+        run.stage = "done"
+        run.payload_sha256 = payload_sha256
+        run.mapper_version = mapper_version
         run.rows_total = rows_total
         run.rows_changed = rows_changed
+        run.rows_processed = rows_total
+        if rows_ok is not None:
+            run.rows_ok = rows_ok
+        if rows_bad is not None:
+            run.rows_bad = rows_bad
+        self._finish(run)
+        self.db.flush()
+
+    def finalize_unchanged(
+        self,
+        id_run: int,
+        *,
+        reason: str,
+        http_status: int | None,
+        payload_sha256: str | None = None,
+        mapper_version: int | None = None,
+    ) -> None:
+        # feed igual ao já ingerido: run termina ok sem parse/mapping/EOL
+        run = self._get_required(id_run)
+        run.status = "ok"
+        run.stage = "done"
+        run.unchanged_reason = reason
+        run.http_status = http_status
+        run.payload_sha256 = payload_sha256
+        run.mapper_version = mapper_version
+        run.rows_total = 0
+        run.rows_changed = 0
+        run.rows_processed = 0
+        self._finish(run)
         self.db.flush()
 
     def finalize_http_error(self, id_run: int, *, http_status: int, error_msg: str) -> None:
@@ -37,10 +164,13 @@ class FeedRunWriteRepository:
         run.status = "error"
         run.http_status = http_status
         run.error_msg = (error_msg or "")[:500]
+        self._finish(run)
         self.db.flush()
 
     def finalize_error(self, id_run: int, *, error_msg: str) -> None:
+        # stage fica no passo onde a run falhou
         run = self._get_required(id_run)
         run.status = "error"
         run.error_msg = (error_msg or "")[:500]
+        self._finish(run)
         self.db.flush()
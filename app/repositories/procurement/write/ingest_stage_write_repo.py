@@ -0,0 +1,558 @@
+# app/repositories/procurement/write/ingest_stage_write_repo.py
+from __future__ import annotations
+
+import io
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.infra.base import utcnow
+
+STAGE_TABLE = "_ingest_stage"
+SEEN_TABLE = "_ingest_seen"
+GONE_TABLE = "_ingest_gone"
+
+# Ordem das colunas usada no COPY (tem de bater com os tuplos de copy_rows)
+STAGE_COLUMNS: tuple[str, ...] = (
+    "row_idx",
+    "sku",
+    "gtin",
+    "partnumber",
+    "brand",
+    "brand_key",
+    "category",
+    "category_key",
+    "name",
+    "description",
+    "image_url",
+    "weight_str",
+    "price",
+    "stock",
+    "meta",
+)
+
+# Mesmo formato que _mk_fp do SupplierItemWriteRepository:
+# sha256("id_feed|id_product|sku|gtin|partnumber|price|stock")
+_FINGERPRINT_SQL = (
+    "encode(sha256(convert_to("
+    "CAST(:id_feed AS text) || '|' || s.id_product::text || '|' || s.sku"
+    " || '|' || coalesce(s.gtin, '') || '|' || coalesce(s.partnumber, '')"
+    " || '|' || s.price || '|' || s.stock::text"
+    ", 'UTF8')), 'hex')"
+)
+
+
+def _copy_value(v: Any) -> str:
+    """Serializa um valor para o formato text do COPY (\\N = NULL)."""
+    if v is None:
+        return "\\N"
+    s = str(v)
+    if "\x00" in s:
+        s = s.replace("\x00", "")
+    return s.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class IngestStageWriteRepository:
+    """
+    Staging set-based para o ingest em modo bulk.
+
+    As linhas mapeadas são copiadas (COPY) para uma tabela temporária por run
+    (ON COMMIT DROP) e resolvidas com poucos statements:
+    brands/categories → products → canonicals/meta → supplier_items → events.
+
+    Não faz commit; o UoW do usecase decide.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._now: datetime = utcnow()
+
+    # ------------------------------------------------------------------ setup
+
+    def create(self) -> None:
+        self.db.execute(
+            text(
+                f"""
+                CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+                    row_idx      integer NOT NULL,
+                    sku          text    NOT NULL,
+                    gtin         text,
+                    partnumber   text,
+                    brand        text,
+                    brand_key    text,
+                    category     text,
+                    category_key text,
+                    name         text,
+                    description  text,
+                    image_url    text,
+                    weight_str   text,
+                    price        text    NOT NULL DEFAULT '',
+                    stock        integer NOT NULL DEFAULT 0,
+                    meta         jsonb,
+                    id_brand     integer,
+                    id_category  integer,
+                    id_product   integer,
+                    item_exists  boolean NOT NULL DEFAULT false,
+                    item_changed boolean NOT NULL DEFAULT false
+                ) ON COMMIT DROP
+                """
+            )
+        )
+
+    def copy_rows(self, rows: Iterable[Sequence[Any]]) -> int:
+        """
+        COPY de um batch de tuplos (ordem = STAGE_COLUMNS) para a staging.
+        Usa o cursor DBAPI da mesma ligação/transação da Session.
+        """
+        buf = io.StringIO()
+        n = 0
+        for row in rows:
+            buf.write("\t".join(_copy_value(v) for v in row))
+            buf.write("\n")
+            n += 1
+        if not n:
+            return 0
+
+        buf.seek(0)
+        raw = self.db.connection().connection
+        cur = raw.cursor()
+        try:
+            cur.copy_expert(
+                f"COPY {STAGE_TABLE} ({', '.join(STAGE_COLUMNS)}) FROM STDIN",
+                buf,
+            )
+        finally:
+            cur.close()
+        return n
+
+    def analyze(self) -> None:
+        # tabelas temporárias não são vistas pelo autovacuum → sem estatísticas
+        self.db.execute(text(f"CREATE INDEX ON {STAGE_TABLE} (sku)"))
+        self.db.execute(text(f"ANALYZE {STAGE_TABLE}"))
+
+    # ------------------------------------------------------- brands/categories
+
+    def resolve_brands(self) -> None:
+        """
+        Como BrandsWriteRepository.get_or_create: brand (nome a guardar) e
+        brand_key (chave CI) vêm normalizados do stage_row; match por
+        lower(btrim(name)) = chave, tal como o get_by_name.
+        """
+        self._resolve_names("brands", "brand", "id_brand")
+
+    def resolve_categories(self) -> None:
+        """Como CategoryWriteRepository.get_or_create (ver resolve_brands)."""
+        self._resolve_names("categories", "category", "id_category")
+
+    def _resolve_names(self, table: str, col: str, id_col: str) -> None:
+        self.db.execute(
+            text(
+                f"""
+                INSERT INTO {table} (name, created_at, updated_at)
+                SELECT DISTINCT ON (s.{col}_key) s.{col}, :now, :now
+                FROM {STAGE_TABLE} s
+                WHERE s.{col}_key IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {table} t WHERE lower(btrim(t.name)) = s.{col}_key
+                  )
+                ORDER BY s.{col}_key, s.row_idx
+                ON CONFLICT DO NOTHING
+                """
+            ),
+            {"now": self._now},
+        )
+        self.db.execute(
+            text(
+                f"""
+                UPDATE {STAGE_TABLE} s
+                SET {id_col} = t.id
+                FROM {table} t
+                WHERE s.{col}_key IS NOT NULL AND lower(btrim(t.name)) = s.{col}_key
+                """
+            )
+        )
+
+    # ---------------------------------------------------------------- products
+
+    def _match_by_gtin(self) -> None:
+        self.db.execute(
+            text(
+                f"""
+                UPDATE {STAGE_TABLE} s
+                SET id_product = p.id
+                FROM products p
+                WHERE s.id_product IS NULL AND s.gtin IS NOT NULL AND p.gtin = s.gtin
+                """
+            )
+        )
+
+    def _match_by_brand_mpn(self) -> None:
+        self.db.execute(
+            text(
+                f"""
+                UPDATE {STAGE_TABLE} s
+                SET id_product = p.id
+                FROM products p
+                WHERE s.id_product IS NULL
+                  AND s.id_brand IS NOT NULL AND s.partnumber IS NOT NULL
+                  AND p.id_brand = s.id_brand AND p.partnumber = s.partnumber
+                """
+            )
+        )
+
+    def resolve_products(self, *, default_margin: float) -> None:
+        """
+        Mesma precedência do ProductWriteRepository.get_or_create:
+        GTIN → (brand, partnumber) → cria (por GTIN ou por brand+mpn).
+        Conflitos entre linhas do próprio feed caem no ON CONFLICT DO NOTHING
+        e são resolvidos pelo match seguinte.
+        """
+        params = {"now": self._now, "margin": default_margin or 0.0}
+
+        self._match_by_gtin()
+        self._match_by_brand_mpn()
+
+        self.db.execute(
+            text(
+                f"""
+                INSERT INTO products (
+                    gtin, id_brand, partnumber, margin, is_enabled, is_eol, created_at, updated_at
+                )
+                SELECT DISTINCT ON (s.gtin)
+                    s.gtin, s.id_brand, s.partnumber, :margin, true, false, :now, :now
+                FROM {STAGE_TABLE} s
+                WHERE s.id_product IS NULL AND s.gtin IS NOT NULL
+                ORDER BY s.gtin, s.row_idx
+                ON CONFLICT DO NOTHING
+                """
+            ),
+            params,
+        )
+        self._match_by_gtin()
+        self._match_by_brand_mpn()
+
+        self.db.execute(
+            text(
+                f"""
+                INSERT INTO products (
+                    gtin, id_brand, partnumber, margin, is_enabled, is_eol, created_at, updated_at
+                )
+                SELECT DISTINCT ON (s.id_brand, s.partnumber)
+                    NULL, s.id_brand, s.partnumber, :margin, true, false, :now, :now
+                FROM {STAGE_TABLE} s
+                WHERE s.id_product IS NULL
+                  AND s.id_brand IS NOT NULL AND s.partnumber IS NOT NULL
+                ORDER BY s.id_brand, s.partnumber, s.row_idx
+                ON CONFLICT DO NOTHING
+                """
+            ),
+            params,
+        )
+        self._match_by_brand_mpn()
+
+    def discard_unresolved(self) -> int:
+        """Remove linhas sem chave de produto (gtin ou brand+mpn); devolve quantas."""
+        res = self.db.execute(text(f"DELETE FROM {STAGE_TABLE} WHERE id_product IS NULL"))
+        return int(res.rowcount or 0)
+
+    def fill_products(self) -> None:
+        """
+        Equivalente set-based de fill_canonicals_if_empty + fill_brand_category_if_empty:
+        só preenche campos vazios, com o 1º valor não vazio do feed (ordem das linhas).
+        """
+        self.db.execute(
+            text(
+                f"""
+                WITH f AS (
+                    SELECT
+                        id_product,
+                        (array_agg(name ORDER BY row_idx)
+                            FILTER (WHERE coalesce(name, '') <> ''))[1] AS name,
+                        (array_agg(description ORDER BY row_idx)
+                            FILTER (WHERE coalesce(description, '') <> ''))[1] AS description,
+                        (array_agg(image_url ORDER BY row_idx)
+                            FILTER (WHERE coalesce(image_url, '') <> ''))[1] AS image_url,
+                        (array_agg(weight_str ORDER BY row_idx)
+                            FILTER (WHERE coalesce(weight_str, '') <> ''))[1] AS weight_str,
+                        (array_agg(partnumber ORDER BY row_idx)
+                            FILTER (WHERE coalesce(partnumber, '') <> ''))[1] AS partnumber,
+                        (array_agg(gtin ORDER BY row_idx)
+                            FILTER (WHERE coalesce(gtin, '') <> ''))[1] AS gtin,
+                        (array_agg(id_brand ORDER BY row_idx)
+                            FILTER (WHERE id_brand IS NOT NULL))[1] AS id_brand,
+                        (array_agg(id_category ORDER BY row_idx)
+                            FILTER (WHERE id_category IS NOT NULL))[1] AS id_category
+                    FROM {STAGE_TABLE}
+                    GROUP BY id_product
+                ),
+                c AS (
+                    SELECT
+                        p.id,
+                        CASE WHEN coalesce(p.name, '') = '' AND f.name IS NOT NULL
+                             THEN f.name ELSE p.name END AS name,
+                        CASE WHEN coalesce(p.description, '') = '' AND f.description IS NOT NULL
+                             THEN f.description ELSE p.description END AS description,
+                        CASE WHEN coalesce(p.image_url, '') = '' AND f.image_url IS NOT NULL
+                             THEN f.image_url ELSE p.image_url END AS image_url,
+                        CASE WHEN coalesce(p.weight_str, '') = '' AND f.weight_str IS NOT NULL
+                             THEN f.weight_str ELSE p.weight_str END AS weight_str,
+                        CASE WHEN coalesce(p.partnumber, '') = '' AND f.partnumber IS NOT NULL
+                             THEN f.partnumber ELSE p.partnumber END AS partnumber,
+                        CASE WHEN coalesce(p.gtin, '') = '' AND f.gtin IS NOT NULL
+                                  AND count(*) OVER (PARTITION BY f.gtin) = 1
+                                  AND NOT EXISTS (SELECT 1 FROM products o WHERE o.gtin = f.gtin)
+                             THEN f.gtin ELSE p.gtin END AS gtin,
+                        coalesce(p.id_brand, f.id_brand) AS id_brand,
+                        coalesce(p.id_category, f.id_category) AS id_category,
+                        p.id_brand AS old_brand,
+                        p.partnumber AS old_partnumber
+                    FROM products p
+                    JOIN f ON f.id_product = p.id
+                )
+                UPDATE products p
+                SET name = c.name,
+                    description = c.description,
+                    image_url = c.image_url,
+                    weight_str = c.weight_str,
+                    gtin = c.gtin,
+                    id_category = c.id_category,
+                    -- brand+mpn só avança se não colidir com outro produto
+                    partnumber = CASE WHEN ok.free THEN c.partnumber ELSE c.old_partnumber END,
+                    id_brand = CASE WHEN ok.free THEN c.id_brand ELSE c.old_brand END,
+                    updated_at = :now
+                FROM c
+                CROSS JOIN LATERAL (
+                    SELECT (
+                        c.id_brand IS NULL OR c.partnumber IS NULL
+                        OR (c.id_brand IS NOT DISTINCT FROM c.old_brand
+                            AND c.partnumber IS NOT DISTINCT FROM c.old_partnumber)
+                        OR NOT EXISTS (
+                            SELECT 1 FROM products o
+                            WHERE o.id_brand = c.id_brand AND o.partnumber = c.partnumber
+                        )
+                    ) AS free
+                ) ok
+                WHERE p.id = c.id
+                  AND (
+                      p.name IS DISTINCT FROM c.name
+                      OR p.description IS DISTINCT FROM c.description
+                      OR p.image_url IS DISTINCT FROM c.image_url
+                      OR p.weight_str IS DISTINCT FROM c.weight_str
+                      OR p.gtin IS DISTINCT FROM c.gtin
+                      OR p.id_category IS DISTINCT FROM c.id_category
+                      OR (ok.free AND (p.partnumber IS DISTINCT FROM c.partnumber
+                                       OR p.id_brand IS DISTINCT FROM c.id_brand))
+                  )
+                """
+            ),
+            {"now": self._now},
+        )
+
+    def insert_meta(self) -> int:
+        """add_meta_if_missing em bloco; devolve o nº de metas inseridas."""
+        res = self.db.execute(
+            text(
+                f"""
+                INSERT INTO product_meta (id_product, name, value, created_at, updated_at)
+                SELECT DISTINCT ON (s.id_product, m.key)
+                    s.id_product, m.key, m.value, :now, :now
+                FROM {STAGE_TABLE} s
+                CROSS JOIN LATERAL jsonb_each_text(s.meta) AS m(key, value)
+                WHERE s.meta IS NOT NULL
+                ORDER BY s.id_product, m.key, s.row_idx
+                ON CONFLICT (id_product, name) DO NOTHING
+                """
+            ),
+            {"now": self._now},
+        )
+        return int(res.rowcount or 0)
+
+    # ---------------------------------------------------------- supplier items
+
+    def dedupe_skus(self) -> int:
+        """Se o feed repetir o SKU, fica a última linha (como no upsert linha-a-linha)."""
+        res = self.db.execute(
+            text(
+                f"""
+                DELETE FROM {STAGE_TABLE} s
+                USING {STAGE_TABLE} t
+                WHERE s.sku = t.sku AND s.row_idx < t.row_idx
+                """
+            )
+        )
+        return int(res.rowcount or 0)
+
+    def mark_existing_items(self, *, id_feed: int) -> None:
+        """Marca existentes/alterados ANTES do upsert (precisamos dos valores antigos)."""
+        self.db.execute(
+            text(
+                f"""
+                UPDATE {STAGE_TABLE} s
+                SET item_exists = true,
+                    item_changed = (
+                        si.price IS DISTINCT FROM s.price
+                        OR si.stock IS DISTINCT FROM s.stock
+                        OR si.id_product IS DISTINCT FROM s.id_product
+                        OR si.gtin IS DISTINCT FROM s.gtin
+                        OR si.partnumber IS DISTINCT FROM s.partnumber
+                    )
+                FROM supplier_items si
+                WHERE si.id_feed = :id_feed AND si.sku = s.sku
+                """
+            ),
+            {"id_feed": id_feed},
+        )
+
+    def skip_unchanged_items(self) -> int:
+        """
+        Short-circuit por fingerprint: itens existentes sem alterações saem da staging
+        (sem fills/meta/upsert/eventos). Têm de estar já no seen set (EOL).
+        Devolve quantos foram saltados.
+        """
+        res = self.db.execute(
+            text(f"DELETE FROM {STAGE_TABLE} WHERE item_exists AND NOT item_changed")
+        )
+        return int(res.rowcount or 0)
+
+    def upsert_supplier_items(self, *, id_feed: int, id_feed_run: int) -> None:
+        """Upsert das linhas restantes (id_feed_run = run atual → usado no EOL)."""
+        self.db.execute(
+            text(
+                f"""
+                INSERT INTO supplier_items (
+                    id_feed, id_product, sku, gtin, partnumber, price, stock,
+                    fingerprint, id_feed_run, created_at, updated_at
+                )
+                SELECT
+                    :id_feed, s.id_product, s.sku, s.gtin, s.partnumber,
+                    s.price, s.stock,
+                    {_FINGERPRINT_SQL}, :id_feed_run, :now, :now
+                FROM {STAGE_TABLE} s
+                ON CONFLICT (id_feed, sku) DO UPDATE SET
+                    id_product = EXCLUDED.id_product,
+                    gtin = EXCLUDED.gtin,
+                    partnumber = EXCLUDED.partnumber,
+                    price = EXCLUDED.price,
+                    stock = EXCLUDED.stock,
+                    fingerprint = EXCLUDED.fingerprint,
+                    id_feed_run = EXCLUDED.id_feed_run,
+                    updated_at = EXCLUDED.updated_at
+                """
+            ),
+            {"id_feed": id_feed, "id_feed_run": id_feed_run, "now": self._now},
+        )
+
+    def record_item_events(self, *, id_supplier: int, id_feed_run: int) -> int:
+        """Eventos init/change para itens criados/alterados; devolve quantos."""
+        res = self.db.execute(
+            text(
+                f"""
+                INSERT INTO products_suppliers_events (
+                    id_product, id_supplier, price, stock, gtin, id_feed_run, reason, created_at
+                )
+                SELECT
+                    s.id_product, :id_supplier, s.price, s.stock, s.gtin,
+                    :id_feed_run,
+                    CASE WHEN s.item_exists THEN 'change' ELSE 'init' END,
+                    :now
+                FROM {STAGE_TABLE} s
+                WHERE NOT s.item_exists OR s.item_changed
+                """
+            ),
+            {"id_supplier": id_supplier, "id_feed_run": id_feed_run, "now": self._now},
+        )
+        return int(res.rowcount or 0)
+
+    def affected_products(self) -> list[int]:
+        rows = self.db.execute(text(f"SELECT DISTINCT id_product FROM {STAGE_TABLE}")).all()
+        return [int(r[0]) for r in rows]
+
+
+class IngestSeenWriteRepository:
+    """
+    Seen set do run: SKUs vistos no feed, numa tabela temporária (ON COMMIT DROP).
+    O EOL (ProductEventWriteRepository.mark_eol_for_unseen_items) compara contra ela,
+    em vez de depender de id_feed_run reescrito em todas as linhas.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create(self) -> None:
+        self.db.execute(
+            text(
+                f"""
+                CREATE TEMP TABLE IF NOT EXISTS {SEEN_TABLE} (
+                    sku text PRIMARY KEY
+                ) ON COMMIT DROP
+                """
+            )
+        )
+
+    def copy_skus(self, skus: Iterable[str]) -> int:
+        """COPY único do seen set em memória (modo linha-a-linha)."""
+        return _copy_skus(self.db, SEEN_TABLE, skus)
+
+    def skus(self) -> set[str]:
+        """SKUs gravados nesta run (snapshot do delta ingest)."""
+        return set(self.db.execute(text(f"SELECT sku FROM {SEEN_TABLE}")).scalars())
+
+    def add_from_stage(self) -> int:
+        """Modo bulk: os SKUs da staging (já deduplicados) são o seen set."""
+        res = self.db.execute(
+            text(
+                f"""
+                INSERT INTO {SEEN_TABLE} (sku)
+                SELECT DISTINCT sku FROM {STAGE_TABLE}
+                ON CONFLICT (sku) DO NOTHING
+                """
+            )
+        )
+        self.db.execute(text(f"ANALYZE {SEEN_TABLE}"))
+        return int(res.rowcount or 0)
+
+
+class IngestGoneWriteRepository:
+    """
+    Delta ingest: SKUs que saíram do feed desde o último snapshot, numa tabela
+    temporária (ON COMMIT DROP) para o EOL direcionado
+    (ProductEventWriteRepository.mark_eol_for_gone_items).
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create(self) -> None:
+        self.db.execute(
+            text(
+                f"""
+                CREATE TEMP TABLE IF NOT EXISTS {GONE_TABLE} (
+                    sku text PRIMARY KEY
+                ) ON COMMIT DROP
+                """
+            )
+        )
+
+    def copy_skus(self, skus: Iterable[str]) -> int:
+        return _copy_skus(self.db, GONE_TABLE, skus)
+
+
+def _copy_skus(db: Session, table: str, skus: Iterable[str]) -> int:
+    buf = io.StringIO()
+    n = 0
+    for sku in skus:
+        buf.write(_copy_value(sku))
+        buf.write("\n")
+        n += 1
+    if n:
+        buf.seek(0)
+        cur = db.connection().connection.cursor()
+        try:
+            cur.copy_expert(f"COPY {table} (sku) FROM STDIN", buf)
+        finally:
+            cur.close()
+    db.execute(text(f"ANALYZE {table}"))
+    return n
@@ -3,11 +3,12 @@ from __future__ import annotations
 import json
 from typing import Any
 
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 
 from app.core.errors import InvalidArgument
 from app.models.feed_mapper import FeedMapper
+from app.models.supplier_feed import SupplierFeed
 
 
 class MapperWriteRepository:
@@ -47,6 +48,14 @@ class MapperWriteRepository:
 
         m.profile_json = json.dumps(profile, ensure_ascii=False)
 
+        # mapping novo → próxima run descarrega o feed completo mesmo que não tenha mudado
+        self.db.execute(
+            update(SupplierFeed)
+            .where(SupplierFeed.id == id_feed)
+            .values(http_etag=None, http_last_modified=None)
+            .execution_options(synchronize_session=False)
+        )
+
         if creating and m.version is None:
             m.version = 1
         elif not creating and bump_version:
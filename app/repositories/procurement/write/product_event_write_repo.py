@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from sqlalchemy import select
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from app.infra.base import utcnow
 from app.models.product_supplier_event import ProductSupplierEvent
-from app.models.supplier_item import SupplierItem
+from app.repositories.procurement.write.ingest_stage_write_repo import GONE_TABLE, SEEN_TABLE
 
 
 @dataclass
@@ -56,48 +57,85 @@ class ProductEventWriteRepository:
     def mark_eol_for_unseen_items(
         self, *, id_feed: int, id_supplier: int, id_feed_run: int
     ) -> MarkEolResult:
-        unseen_items = self.db.scalars(
-            select(SupplierItem).where(
-                SupplierItem.id_feed == id_feed,
-                SupplierItem.id_feed_run != id_feed_run,
-            )
-        ).all()
-
-        affected_products: set[int] = set()
-        items_total = 0
-        items_stock_changed = 0
-        items_already_zero = 0
-
-        for it in unseen_items:
-            items_total += 1
+        """
+        EOL set-based contra o seen set do run (tabela temporária SEEN_TABLE):
+        um UPDATE ... RETURNING (stock >0 → 0) e um INSERT ... SELECT dos eventos 'eol'.
+        Itens unseen já a 0 não são reescritos; só os produtos com transição
+        >0 → 0 entram em affected_products.
+        """
+        return self._mark_eol(
+            f"""
+            SELECT si.id, si.stock
+            FROM supplier_items si
+            WHERE si.id_feed = :id_feed
+              AND NOT EXISTS (SELECT 1 FROM {SEEN_TABLE} s WHERE s.sku = si.sku)
+            """,
+            id_feed=id_feed,
+            id_supplier=id_supplier,
+            id_feed_run=id_feed_run,
+        )
 
-            if (it.stock or 0) == 0:
-                # já estava a zero → apenas avança o run
-                it.id_feed_run = id_feed_run
-                items_already_zero += 1
-            else:
-                # transição >0 → 0 → evento EOL
-                it.stock = 0
-                it.id_feed_run = id_feed_run
+    def mark_eol_for_gone_items(
+        self, *, id_feed: int, id_supplier: int, id_feed_run: int
+    ) -> MarkEolResult:
+        """
+        Delta ingest: EOL só dos SKUs da tabela temporária GONE_TABLE (saíram do
+        feed desde o último snapshot), via unique (id_feed, sku), sem percorrer
+        os supplier_items do feed. items_total = SKUs saídos nesta run.
+        """
+        return self._mark_eol(
+            f"""
+            SELECT si.id, si.stock
+            FROM {GONE_TABLE} g
+            JOIN supplier_items si ON si.id_feed = :id_feed AND si.sku = g.sku
+            """,
+            id_feed=id_feed,
+            id_supplier=id_supplier,
+            id_feed_run=id_feed_run,
+        )
 
-                self.db.add(
-                    ProductSupplierEvent(
-                        id_product=it.id_product,
-                        id_supplier=id_supplier,
-                        gtin=it.gtin,
-                        price=it.price,
-                        stock=0,
-                        id_feed_run=id_feed_run,
-                        reason="eol",
+    def _mark_eol(
+        self, unseen_sql: str, *, id_feed: int, id_supplier: int, id_feed_run: int
+    ) -> MarkEolResult:
+        row = self.db.execute(
+            text(
+                f"""
+                WITH unseen AS ({unseen_sql}),
+                eol AS (
+                    UPDATE supplier_items si
+                    SET stock = 0, id_feed_run = :id_feed_run, updated_at = :now
+                    FROM unseen u
+                    WHERE si.id = u.id AND coalesce(u.stock, 0) <> 0
+                    RETURNING si.id_product, si.gtin, si.price
+                ),
+                ev AS (
+                    INSERT INTO products_suppliers_events (
+                        id_product, id_supplier, gtin, price, stock, id_feed_run, reason, created_at
                     )
+                    SELECT e.id_product, :id_supplier, e.gtin, e.price, 0, :id_feed_run, 'eol', :now
+                    FROM eol e
+                    WHERE e.id_product IS NOT NULL
+                    RETURNING id_product
                 )
-                items_stock_changed += 1
-
-            affected_products.add(it.id_product)
+                SELECT
+                    (SELECT count(*) FROM unseen) AS items_total,
+                    (SELECT count(*) FROM eol) AS items_stock_changed,
+                    (SELECT coalesce(array_agg(DISTINCT id_product), '{{}}') FROM ev) AS products
+                """
+            ),
+            {
+                "id_feed": id_feed,
+                "id_supplier": id_supplier,
+                "id_feed_run": id_feed_run,
+                "now": utcnow(),
+            },
+        ).one()
 
+        items_total = int(row.items_total or 0)
+        items_stock_changed = int(row.items_stock_changed or 0)
         return MarkEolResult(
-            affected_products=list(affected_products),
+            affected_products=[int(x) for x in (row.products or [])],
             items_total=items_total,
             items_stock_changed=items_stock_changed,
-            items_already_zero=items_already_zero,
+            items_already_zero=items_total - items_stock_changed,
         )
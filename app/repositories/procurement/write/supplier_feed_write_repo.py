@@ -2,7 +2,7 @@ from __future__ import annotations
 from typing import Any
 from collections.abc import Callable
 
-from sqlalchemy import select, func
+from sqlalchemy import func, select, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
@@ -74,6 +74,9 @@ class SupplierFeedWriteRepository:
             creating = True
 
         mutate(entity)
+        # configuração nova → próximo download completo (sem pedido condicional)
+        entity.http_etag = None
+        entity.http_last_modified = None
 
         if entity.format:
             entity.format = entity.format.lower()
@@ -100,5 +103,23 @@ class SupplierFeedWriteRepository:
                 raise Conflict("This feed URL already exists") from None
             raise
 
+    def set_http_validators(
+        self, id_feed: int, *, etag: str | None, last_modified: str | None
+    ) -> None:
+        """
+        Guarda ETag/Last-Modified do último download ingerido (None limpa).
+        """
+        self.db.execute(
+            update(SupplierFeed)
+            .where(SupplierFeed.id == id_feed)
+            .values(
+                http_etag=etag[:255] if etag else None,
+                http_last_modified=last_modified[:64] if last_modified else None,
+                # updated_at marca alterações de configuração (não o estado do download)
+                updated_at=SupplierFeed.updated_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
     def delete(self, entity: SupplierFeed) -> None:
         self.db.delete(entity)
@@ -19,6 +19,20 @@ class SupplierItemWriteRepository:
     def __init__(self, db: Session):
         self.db = db
 
+    @staticmethod
+    def fingerprint(
+        *,
+        id_feed: int,
+        id_product: int,
+        sku: str,
+        gtin: str | None,
+        partnumber: str | None,
+        price: str,
+        stock: int,
+    ) -> str:
+        """Mesmo fingerprint que o upsert grava (sha256 hex)."""
+        return _mk_fp(id_feed, id_product, (sku or "").strip(), gtin, partnumber, price, stock)
+
     def upsert(
         self,
         *,
@@ -0,0 +1,90 @@
+# app/schemas/runs.py
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from app.models.feed_run import FeedRun
+
+
+class FeedRunOut(BaseModel):
+    id: int
+    id_feed: int
+    status: str
+    stage: str | None = None
+    http_status: int | None = None
+    error_msg: str | None = None
+    unchanged_reason: str | None = None
+
+    queued_at: datetime | None = None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    progress_at: datetime | None = None
+    duration_ms: int | None = None
+    download_attempts: int | None = None
+    download_bytes: int | None = None
+    download_ms: int | None = None
+    stage_ms: dict[str, int] | None = None  # etapa → ms (download, parse, map, resolve, ...)
+    peak_rss_kb: int | None = None
+
+    rows_total: int = 0
+    rows_processed: int = 0
+    rows_ok: int = 0
+    rows_bad: int = 0
+    rows_changed: int = 0
+    rows_per_sec: float | None = None
+
+    @classmethod
+    def from_entity(cls, e: FeedRun) -> FeedRunOut:
+        # débito médio desde o início real (sem o tempo em fila): até ao fim ou ao último progresso
+        rows_processed = int(e.rows_processed or 0)
+        until = e.finished_at or e.progress_at
+        rows_per_sec = None
+        if e.started_at is not None and until is not None:
+            elapsed = (until - e.started_at).total_seconds()
+            if elapsed > 0:
+                rows_per_sec = round(rows_processed / elapsed, 1)
+
+        stage_ms = None
+        if e.stage_ms_json:
+            try:
+                stage_ms = json.loads(e.stage_ms_json)
+            except json.JSONDecodeError:
+                stage_ms = None
+
+        return cls(
+            id=e.id,
+            id_feed=e.id_feed,
+            status=e.status,
+            stage=e.stage,
+            http_status=e.http_status,
+            error_msg=e.error_msg,
+            unchanged_reason=e.unchanged_reason,
+            queued_at=e.queued_at,
+            started_at=e.started_at,
+            finished_at=e.finished_at,
+            progress_at=e.progress_at,
+            duration_ms=e.duration_ms,
+            download_attempts=e.download_attempts,
+            download_bytes=e.download_bytes,
+            download_ms=e.download_ms,
+            stage_ms=stage_ms,
+            peak_rss_kb=e.peak_rss_kb,
+            rows_total=int(e.rows_total or 0),
+            rows_processed=rows_processed,
+            rows_ok=int(e.rows_ok or 0),
+            rows_bad=int(e.rows_bad or 0),
+            rows_changed=int(e.rows_changed or 0),
+            rows_per_sec=rows_per_sec,
+        )
+
+
+class FeedRunListOut(BaseModel):
+    items: list[FeedRunOut]
+    total: int
+    page: int
+    page_size: int
@@ -1,12 +1,20 @@
 # apps/api_main.py
 from __future__ import annotations
 
+import asyncio
 from datetime import UTC, datetime
 
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from app.infra.bootstrap import ensure_brand_category_ci
+from app.infra.bootstrap import (
+    ensure_brand_category_ci,
+    ensure_catalog_update_stream_pending_unique,
+    ensure_feed_run_columns,
+    ensure_supplier_feed_columns,
+)
+from app.external.feed_downloader import FeedDownloader
+from app.infra.jobs import ingest_jobs
 from app.infra.session import engine
 
 from app.api.v1.auth import router as auth_router
@@ -31,11 +39,26 @@ setup_logging()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    ensure_brand_category_ci(engine)
-    yield
-
+    app.state.started_at = datetime.now(UTC)
+    from app.models import create_db_and_tables
 
-app = FastAPI(title=settings.APP_NAME, version=settings.APP_VERSION)
+    create_db_and_tables()
+    ensure_brand_category_ci(engine)
+    ensure_catalog_update_stream_pending_unique(engine)
+    ensure_feed_run_columns(engine)
+    ensure_supplier_feed_columns(engine)
+    FeedDownloader.open_http_pool()
+    FeedDownloader.open_ftp_sessions()
+    try:
+        yield
+    finally:
+        # runs em curso ficam marcadas como erro (Cancelled)
+        await ingest_jobs.shutdown()
+        await FeedDownloader.close_http_pool()
+        await asyncio.to_thread(FeedDownloader.close_ftp_sessions)
+
+
+app = FastAPI(title=settings.APP_NAME, version=settings.APP_VERSION, lifespan=lifespan)
 app.add_middleware(RequestContextMiddleware)
 
 init_error_handlers(app)
@@ -50,14 +73,6 @@ app.add_middleware(
 )
 
 
-@app.on_event("startup")
-async def on_startup():
-    app.state.started_at = datetime.now(UTC)
-    from app.models import create_db_and_tables
-
-    create_db_and_tables()
-
-
 # routers
 app.include_router(system_router, prefix="/api/v1")
 app.include_router(auth_router, prefix="/api/v1")
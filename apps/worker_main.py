@@ -0,0 +1,166 @@
+# apps/worker_main.py
+# Worker: ingest periódico de todos os SupplierFeed ativos (python -m apps.worker_main)
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+import signal
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.domains.procurement.usecases.runs.ingest_scheduled_feed import (
+    execute as uc_ingest_scheduled_feed,
+)
+from app.external.feed_downloader import FeedDownloader
+from app.infra.bootstrap import (
+    ensure_brand_category_ci,
+    ensure_catalog_update_stream_pending_unique,
+    ensure_feed_run_columns,
+    ensure_supplier_feed_columns,
+)
+from app.infra.jobs import ingest_jobs
+from app.infra.session import SessionLocal, engine
+from app.repositories.procurement.read.supplier_feed_read_repo import (
+    SupplierFeedReadRepository,
+)
+
+setup_logging()
+log = logging.getLogger("gsm.worker")
+
+FEED_JOB_PREFIX = "ingest:feed="
+
+
+def _feed_interval_min(extra_json: str | None) -> int:
+    """
+    Cadência do feed em minutos: extra_json.ingest_interval_min ou WORKER_INGEST_INTERVAL_MIN.
+    <= 0 → feed fora do agendamento (só manual).
+    """
+    with suppress(ValueError, TypeError, AttributeError):
+        extra = json.loads(extra_json) if extra_json else {}
+        value = extra.get("ingest_interval_min")
+        if value is not None:
+            return int(value)
+    return int(settings.WORKER_INGEST_INTERVAL_MIN)
+
+
+def _load_schedule() -> dict[str, tuple[int, int, int]]:
+    """
+    {job_id: (id_feed, id_supplier, interval_min)} dos feeds ativos agendáveis.
+    """
+    with SessionLocal() as db:
+        feeds = SupplierFeedReadRepository(db).list_active_for_schedule()
+    out: dict[str, tuple[int, int, int]] = {}
+    for id_feed, id_supplier, extra_json in feeds:
+        interval_min = _feed_interval_min(extra_json)
+        if interval_min > 0:
+            out[f"{FEED_JOB_PREFIX}{id_feed}"] = (id_feed, id_supplier, interval_min)
+    return out
+
+
+async def _ingest_feed(*, id_feed: int, id_supplier: int, interval_min: int) -> None:
+    # limite global de concorrência = semáforo do ingest_jobs (INGEST_MAX_CONCURRENT_JOBS)
+    min_gap_s = max(0.0, interval_min * 60 / 2)
+    await ingest_jobs.run(
+        f"{FEED_JOB_PREFIX}{id_feed}",
+        lambda: uc_ingest_scheduled_feed(
+            id_feed=id_feed,
+            id_supplier=id_supplier,
+            min_gap_s=min_gap_s,
+        ),
+    )
+
+
+async def _sync_feed_jobs(scheduler: AsyncIOScheduler) -> None:
+    """
+    Acerta os jobs do scheduler com os feeds ativos: adiciona novos, remove
+    desativados/apagados e reagenda os que mudaram de cadência.
+    O 1.º disparo de cada feed novo é espalhado por [0, jitter].
+    """
+    try:
+        desired = await ingest_jobs.run_short(_load_schedule)
+    except Exception:
+        log.exception("failed to load feed schedule")
+        return
+
+    jitter_s = max(0, int(settings.WORKER_INGEST_JITTER_S))
+    current = {j.id: j for j in scheduler.get_jobs() if j.id.startswith(FEED_JOB_PREFIX)}
+
+    for job_id in current.keys() - desired.keys():
+        scheduler.remove_job(job_id)
+        log.info("unscheduled %s", job_id)
+
+    for job_id, (id_feed, id_supplier, interval_min) in desired.items():
+        job = current.get(job_id)
+        if job is not None and job.kwargs.get("interval_min") == interval_min:
+            continue
+        scheduler.add_job(
+            _ingest_feed,
+            trigger=IntervalTrigger(minutes=interval_min, jitter=jitter_s or None),
+            id=job_id,
+            name=job_id,
+            kwargs={"id_feed": id_feed, "id_supplier": id_supplier, "interval_min": interval_min},
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=None,
+            next_run_time=datetime.now(UTC) + timedelta(seconds=random.uniform(0, jitter_s)),
+        )
+        log.info("scheduled %s every %smin (jitter=%ss)", job_id, interval_min, jitter_s)
+
+
+async def main() -> None:
+    from app.models import create_db_and_tables
+
+    create_db_and_tables()
+    ensure_brand_category_ci(engine)
+    ensure_catalog_update_stream_pending_unique(engine)
+    ensure_feed_run_columns(engine)
+    ensure_supplier_feed_columns(engine)
+    FeedDownloader.open_http_pool()
+    FeedDownloader.open_ftp_sessions()
+
+    scheduler = AsyncIOScheduler(timezone=UTC)
+    scheduler.add_job(
+        _sync_feed_jobs,
+        trigger=IntervalTrigger(seconds=max(30, int(settings.WORKER_FEEDS_REFRESH_S))),
+        id="sync-feeds",
+        args=[scheduler],
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.now(UTC),
+    )
+    scheduler.start()
+    log.info(
+        "worker started (max_concurrent=%s interval=%smin jitter=%ss)",
+        settings.INGEST_MAX_CONCURRENT_JOBS,
+        settings.WORKER_INGEST_INTERVAL_MIN,
+        settings.WORKER_INGEST_JITTER_S,
+    )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):  # Windows: fica o KeyboardInterrupt
+            loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        log.info("worker stopping")
+        scheduler.shutdown(wait=False)
+        await ingest_jobs.shutdown()
+        await FeedDownloader.close_http_pool()
+        await asyncio.to_thread(FeedDownloader.close_ftp_sessions)
+        # ingests ainda em curso são cancelados pelo asyncio.run (runs → erro 'Cancelled')
+
+
+if __name__ == "__main__":
+    with suppress(KeyboardInterrupt):
+        asyncio.run(main())
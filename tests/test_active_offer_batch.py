@@ -0,0 +1,121 @@
+# tests/test_active_offer_batch.py
+# Oferta ativa em lote (DISTINCT ON) contra o cálculo produto a produto.
+# PostgreSQL: ver pg_db em conftest.py.
+from __future__ import annotations
+
+import random
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.domains.catalog.services.active_offer import (
+    choose_active_offer_candidate,
+    recalculate_active_offer_for_product,
+    recalculate_active_offers_for_products,
+)
+from app.models.product import Product
+from app.models.product_active_offer import ProductActiveOffer
+from app.models.supplier import Supplier
+from app.models.supplier_feed import SupplierFeed
+from app.models.supplier_item import SupplierItem
+from app.repositories.procurement.read.supplier_item_read_repo import (
+    SupplierItemReadRepository,
+)
+
+# preços como o ingest os grava (to_decimal_str) + lixo que nenhum dos caminhos aceita
+PRICES = ["10", "10.00", "9.99", "12.5", "0", "0.01", "1234.56", "abc", "", "1,5"]
+STOCKS = [0, 0, 1, 5, 5, 20]
+
+
+@pytest.fixture
+def product_ids(pg_db: Session) -> list[int]:
+    rnd = random.Random(8)
+    feeds: list[int] = []
+    for i in range(5):
+        sup = Supplier(name=f"Sup {i}", margin=0)
+        pg_db.add(sup)
+        pg_db.flush()
+        f = SupplierFeed(id_supplier=sup.id, kind="http", format="csv", url="http://x")
+        pg_db.add(f)
+        pg_db.flush()
+        feeds.append(f.id)
+
+    ids: list[int] = []
+    for n in range(60):
+        p = Product(gtin=f"P{n}", margin=rnd.choice([0, 0.2, 0.35]))
+        pg_db.add(p)
+        pg_db.flush()
+        ids.append(p.id)
+        for j, id_feed in enumerate(rnd.sample(feeds, rnd.randint(0, len(feeds)))):
+            pg_db.add(
+                SupplierItem(
+                    id_feed=id_feed,
+                    id_product=p.id,
+                    sku=f"S{n}-{j}",
+                    price=rnd.choice(PRICES),
+                    stock=rnd.choice(STOCKS),
+                    fingerprint="fp",
+                )
+            )
+    pg_db.flush()
+    return ids
+
+
+def test_best_offers_match_per_product_choice(pg_db: Session, product_ids: list[int]) -> None:
+    best = SupplierItemReadRepository(pg_db).best_offers_for_products(product_ids)
+
+    for id_product in product_ids:
+        one = choose_active_offer_candidate(pg_db, id_product=id_product)
+        row = best.get(id_product)
+        if one is None:
+            assert row is None, id_product
+            continue
+        assert row is not None, id_product
+        assert (row.id_supplier, float(row.price), row.stock) == (
+            one.id_supplier,
+            one.unit_cost,
+            one.stock,
+        ), id_product
+
+
+def _offers(db: Session, ids: list[int]) -> dict[int, tuple]:
+    rows = db.execute(
+        select(
+            ProductActiveOffer.id_product,
+            ProductActiveOffer.id_supplier,
+            ProductActiveOffer.id_supplier_item,
+            ProductActiveOffer.unit_cost,
+            ProductActiveOffer.unit_price_sent,
+            ProductActiveOffer.stock_sent,
+        ).where(ProductActiveOffer.id_product.in_(ids))
+    ).all()
+    return {r[0]: tuple(r[1:]) for r in rows}
+
+
+def test_batch_recalc_matches_per_product_recalc(pg_db: Session, product_ids: list[int]) -> None:
+    for id_product in product_ids:
+        recalculate_active_offer_for_product(pg_db, id_product=id_product)
+    pg_db.flush()
+    expected = _offers(pg_db, product_ids)
+
+    pg_db.execute(ProductActiveOffer.__table__.delete())
+    recalcs = recalculate_active_offers_for_products(pg_db, product_ids=product_ids, batch_size=7)
+    pg_db.expire_all()
+
+    assert _offers(pg_db, product_ids) == expected
+    assert [r.id_product for r in recalcs] == sorted(product_ids)
+    assert all(r.prev_snapshot is None and r.changed for r in recalcs)
+
+
+def test_batch_recalc_only_linked(pg_db: Session, product_ids: list[int]) -> None:
+    linked = product_ids[::3]
+    for id_product in linked:
+        pg_db.get(Product, id_product).id_ecommerce = 1000 + id_product
+    pg_db.flush()
+
+    recalcs = recalculate_active_offers_for_products(
+        pg_db, product_ids=product_ids, only_linked=True, batch_size=5
+    )
+    assert sorted(r.id_product for r in recalcs) == sorted(linked)
+    assert set(_offers(pg_db, product_ids)) == set(linked)
@@ -0,0 +1,201 @@
+# tests/test_catalog_update_stream.py
+# Enqueue em lote (INSERT ... ON CONFLICT no índice parcial) contra o caminho unitário,
+# e dedupe dos pendentes antes de criar o índice. PostgreSQL: ver pg_db em conftest.py.
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Engine, select, text
+from sqlalchemy.orm import Session
+
+from app.domains.catalog.services.active_offer import ActiveOfferSnapshot
+from app.infra.bootstrap import ensure_catalog_update_stream_pending_unique
+from app.models.catalog_update_stream import CatalogUpdateStream
+from app.models.product import Product
+from app.repositories.catalog.write.catalog_update_stream_write_repo import (
+    CatalogUpdateStreamWriteRepository,
+)
+
+EVENT = "product_state_changed"
+
+
+def _offer(id_product: int, cost: float, stock: int) -> ActiveOfferSnapshot:
+    return ActiveOfferSnapshot(
+        id_product=id_product,
+        id_supplier=1,
+        id_supplier_item=None,
+        unit_cost=cost,
+        unit_price_sent=round(cost * 1.2, 2),
+        stock_sent=stock,
+    )
+
+
+@pytest.fixture
+def products(pg_db: Session) -> list[Product]:
+    out = [Product(gtin=f"CUS{i}", margin=0.2, id_ecommerce=100 + i) for i in range(3)]
+    pg_db.add_all(out)
+    pg_db.flush()
+    a, b, _c = out
+    old = datetime.utcnow() - timedelta(hours=1)
+    pg_db.add_all(
+        [
+            # A: já tem pending (prioridade alta, erro antigo, id_ecommerce desatualizado)
+            CatalogUpdateStream(
+                id_product=a.id,
+                id_ecommerce=1,
+                event_type=EVENT,
+                priority=8,
+                status="pending",
+                payload="{}",
+                attempts=2,
+                last_error="timeout",
+                created_at=old,
+                available_at=old,
+            ),
+            # B: só um evento já processado (não conta para o dedupe)
+            CatalogUpdateStream(
+                id_product=b.id,
+                id_ecommerce=b.id_ecommerce,
+                event_type=EVENT,
+                priority=5,
+                status="done",
+                payload="{}",
+                created_at=old,
+                available_at=old,
+            ),
+        ]
+    )
+    pg_db.flush()
+    return out
+
+
+def _stream_state(db: Session, ids: list[int]) -> list[tuple]:
+    rows = db.execute(
+        select(
+            CatalogUpdateStream.id_product,
+            CatalogUpdateStream.id_ecommerce,
+            CatalogUpdateStream.status,
+            CatalogUpdateStream.priority,
+            CatalogUpdateStream.payload,
+            CatalogUpdateStream.attempts,
+            CatalogUpdateStream.last_error,
+        )
+        .where(CatalogUpdateStream.id_product.in_(ids))
+        .order_by(CatalogUpdateStream.id_product, CatalogUpdateStream.status)
+    ).all()
+    return [tuple(r) for r in rows]
+
+
+def test_bulk_enqueue_matches_unit_path(pg_db: Session, products: list[Product]) -> None:
+    a, b, c = products
+    items = [
+        (a, _offer(a.id, 10.0, 3), 3),
+        (b, _offer(b.id, 5.0, 0), 7),
+        (c, _offer(c.id, 8.0, 1), 2),
+        (c, _offer(c.id, 7.5, 4), 9),  # repetido no mesmo lote: fica o último payload
+        (a, None, 1),
+    ]
+    ids = [p.id for p in products]
+    repo = CatalogUpdateStreamWriteRepository(pg_db)
+
+    unit = pg_db.begin_nested()
+    for product, offer, priority in items:
+        repo.enqueue_product_state_change(
+            product=product, active_offer=offer, reason="ingest", priority=priority
+        )
+        pg_db.flush()
+    expected = _stream_state(pg_db, ids)
+    unit.rollback()
+    pg_db.expire_all()
+
+    assert repo.enqueue_product_state_changes(items, reason="ingest") == 3
+    assert _stream_state(pg_db, ids) == expected
+
+    pending = [r for r in expected if r[2] == "pending"]
+    assert [(r[0], r[1], r[3], r[6]) for r in pending] == [
+        (a.id, a.id_ecommerce, 8, None),
+        (b.id, b.id_ecommerce, 7, None),
+        (c.id, c.id_ecommerce, 9, None),
+    ]
+
+
+def test_bulk_enqueue_is_idempotent(pg_db: Session, products: list[Product]) -> None:
+    _a, b, _c = products
+    repo = CatalogUpdateStreamWriteRepository(pg_db)
+    for priority in (4, 2):
+        repo.enqueue_product_state_changes([(b, _offer(b.id, 1.0, 1), priority)], reason="x")
+    pending = pg_db.scalars(
+        select(CatalogUpdateStream.priority).where(
+            CatalogUpdateStream.id_product == b.id, CatalogUpdateStream.status == "pending"
+        )
+    ).all()
+    assert pending == [4]
+
+
+@pytest.fixture
+def no_pending_index(pg_engine: Engine):
+    # o bootstrap só corre sobre tabelas existentes; aqui com dados a sério (commit)
+    with pg_engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ux_cus_pending_product_event")
+    try:
+        yield pg_engine
+    finally:
+        with pg_engine.begin() as conn:
+            conn.execute(text("DELETE FROM catalog_update_stream"))
+            conn.execute(text("DELETE FROM products WHERE gtin LIKE 'DUP%'"))
+        ensure_catalog_update_stream_pending_unique(pg_engine)
+
+
+def test_bootstrap_collapses_pending_duplicates(no_pending_index: Engine) -> None:
+    engine = no_pending_index
+    t0 = datetime(2026, 1, 1)
+    with Session(engine) as db:
+        p, q = Product(gtin="DUP1", margin=0), Product(gtin="DUP2", margin=0)
+        db.add_all([p, q])
+        db.flush()
+        for i, (prio, status) in enumerate([(9, "pending"), (3, "pending"), (5, "done")]):
+            db.add(
+                CatalogUpdateStream(
+                    id_product=p.id,
+                    event_type=EVENT,
+                    priority=prio,
+                    status=status,
+                    payload=f'{{"n": {i}}}',
+                    created_at=t0 + timedelta(minutes=i),
+                    available_at=t0,
+                )
+            )
+        db.add(
+            CatalogUpdateStream(
+                id_product=q.id, event_type=EVENT, priority=1, status="pending", payload="{}"
+            )
+        )
+        db.commit()
+        ids = (p.id, q.id)
+
+    ensure_catalog_update_stream_pending_unique(engine)
+
+    with Session(engine) as db:
+        rows = db.execute(
+            select(
+                CatalogUpdateStream.id_product,
+                CatalogUpdateStream.status,
+                CatalogUpdateStream.priority,
+                CatalogUpdateStream.payload,
+                CatalogUpdateStream.last_error,
+            )
+            .where(CatalogUpdateStream.id_product.in_(ids))
+            .order_by(CatalogUpdateStream.id)
+        ).all()
+        assert [tuple(r) for r in rows] == [
+            (ids[0], "done", 9, '{"n": 0}', "superseded by newer pending event"),
+            # fica o mais recente, com a prioridade máxima do grupo
+            (ids[0], "pending", 9, '{"n": 1}', None),
+            (ids[0], "done", 5, '{"n": 2}', None),
+            (ids[1], "pending", 1, "{}", None),
+        ]
+        index = db.execute(
+            text("SELECT indexdef FROM pg_indexes WHERE indexname = 'ux_cus_pending_product_event'")
+        ).scalar_one()
+        assert "UNIQUE" in index and "WHERE" in index
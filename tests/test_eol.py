@@ -0,0 +1,186 @@
+# tests/test_eol.py
+# EOL set-based (seen set / gone set) contra a semântica do varrimento ORM original.
+# PostgreSQL: ver pg_db em conftest.py.
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.feed_run import FeedRun
+from app.models.product import Product
+from app.models.product_supplier_event import ProductSupplierEvent
+from app.models.supplier import Supplier
+from app.models.supplier_feed import SupplierFeed
+from app.models.supplier_item import SupplierItem
+from app.repositories.procurement.write.ingest_stage_write_repo import (
+    IngestGoneWriteRepository,
+    IngestSeenWriteRepository,
+)
+from app.repositories.procurement.write.product_event_write_repo import (
+    MarkEolResult,
+    ProductEventWriteRepository,
+)
+
+
+@dataclass
+class Item:
+    sku: str
+    stock: int
+    with_product: bool = True
+    seen: bool = False  # está no feed desta run
+    in_last_snapshot: bool = True  # estava no feed da run anterior
+
+
+ITEMS = [
+    Item("A", 5, seen=True),
+    Item("B", 3),  # saiu agora com stock → EOL
+    Item("C", 0),  # saiu agora, já a 0
+    Item("D", 0, in_last_snapshot=False),  # saiu há várias runs
+    Item("E", 4, with_product=False),  # sem produto: stock a 0, sem evento
+    Item("F", 7, seen=True, in_last_snapshot=False),  # novo no feed
+]
+
+
+@dataclass
+class Fixture:
+    id_supplier: int
+    id_feed: int
+    id_run: int
+    old_run: int
+    products: dict[str, int]
+
+
+@pytest.fixture
+def feed(pg_db: Session) -> Fixture:
+    sup = Supplier(name="Sup EOL", margin=0)
+    pg_db.add(sup)
+    pg_db.flush()
+    f = SupplierFeed(id_supplier=sup.id, kind="http", format="csv", url="http://x")
+    pg_db.add(f)
+    pg_db.flush()
+    old, run = FeedRun(id_feed=f.id), FeedRun(id_feed=f.id)
+    pg_db.add_all([old, run])
+    pg_db.flush()
+
+    products: dict[str, int] = {}
+    for it in ITEMS:
+        id_product = None
+        if it.with_product:
+            p = Product(gtin=f"560{it.sku}", margin=0)
+            pg_db.add(p)
+            pg_db.flush()
+            id_product = products[it.sku] = p.id
+        pg_db.add(
+            SupplierItem(
+                id_feed=f.id,
+                id_product=id_product,
+                sku=it.sku,
+                gtin=f"560{it.sku}",
+                price="9.99",
+                stock=it.stock,
+                fingerprint="fp",
+                id_feed_run=old.id,
+            )
+        )
+    pg_db.flush()
+    return Fixture(sup.id, f.id, run.id, old.id, products)
+
+
+def _reference(fx: Fixture) -> tuple[MarkEolResult, dict[str, int], list[tuple[int, str]]]:
+    """
+    Semântica do varrimento original (todos os itens do feed não vistos), menos as
+    alterações assumidas no set-based: itens já a 0 não são reescritos e só as
+    transições >0 → 0 contam como produtos afetados.
+    """
+    unseen = [it for it in ITEMS if not it.seen]
+    changed = [it for it in unseen if it.stock]
+    affected = sorted(fx.products[it.sku] for it in changed if it.with_product)
+    stocks = {it.sku: 0 if it in changed else it.stock for it in ITEMS}
+    events = [(fx.products[it.sku], "eol") for it in changed if it.with_product]
+    result = MarkEolResult(
+        affected_products=affected,
+        items_total=len(unseen),
+        items_stock_changed=len(changed),
+        items_already_zero=len(unseen) - len(changed),
+    )
+    return result, stocks, sorted(events)
+
+
+def _state(db: Session, fx: Fixture) -> tuple[dict[str, int], dict[str, int], list]:
+    items = db.execute(
+        select(SupplierItem.sku, SupplierItem.stock, SupplierItem.id_feed_run).where(
+            SupplierItem.id_feed == fx.id_feed
+        )
+    ).all()
+    events = db.execute(
+        select(ProductSupplierEvent.id_product, ProductSupplierEvent.reason).where(
+            ProductSupplierEvent.id_feed_run == fx.id_run,
+            ProductSupplierEvent.id_supplier == fx.id_supplier,
+            ProductSupplierEvent.stock == 0,
+        )
+    ).all()
+    return (
+        {sku: stock for sku, stock, _ in items},
+        {sku: run for sku, _, run in items},
+        sorted(tuple(e) for e in events),
+    )
+
+
+def _eol_full_scan(db: Session, fx: Fixture) -> MarkEolResult:
+    seen = IngestSeenWriteRepository(db)
+    seen.create()
+    seen.copy_skus(it.sku for it in ITEMS if it.seen)
+    return ProductEventWriteRepository(db).mark_eol_for_unseen_items(
+        id_feed=fx.id_feed, id_supplier=fx.id_supplier, id_feed_run=fx.id_run
+    )
+
+
+def _eol_gone_set(db: Session, fx: Fixture) -> MarkEolResult:
+    gone = IngestGoneWriteRepository(db)
+    gone.create()
+    gone.copy_skus(it.sku for it in ITEMS if it.in_last_snapshot and not it.seen)
+    return ProductEventWriteRepository(db).mark_eol_for_gone_items(
+        id_feed=fx.id_feed, id_supplier=fx.id_supplier, id_feed_run=fx.id_run
+    )
+
+
+def test_full_scan_eol_matches_reference(pg_db: Session, feed: Fixture) -> None:
+    expected, stocks, events = _reference(feed)
+
+    res = _eol_full_scan(pg_db, feed)
+    res.affected_products.sort()
+    assert res == expected
+
+    got_stocks, runs, got_events = _state(pg_db, feed)
+    assert got_stocks == stocks
+    assert got_events == events
+    # só os itens reescritos (transição para 0) avançam o run
+    assert {sku for sku, r in runs.items() if r == feed.id_run} == {"B", "E"}
+
+
+def test_gone_set_eol_matches_full_scan(pg_db: Session, feed: Fixture) -> None:
+    expected, stocks, events = _reference(feed)
+
+    res = _eol_gone_set(pg_db, feed)
+    assert sorted(res.affected_products) == expected.affected_products
+    assert res.items_stock_changed == expected.items_stock_changed
+    # items_total = só os que saíram nesta run (D já tinha saído antes)
+    assert res.items_total == expected.items_total - 1
+    assert res.items_already_zero == expected.items_already_zero - 1
+
+    got_stocks, _runs, got_events = _state(pg_db, feed)
+    assert got_stocks == stocks
+    assert got_events == events
+
+
+def test_eol_is_idempotent(pg_db: Session, feed: Fixture) -> None:
+    _eol_full_scan(pg_db, feed)
+    again = ProductEventWriteRepository(pg_db).mark_eol_for_unseen_items(
+        id_feed=feed.id_feed, id_supplier=feed.id_supplier, id_feed_run=feed.id_run
+    )
+    assert again.items_stock_changed == 0
+    assert again.affected_products == []
+    assert again.items_already_zero == again.items_total == 4
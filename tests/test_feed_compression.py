@@ -0,0 +1,179 @@
+# tests/test_feed_compression.py
+# Descompressão em streaming contra a extração em memória original (zipfile.read,
+# gzip/bz2/lzma.decompress).
+from __future__ import annotations
+
+import bz2
+import gzip
+import hashlib
+import io
+import lzma
+import zipfile
+
+import pytest
+
+from app.external.feed_compression import detect_compression, open_decompressed
+from app.external.feed_downloader import FeedDownloader, iter_rows_csv
+from app.external.feed_payload import FeedPayload
+
+CSV = "sku;preço\n" + "".join(f"A-{i};{i},99\n" for i in range(5000))
+DATA = CSV.encode()
+
+COMPRESSORS = {
+    "gzip": gzip.compress,
+    "bz2": bz2.compress,
+    "xz": lzma.compress,
+}
+
+
+def _zip(entries: dict[str, bytes]) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in entries.items():
+            if name.endswith("/"):
+                zf.writestr(zipfile.ZipInfo(name), b"")
+            else:
+                zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def _read(raw: bytes, compression: str, entry_name: str | None = None, size: int = 7) -> bytes:
+    # leituras pequenas: o resultado não pode depender do tamanho do bloco
+    out = io.BytesIO()
+    with open_decompressed(io.BytesIO(raw), compression, entry_name=entry_name) as src:
+        while chunk := src.read(size):
+            out.write(chunk)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("name", sorted(COMPRESSORS))
+def test_stream_matches_in_memory_decompress(name: str) -> None:
+    raw = COMPRESSORS[name](DATA)
+    assert detect_compression(raw[:8]) == name
+    assert _read(raw, name) == DATA
+
+
+def test_gzip_multi_member() -> None:
+    raw = gzip.compress(DATA[:1000]) + gzip.compress(DATA[1000:])
+    assert _read(raw, "gzip") == gzip.decompress(raw) == DATA
+
+
+# -------------------- zip (mesma escolha de entrada que _decompress_zip) --------------------
+
+ARCHIVE = {
+    "dir/": b"",
+    "Feed.CSV": DATA,
+    "other.csv": b"x;y\n1;2\n",
+}
+
+
+@pytest.mark.parametrize(
+    ("entry_name", "expected"),
+    [
+        (None, "Feed.CSV"),  # 1.º ficheiro, diretórios ignorados
+        ("other.csv", "other.csv"),
+        ("feed.csv", "Feed.CSV"),  # fallback case-insensitive
+    ],
+)
+def test_zip_entry_choice(entry_name: str | None, expected: str) -> None:
+    raw = _zip(ARCHIVE)
+    with zipfile.ZipFile(io.BytesIO(raw)) as zf:
+        baseline = zf.read(expected)
+    assert _read(raw, "zip", entry_name) == baseline
+
+
+@pytest.mark.parametrize(
+    ("entries", "entry_name", "error"),
+    [
+        (ARCHIVE, "missing.csv", "zip entry 'missing.csv' not found"),
+        ({}, None, "zip archive is empty"),
+        ({"only/": b""}, None, "no file entries found inside zip archive"),
+    ],
+)
+def test_zip_errors(entries: dict[str, bytes], entry_name: str | None, error: str) -> None:
+    with pytest.raises(ValueError, match=error):
+        _read(_zip(entries), "zip", entry_name)
+
+
+def test_zip_glob_concatenates_parts_without_repeated_header() -> None:
+    header = b"sku;price\n"
+    raw = _zip(
+        {
+            "parts/p1.csv": header + b"A;1\nB;2",  # sem \n final
+            "parts/p2.csv": b"\xef\xbb\xbf" + header + b"C;3\n",  # com BOM
+            "__MACOSX/parts/._p3.csv": b"junk",
+            "parts/p3.csv": header + b"D;4\n",
+        }
+    )
+    data = _read(raw, "zip", "parts/*.csv")
+    assert data == header + b"A;1\nB;2\nC;3\nD;4\n"
+    rows = list(iter_rows_csv(io.BytesIO(data), delimiter=";"))
+    assert [r["sku"] for r in rows] == ["A", "B", "C", "D"]
+
+
+# -------------------- deteção / hint --------------------
+
+
+@pytest.mark.parametrize(
+    ("head", "hint", "expected"),
+    [
+        (b"PK\x03\x04", None, "zip"),
+        (b"\x1f\x8b\x08", "auto", "gzip"),
+        (b"\x1f\x8b\x08", "gz", "gzip"),
+        (b"BZh9", "bzip2", "bz2"),
+        (b"\xfd7zXZ\x00", "xz", "xz"),
+        (b"\x1f\x8b\x08", "none", None),
+        (b"sku;price", None, None),
+    ],
+)
+def test_detect_compression(head: bytes, hint: str | None, expected: str | None) -> None:
+    assert detect_compression(head, hint=hint) == expected
+
+
+@pytest.mark.parametrize(
+    ("head", "hint", "error"),
+    [
+        (b"sku;price", "zip", "does not look like a zip file"),
+        (b"", "zip", "empty payload"),
+        (b"PK\x03\x04", "rar", "unsupported compression"),
+    ],
+)
+def test_detect_compression_rejects_bad_hint(head: bytes, hint: str, error: str) -> None:
+    with pytest.raises(ValueError, match=error):
+        detect_compression(head, hint=hint)
+
+
+# -------------------- payload + downloader --------------------
+
+
+def test_payload_decoder_reads_and_hashes_decompressed_content() -> None:
+    with FeedPayload.from_bytes(gzip.compress(DATA)) as payload:
+        ct = FeedDownloader()._prepare_decompression(
+            payload, "application/gzip", {}, "https://x/feeds/stock.csv.gz"
+        )
+        assert ct == "text/csv"
+        assert payload.open().read() == DATA
+        assert payload.head(4) == DATA[:4]
+        assert payload.sha256 == hashlib.sha256(DATA).hexdigest()
+        rows = list(iter_rows_csv(payload.open(), delimiter=";"))
+        assert len(rows) == 5000 and rows[-1] == {"sku": "A-4999", "preço": "4999,99"}
+
+
+def test_prepare_decompression_zip_content_type_and_errors() -> None:
+    dl = FeedDownloader()
+    with FeedPayload.from_bytes(_zip({"feed.json": b"[]"})) as payload:
+        assert dl._prepare_decompression(payload, "application/zip", {}, "https://x/f") == (
+            "application/json"
+        )
+        # content-type do servidor já é o do conteúdo → mantém-se
+        assert dl._prepare_decompression(payload, "text/csv", {}, "https://x/f") == "text/csv"
+    with (
+        FeedPayload.from_bytes(_zip({"feed.json": b"[]"})) as payload,
+        pytest.raises(ValueError, match="not found"),
+    ):
+        dl._prepare_decompression(
+            payload, "application/zip", {"zip_entry_name": "x.csv"}, "https://x/f"
+        )
+    with FeedPayload.from_bytes(DATA) as payload:
+        assert dl._prepare_decompression(payload, "text/csv", {}, "https://x/f.csv") == "text/csv"
+        assert payload.decoder is None
@@ -0,0 +1,125 @@
+# tests/test_feed_json_rows.py
+# iter_rows_json (streaming) tem de devolver o mesmo que o parse de referência
+# sobre o documento inteiro (json.loads + prioridade das chaves + NDJSON por linhas).
+from __future__ import annotations
+
+import io
+import json
+from typing import Any
+
+import pytest
+
+from app.external import feed_downloader
+from app.external.feed_downloader import JSON_LIST_KEYS, iter_rows_json, parse_rows_json
+
+
+def _reference(raw: bytes) -> list[dict]:
+    # parse_rows_json antes do streaming
+    try:
+        obj = json.loads(raw.decode(errors="ignore"))
+        if isinstance(obj, list):
+            return [x for x in obj if isinstance(x, dict)]
+        if isinstance(obj, dict):
+            for key in JSON_LIST_KEYS:
+                v = obj.get(key)
+                if isinstance(v, list):
+                    return [x for x in v if isinstance(x, dict)]
+            return [obj]
+    except Exception:
+        pass
+    out: list[dict] = []
+    for line in raw.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            val = json.loads(line.decode(errors="ignore"))
+            if isinstance(val, dict):
+                out.append(val)
+        except Exception:
+            continue
+    return out
+
+
+def _dumps(obj: Any, **kw: Any) -> bytes:
+    return json.dumps(obj, **kw).encode()
+
+
+ROWS = [{"sku": f"A-{i}", "price": i * 1.5, "tags": ["x", {"y": i}]} for i in range(5)]
+
+DOCS: dict[str, bytes] = {
+    "list": _dumps([*ROWS, 1, "x", None]),
+    "empty_list": b"[]",
+    "data": _dumps({"meta": {"n": 5}, "data": ROWS}),
+    "items": _dumps({"items": ROWS, "total": 5}),
+    "priority_over_document_order": _dumps(
+        {"list": [{"a": 1}], "items": ROWS[:2], "data": ROWS, "results": [{"b": 2}]}
+    ),
+    "lower_priority_first": _dumps({"rows": [{"a": 1}], "products": ROWS}),
+    "non_list_data": _dumps({"data": {"sku": "x"}, "items": ROWS}),
+    "non_dict_elements": _dumps({"results": [1, ROWS[0], [2], ROWS[1]]}),
+    "no_known_list": _dumps({"sku": "A-1", "other": [1, 2], "nested": {"items": [{"a": 1}]}}),
+    "empty_object": b"{}",
+    "pretty": _dumps({"page": 1, "products": ROWS}, indent=2),
+    "pretty_one_per_line": b'{\n"items": [\n{"sku": "A"},\n{"sku": "B"}\n],\n"data": [\n{"sku": "C"}\n]\n}',
+    "ndjson": b"\n".join(_dumps(r) for r in ROWS) + b"\n",
+    "ndjson_blank_and_bad_lines": b'\n{"sku": "A"}\n\nnot json\n{"sku": "B"}\n[1]\n{"sku": "C"}',
+    "ndjson_bad_first_line": b'{"sku": "A", oops\n' + b"\n".join(_dumps(r) for r in ROWS),
+    "ndjson_garbage_first_line": b"garbage\n" + b"\n".join(_dumps(r) for r in ROWS),
+    "ndjson_truncated_first_line": b'{"sku":\n{"sku": "A"}\n{"sku": "B"}\n',
+}
+
+
+class _Unseekable(io.RawIOBase):
+    def __init__(self, data: bytes) -> None:
+        self._src = io.BytesIO(data)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        return self._src.readinto(b)
+
+
+@pytest.fixture(params=[64 * 1024, 7], ids=["chunk64k", "chunk7"])
+def chunk(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> int:
+    # blocos minúsculos obrigam valores/linhas a atravessar vários _fill
+    monkeypatch.setattr(feed_downloader, "_JSON_CHUNK_CHARS", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("name", sorted(DOCS))
+def test_stream_matches_reference(name: str, chunk: int) -> None:
+    raw = DOCS[name]
+    expected = _reference(raw)
+
+    assert list(iter_rows_json(raw)) == expected
+    assert list(iter_rows_json(io.BufferedReader(_Unseekable(raw)))) == expected
+    assert parse_rows_json(raw) == expected
+
+
+def test_seekable_stream_from_offset() -> None:
+    # a 2.ª passagem volta à posição inicial do stream, não ao byte 0
+    raw = DOCS["lower_priority_first"]
+    stream = io.BytesIO(b"junk" + raw)
+    stream.seek(4)
+    assert list(iter_rows_json(stream)) == ROWS
+
+
+def test_bom_is_ignored() -> None:
+    assert list(iter_rows_json("\ufeff".encode() + _dumps({"items": ROWS}))) == ROWS
+
+
+def test_strict_rejects_malformed_json() -> None:
+    with pytest.raises(ValueError):
+        list(iter_rows_json(b'{"items": [{"sku": "A"}, {"sku": '))
+    with pytest.raises(ValueError):
+        list(iter_rows_json(b'{"sku": "A", }'))
+
+
+def test_lenient_preview_of_truncated_sample() -> None:
+    raw = _dumps({"total": 5, "items": ROWS})
+    assert parse_rows_json(raw[:-40]) == ROWS[:-1]
+    # lista de prioridade mais alta já completa antes do corte
+    raw = _dumps({"data": ROWS[:2], "items": ROWS})
+    assert parse_rows_json(raw[:-10]) == ROWS[:2]
@@ -0,0 +1,236 @@
+# tests/test_ftp_downloader.py
+# Sessões FTP reutilizadas (FtpSessionPool) e retoma com REST contra o download original
+# (connect + login + RETR completo + quit a cada feed), com um servidor FTP falso.
+from __future__ import annotations
+
+import asyncio
+import ftplib
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import pytest
+
+from app.core.config import settings
+from app.external import ftp_downloader
+from app.external.ftp_downloader import FtpDownloader, FtpSessionPool
+
+BODY = b"sku;price\n" + b"".join(b"A-%d;%d\n" % (i, i) for i in range(500))
+
+
+@dataclass
+class _Server:
+    files: dict[str, tuple[bytes, str]] = field(default_factory=dict)  # path → (dados, MDTM)
+    mlsd: bool = True
+    rest: bool = True
+    cut_next: list[int] = field(default_factory=list)  # bytes enviados antes de cortar
+    sessions: list[_FakeFtp] = field(default_factory=list)
+    log: list[tuple[int, str]] = field(default_factory=list)
+
+    @property
+    def logins(self) -> int:
+        return sum(1 for _, cmd in self.log if cmd.startswith("LOGIN"))
+
+
+class _FakeFtp:
+    server: _Server
+
+    def __init__(self) -> None:
+        self.n = len(self.server.sessions)
+        self.server.sessions.append(self)
+        self.alive = False
+        self.closed = False
+
+    def _cmd(self, cmd: str) -> None:
+        if self.closed or not self.alive:
+            raise OSError("not connected")
+        self.server.log.append((self.n, cmd))
+
+    def _file(self, path: str) -> tuple[bytes, str]:
+        return self.server.files[path.lstrip("/")]
+
+    def connect(self, host: str, port: int, timeout: float) -> None:
+        self.alive = True
+        self._cmd(f"CONNECT {host}:{port}")
+
+    def login(self, user: str, pwd: str) -> None:
+        self._cmd(f"LOGIN {user}")
+
+    def set_pasv(self, val: bool) -> None:
+        pass
+
+    def voidcmd(self, cmd: str) -> str:
+        self._cmd(cmd)
+        if cmd.startswith("MDTM "):
+            return "213 " + self._file(cmd[5:])[1]
+        return "200 OK"
+
+    def size(self, path: str) -> int:
+        self._cmd(f"SIZE {path}")
+        return len(self._file(path)[0])
+
+    def mlsd(self, path: str, facts: list[str]):
+        if not self.server.mlsd:
+            raise ftplib.error_perm("500 MLSD not understood")
+        self._cmd(f"MLSD {path}")
+        yield "sub", {"type": "dir"}
+        for name, (data, modify) in self.server.files.items():
+            yield name, {"type": "file", "size": str(len(data)), "modify": modify}
+
+    def nlst(self, path: str) -> list[str]:
+        self._cmd(f"NLST {path}")
+        return list(self.server.files)
+
+    def retrbinary(self, cmd: str, callback: Callable[[bytes], None], rest: int | None) -> None:
+        self._cmd(f"{cmd} REST {rest}" if rest else cmd)
+        if rest and not self.server.rest:
+            raise ftplib.error_perm("502 REST not implemented")
+        data = self._file(cmd[5:])[0][rest or 0 :]
+        if self.server.cut_next:
+            cut = self.server.cut_next.pop(0)
+            callback(data[:cut])
+            self.alive = False  # ligação de dados e de controlo caem
+            raise EOFError("connection closed")
+        for i in range(0, len(data), 64):
+            callback(data[i : i + 64])
+
+    def delete(self, path: str) -> None:
+        self._cmd(f"DELE {path}")
+
+    def quit(self) -> None:
+        self._cmd("QUIT")
+        self.closed = True
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> _Server:
+    srv = _Server(files={"feed.csv": (BODY, "20260101000000")})
+    fake = type("FakeFtp", (_FakeFtp,), {"server": srv})
+    monkeypatch.setattr(ftplib, "FTP", fake)
+    monkeypatch.setattr(ftp_downloader, "backoff_delay", lambda attempt: 0)
+    monkeypatch.setattr(settings, "FEED_DOWNLOAD_RETRIES", 2)
+    monkeypatch.setattr(settings, "FEED_FTP_KEEPALIVE_S", 60.0)
+    monkeypatch.setattr(settings, "FEED_FTP_MAX_IDLE_PER_HOST", 2)
+    return srv
+
+
+def _fetch(dl: FtpDownloader, url: str = "ftp://u:p@ftp.example/feed.csv", **extra):
+    status, ct, payload, err = asyncio.run(dl.fetch(url=url, extra=extra or None))
+    with payload:
+        return status, ct, payload.open().read(), payload.stats, err
+
+
+def test_without_pool_each_download_logs_in_and_quits(server: _Server) -> None:
+    dl = FtpDownloader(timeout_s=5)
+    for _ in range(2):
+        assert _fetch(dl)[:3] == (200, "text/csv", BODY)
+    assert server.logins == 2
+    assert all(s.closed for s in server.sessions)
+    assert [cmd for _, cmd in server.log].count("QUIT") == 2
+
+
+def test_pool_reuses_session_with_same_result(server: _Server) -> None:
+    pool = FtpSessionPool()
+    dl = FtpDownloader(timeout_s=5, sessions=pool)
+    for _ in range(3):
+        assert _fetch(dl)[:3] == (200, "text/csv", BODY)
+    # um só login; a sessão é validada com NOOP antes de cada reutilização
+    assert server.logins == 1
+    assert [cmd for _, cmd in server.log].count("NOOP") == 2
+    assert not server.sessions[0].closed
+
+    # credenciais diferentes → sessão própria
+    _fetch(dl, "ftp://other:p@ftp.example/feed.csv")
+    assert server.logins == 2
+
+    pool.close()
+    assert all(s.closed for s in server.sessions)
+    assert [cmd for _, cmd in server.log].count("QUIT") == 2
+
+
+def test_pool_drops_stale_and_expired_sessions(
+    server: _Server, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pool = FtpSessionPool()
+    dl = FtpDownloader(timeout_s=5, sessions=pool)
+    _fetch(dl)
+    server.sessions[0].alive = False  # servidor fechou a sessão inativa → NOOP falha
+    assert _fetch(dl)[0] == 200
+    assert server.logins == 2 and server.sessions[0].closed
+
+    pool.keepalive_s = 0  # inativa há demasiado tempo → nem chega a mandar NOOP
+    noops = [cmd for _, cmd in server.log].count("NOOP")
+    assert _fetch(dl)[0] == 200
+    assert server.logins == 3 and server.sessions[1].closed
+    assert [cmd for _, cmd in server.log].count("NOOP") == noops
+
+
+def test_pool_keeps_at_most_max_idle(server: _Server) -> None:
+    pool = FtpSessionPool()
+    key = ("ftp", "h", 21, "u", "p")
+    sessions = [ftplib.FTP() for _ in range(3)]
+    for s in sessions:
+        s.connect("h", 21, timeout=1)
+        pool.release(key, s)
+    assert [s.closed for s in sessions] == [False, False, True]
+    assert pool.acquire(key) is sessions[1]
+    assert pool.acquire(key) is sessions[0]
+    assert pool.acquire(key) is None
+
+
+def test_cut_transfer_resumes_on_new_session(server: _Server) -> None:
+    server.cut_next = [100, 250]
+    dl = FtpDownloader(timeout_s=5, sessions=FtpSessionPool())
+    status, _ct, data, stats, _err = _fetch(dl)
+    assert (status, data) == (200, BODY)
+    assert (stats.attempts, stats.resumes, stats.bytes_received) == (3, 2, len(BODY))
+    # a sessão com erro nunca volta ao pool
+    assert server.sessions[0].closed and server.sessions[1].closed
+    retr = [(n, cmd) for n, cmd in server.log if cmd.startswith("RETR")]
+    assert retr == [
+        (0, "RETR /feed.csv"),
+        (1, "RETR /feed.csv REST 100"),
+        (2, "RETR /feed.csv REST 350"),
+    ]
+
+
+def test_rest_rejected_restarts_from_zero(server: _Server) -> None:
+    server.rest = False
+    server.cut_next = [100]
+    status, _ct, data, stats, _err = _fetch(FtpDownloader(timeout_s=5))
+    assert (status, data) == (200, BODY)
+    assert stats.attempts == 3
+    assert [cmd for _, cmd in server.log if cmd.startswith("RETR")] == [
+        "RETR /feed.csv",
+        "RETR /feed.csv REST 100",
+        "RETR /feed.csv",
+    ]
+
+
+def test_cut_on_every_attempt_fails(server: _Server) -> None:
+    server.cut_next = [10, 10, 10]
+    status, _ct, data, stats, err = _fetch(FtpDownloader(timeout_s=5))
+    assert (status, data, stats.attempts) == (599, b"", 3)
+    assert err == "connection closed"
+
+
+@pytest.mark.parametrize("mlsd", [True, False])
+def test_auto_latest_picks_newest_file(server: _Server, mlsd: bool) -> None:
+    server.mlsd = mlsd
+    server.files = {
+        "a_new.csv": (b"new\n", "20260301120000"),
+        "z_old.csv": (b"old\n", "20260101120000"),
+        "b_other.zip": (b"PK", "20260401120000"),
+    }
+    dl = FtpDownloader(timeout_s=5)
+    status, ct, data, _stats, _err = _fetch(
+        dl, "ftp://u:p@ftp.example/", ftp_auto_latest="yes", ftp_file_ext=".CSV"
+    )
+    assert (status, ct, data) == (200, "text/csv", b"new\n")
+    # sem auto-latest: o primeiro por nome (comportamento antigo)
+    status, _ct, data, _stats, _err = _fetch(dl, "ftp://u:p@ftp.example/", ftp_file_ext="csv")
+    assert (status, data) == (200, b"new\n")
+    server.files = {"z_old.csv": (b"old\n", "20260101120000")}
+    assert _fetch(dl, "ftp://u:p@ftp.example/", ftp_file_ext="csv")[2] == b"old\n"
@@ -0,0 +1,124 @@
+# tests/test_http_downloader.py
+# Retoma de downloads: um 206 que não continua onde ficámos nunca é aceite como sucesso.
+from __future__ import annotations
+
+import asyncio
+import gzip
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.external.http_downloader import HttpDownloader
+
+BODY = b"sku;price\n" + b"".join(b"A-%d;%d\n" % (i, i) for i in range(200))
+CUT = 100
+HEADERS = {"accept-ranges": "bytes", "etag": '"v1"', "content-type": "text/csv"}
+
+
+class _CutStream(httpx.AsyncByteStream):
+    # envia parte do corpo e depois a ligação "cai"
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield self._data
+        raise httpx.ReadError("connection reset")
+
+
+def _downloader(handler: Callable[[httpx.Request], httpx.Response]) -> HttpDownloader:
+    dl = HttpDownloader(timeout_s=5)
+
+    @asynccontextmanager
+    async def client(url: str) -> AsyncIterator[httpx.AsyncClient]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as cli:
+            yield cli
+
+    dl._client = client  # type: ignore[method-assign]
+    return dl
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "FEED_DOWNLOAD_BACKOFF_S", 0)
+    monkeypatch.setattr(settings, "FEED_DOWNLOAD_BACKOFF_MAX_S", 0)
+    monkeypatch.setattr(settings, "FEED_DOWNLOAD_RETRIES", 2)
+
+
+def _fetch(dl: HttpDownloader):
+    return asyncio.run(dl.fetch(url="https://feeds.example/stock.csv"))
+
+
+def _partial(start: int, *, gzipped: bool = False) -> httpx.Response:
+    headers = {**HEADERS, "content-range": f"bytes {start}-{len(BODY) - 1}/{len(BODY)}"}
+    if gzipped:
+        headers["content-encoding"] = "gzip"
+    body = BODY[start:]
+    return httpx.Response(206, headers=headers, content=gzip.compress(body) if gzipped else body)
+
+
+def test_valid_resume_continues_payload() -> None:
+    ranges: list[str | None] = []
+
+    def handler(req: httpx.Request) -> httpx.Response:
+        ranges.append(req.headers.get("range"))
+        if len(ranges) == 1:
+            return httpx.Response(200, headers=HEADERS, stream=_CutStream(BODY[:CUT]))
+        return _partial(CUT)
+
+    status, _ct, payload, err = _fetch(_downloader(handler))
+    with payload:
+        assert (status, err) == (200, None)
+        assert payload.read_bytes() == BODY
+        assert payload.stats.resumes == 1
+    assert ranges == [None, f"bytes={CUT}-"]
+
+
+@pytest.mark.parametrize(
+    "bad_partial",
+    [lambda: _partial(0), lambda: _partial(CUT, gzipped=True)],
+    ids=["wrong-offset", "content-encoding"],
+)
+def test_invalid_partial_restarts_from_zero(bad_partial: Callable[[], httpx.Response]) -> None:
+    ranges: list[str | None] = []
+
+    def handler(req: httpx.Request) -> httpx.Response:
+        ranges.append(req.headers.get("range"))
+        if len(ranges) == 1:
+            return httpx.Response(200, headers=HEADERS, stream=_CutStream(BODY[:CUT]))
+        if len(ranges) == 2:
+            return bad_partial()
+        return httpx.Response(200, headers=HEADERS, content=BODY)
+
+    status, _ct, payload, err = _fetch(_downloader(handler))
+    with payload:
+        assert (status, err) == (200, None)
+        assert payload.read_bytes() == BODY
+        assert payload.stats.resumes == 0
+    # 3.ª tentativa já sem Range: recomeça do zero
+    assert ranges == [None, f"bytes={CUT}-", None]
+
+
+def test_partial_on_last_attempt_is_a_failure(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "FEED_DOWNLOAD_RETRIES", 1)
+
+    def handler(req: httpx.Request) -> httpx.Response:
+        if req.headers.get("range") is None:
+            return httpx.Response(200, headers=HEADERS, stream=_CutStream(BODY[:CUT]))
+        return _partial(0)
+
+    status, _ct, payload, err = _fetch(_downloader(handler))
+    with payload:
+        assert status == 599
+        assert err == "invalid partial response (HTTP 206)"
+        assert payload.size == 0
+        assert payload.stats.attempts == 2
+
+
+def test_unrequested_partial_is_never_success() -> None:
+    status, _ct, payload, err = _fetch(_downloader(lambda req: _partial(0)))
+    with payload:
+        assert status == 599
+        assert err == "invalid partial response (HTTP 206)"
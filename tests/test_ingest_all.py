@@ -0,0 +1,64 @@
+# tests/test_ingest_all.py
+# ingest_all: uma run que rebenta ou um recálculo falhado não perdem os produtos das outras runs.
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from app.domains.procurement.usecases.runs import ingest_all
+
+RUNS = [(10, 100, 1), (20, 200, 2), (30, 300, 3)]  # (id_supplier, id_feed, id_run)
+
+
+async def _fake_run(*, id_run: int, **_kwargs: Any) -> dict[str, Any]:
+    if id_run == 2:
+        raise RuntimeError("db down")
+    return {"ok": True, "id_run": id_run, "affected_products": {id_run * 10, 99}}
+
+
+def test_failed_run_does_not_abort_the_others(monkeypatch: pytest.MonkeyPatch) -> None:
+    refreshed: list[set[int]] = []
+
+    def refresh(product_ids: set[int]) -> tuple[int, int, int]:
+        refreshed.append(set(product_ids))
+        return len(product_ids), 0, 0
+
+    monkeypatch.setattr(ingest_all, "run_ingest_job", _fake_run)
+    monkeypatch.setattr(ingest_all, "_refresh_offers", refresh)
+
+    out = asyncio.run(ingest_all._run_all(RUNS, limit=None, mode="row"))
+
+    assert [r["ok"] for r in out["runs"]] == [True, False, True]
+    assert out["runs"][1] == {
+        "ok": False,
+        "id_run": 2,
+        "error": "RuntimeError: db down",
+        "id_supplier": 20,
+    }
+    assert refreshed == [{10, 30, 99}]
+    assert out["active_offers"] == {"products": 3, "recalculated": 3, "changed": 0, "enqueued": 0}
+    assert out["ok"] is False
+
+
+def test_refresh_falls_back_to_each_run(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[set[int]] = []
+
+    def refresh(product_ids: set[int]) -> tuple[int, int, int]:
+        calls.append(set(product_ids))
+        if len(calls) == 1 or 30 in product_ids:  # união falha; run 3 falha sozinha
+            raise RuntimeError("deadlock")
+        return len(product_ids), 1, 1
+
+    monkeypatch.setattr(ingest_all, "run_ingest_job", _fake_run)
+    monkeypatch.setattr(ingest_all, "_refresh_offers", refresh)
+
+    out = asyncio.run(ingest_all._run_all(RUNS, limit=None, mode="row"))
+
+    assert calls == [{10, 30, 99}, {10, 99}, {30, 99}]
+    offers = out["active_offers"]
+    assert offers["fallback"] == "per_run"
+    assert offers["recalculated"] == 2
+    assert offers["failed_runs"] == [3]
+    assert offers["error"] == "deadlock"
@@ -0,0 +1,265 @@
+# tests/test_ingest_delta.py
+# Delta ingest (snapshot por feed) contra a run completa: o resultado na BD tem de ser
+# o mesmo, só com menos linhas a chegar ao persist. Runs a sério (commit), por isso
+# com sessão própria por run e tabelas limpas no fim. PostgreSQL: ver pg_engine em conftest.py.
+from __future__ import annotations
+
+import json
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy import Engine, select, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.domains.procurement.services.ingest_rows import prepare_row
+from app.domains.procurement.services.ingest_snapshot import (
+    FeedDelta,
+    load_entries,
+    read_info,
+    snapshot_path,
+)
+from app.domains.procurement.usecases.runs.ingest_supplier import _open_run, _process
+from app.external.feed_payload import FeedPayload
+from app.infra.base import Base
+from app.infra.uow import UoW
+from app.models.feed_mapper import FeedMapper
+from app.models.product_supplier_event import ProductSupplierEvent
+from app.models.supplier import Supplier
+from app.models.supplier_feed import SupplierFeed
+from app.models.supplier_item import SupplierItem
+from app.repositories.procurement.write.supplier_item_write_repo import (
+    SupplierItemWriteRepository,
+)
+
+PROFILE = {
+    "fields": {
+        "sku": {"source": "ref", "required": True},
+        "gtin": {"source": "ean"},
+        "price": {"source": "pvp", "to_number": {"decimal": ","}},
+        "stock": {"source": "qty"},
+        "brand": {"source": "marca"},
+    }
+}
+
+V1 = {
+    "A": ("5601000000011", "10,00", 5),
+    "B": ("5601000000028", "20,00", 3),
+    "C": ("5601000000035", "30,00", 2),  # sai na v2
+    "D": ("5601000000042", "40,00", 8),
+    "E": ("5601000000059", "50,00", 0),
+}
+V2 = {
+    "A": V1["A"],
+    "B": ("5601000000028", "19,90", 3),  # preço mudou
+    "D": ("5601000000042", "40,00", 0),  # stock mudou
+    "E": V1["E"],
+    "F": ("5601000000066", "60,00", 4),  # novo
+}
+
+
+def _csv(rows: dict[str, tuple[str, str, int]], *extra: str) -> bytes:
+    lines = ["ref;ean;pvp;qty;marca"]
+    lines += [f"{sku};{ean};{pvp};{qty};Acme" for sku, (ean, pvp, qty) in rows.items()]
+    lines += extra
+    return ("\n".join(lines) + "\n").encode()
+
+
+@pytest.fixture
+def engine(pg_engine: Engine, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Engine]:
+    monkeypatch.setattr(settings, "INGEST_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "INGEST_MAP_WORKERS", 0)
+    monkeypatch.setattr(settings, "INGEST_SKIP_SAME_PAYLOAD", True)
+    try:
+        yield pg_engine
+    finally:
+        tables = ", ".join(t.name for t in Base.metadata.sorted_tables)
+        with pg_engine.begin() as conn:
+            conn.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+
+
+@dataclass
+class Feed:
+    id_supplier: int
+    id_feed: int
+
+
+def _feed(engine: Engine, name: str) -> Feed:
+    with Session(engine) as db:
+        sup = Supplier(name=name, margin=0)
+        db.add(sup)
+        db.flush()
+        f = SupplierFeed(id_supplier=sup.id, kind="http", format="csv", url="http://x")
+        f.csv_delimiter = ";"
+        db.add(f)
+        db.flush()
+        db.add(FeedMapper(id_feed=f.id, profile_json=json.dumps(PROFILE), version=1))
+        db.commit()
+        return Feed(sup.id, f.id)
+
+
+def _ingest(
+    engine: Engine,
+    feed: Feed,
+    data: bytes,
+    *,
+    mode: str,
+    delta: bool,
+    monkeypatch: pytest.MonkeyPatch,
+) -> dict[str, Any]:
+    monkeypatch.setattr(settings, "INGEST_DELTA", delta)
+    with Session(engine) as db:
+        uow = UoW(db)
+        opened = _open_run(db, id_supplier=feed.id_supplier, id_run=None, mode=mode)
+        return _process(
+            uow,
+            opened=opened,
+            payload=FeedPayload.from_bytes(data),
+            id_supplier=feed.id_supplier,
+            limit=None,
+            mode=mode,
+            defer_offers=True,
+        )
+
+
+def _state(engine: Engine, feed: Feed, id_run: int) -> tuple[list, list]:
+    with Session(engine) as db:
+        items = db.execute(
+            select(
+                SupplierItem.sku,
+                SupplierItem.gtin,
+                SupplierItem.id_product,
+                SupplierItem.price,
+                SupplierItem.stock,
+                SupplierItem.partnumber,
+                SupplierItem.fingerprint,
+            )
+            .where(SupplierItem.id_feed == feed.id_feed)
+            .order_by(SupplierItem.sku)
+        ).all()
+        events = db.execute(
+            select(
+                ProductSupplierEvent.id_product,
+                ProductSupplierEvent.reason,
+                ProductSupplierEvent.price,
+                ProductSupplierEvent.stock,
+            )
+            .where(
+                ProductSupplierEvent.id_supplier == feed.id_supplier,
+                ProductSupplierEvent.id_feed_run == id_run,
+            )
+            .order_by(ProductSupplierEvent.id_product, ProductSupplierEvent.reason)
+        ).all()
+    # fingerprint inclui o id_feed: compara-se se é o que o upsert gravaria
+    fp = SupplierItemWriteRepository.fingerprint
+    out = []
+    for sku, gtin, id_product, price, stock, partnumber, stored in items:
+        expected_fp = fp(
+            id_feed=feed.id_feed,
+            id_product=id_product,
+            sku=sku,
+            gtin=gtin,
+            partnumber=partnumber,
+            price=price,
+            stock=stock,
+        )
+        out.append((sku, gtin, id_product, price, stock, stored == expected_fp))
+    return out, [tuple(r) for r in events]
+
+
+_SAME = ("rows_total", "rows_valid", "rows_invalid", "changes", "eol_marked", "status")
+
+
+@pytest.mark.parametrize("mode", ["row", "bulk"])
+def test_delta_run_matches_full_run(
+    engine: Engine, mode: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    full, fast = _feed(engine, "Full"), _feed(engine, "Delta")
+    # linha inválida (sem sku) e SKU repetido com o mesmo conteúdo
+    v1 = _csv(V1, ";5601000000073;1,00;1;Acme")
+    v2 = _csv(V2, ";5601000000073;1,00;1;Acme", "E;5601000000059;50,00;0;Acme")
+
+    for feed, delta in ((full, False), (fast, True)):
+        first = _ingest(engine, feed, v1, mode=mode, delta=delta, monkeypatch=monkeypatch)
+        assert first["ok"] and not first["delta"]
+    assert read_info(snapshot_path(full.id_feed)) is None
+    assert set(load_entries(snapshot_path(fast.id_feed))) == set(V1)
+
+    ref = _ingest(engine, full, v2, mode=mode, delta=False, monkeypatch=monkeypatch)
+    got = _ingest(engine, fast, v2, mode=mode, delta=True, monkeypatch=monkeypatch)
+
+    assert got["delta"] and not ref["delta"]
+    assert {k: got[k] for k in _SAME} == {k: ref[k] for k in _SAME}
+    # A, E e a repetição de E nem chegam ao persist
+    assert got["rows_unchanged_skipped"] == 3
+    assert got["eol_marked"] == 1  # C saiu com stock
+
+    ref_items, ref_events = _state(engine, full, ref["id_run"])
+    got_items, got_events = _state(engine, fast, got["id_run"])
+    assert got_items == ref_items
+    # (o EOL só mete o stock a 0, sem mexer no fingerprint, em ambos os caminhos)
+    assert all(fp_ok for sku, *_, fp_ok in got_items if sku in V2)
+    assert got_events == ref_events
+    assert {e[1] for e in got_events} >= {"eol"}
+
+    # o novo snapshot descreve o feed atual
+    info = read_info(snapshot_path(fast.id_feed))
+    assert info is not None and (info.id_run, info.count) == (got["id_run"], len(V2))
+
+
+def test_snapshot_not_used_after_mapper_change(
+    engine: Engine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    feed = _feed(engine, "Mapper")
+    _ingest(engine, feed, _csv(V1), mode="row", delta=True, monkeypatch=monkeypatch)
+    with Session(engine) as db:
+        db.execute(
+            FeedMapper.__table__.update()
+            .where(FeedMapper.id_feed == feed.id_feed)
+            .values(version=2)
+        )
+        db.commit()
+
+    res = _ingest(engine, feed, _csv(V2), mode="row", delta=True, monkeypatch=monkeypatch)
+    assert not res["delta"]
+    assert read_info(snapshot_path(feed.id_feed)).mapper_version == 2
+
+
+# -------------------- FeedDelta (sem BD) --------------------
+
+
+def _work(sku: str, price: str, stock: int = 1) -> Any:
+    return prepare_row(0, {"sku": sku, "price": price, "stock": stock})
+
+
+def test_feed_delta_diff_and_settle(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "INGEST_SNAPSHOT_DIR", str(tmp_path))
+    first = FeedDelta(id_feed=3)
+    for sku, price in [("A", "1"), ("B", "2"), ("C", "3"), ("X", "9")]:
+        assert not first.skip(_work(sku, price))
+    assert first.settle({"A", "B", "C"}) == []  # X falhou o persist: fora do snapshot
+    first.prepare(id_run=10, mapper_version=None)
+    assert read_info(snapshot_path(3)) is None  # só depois do publish
+    first.publish()
+
+    delta = FeedDelta(id_feed=3, old=load_entries(snapshot_path(3)))
+    assert delta.active and set(delta.old or ()) == {"A", "B", "C"}
+    assert delta.skip(_work("A", "1"))  # igual
+    assert not delta.skip(_work("B", "2.5"))  # alterado
+    assert not delta.skip(_work("D", "4"))  # novo
+    assert not delta.skip(_work("X", "9"))  # não estava no snapshot
+    assert delta.skip(_work("A", "1"))  # repetido: compara com a ocorrência anterior
+    assert delta.skipped == 2
+
+    # C saiu; B foi enviado mas falhou o persist → EOL como na run completa
+    assert sorted(delta.settle({"D", "X"})) == ["B", "C"]
+    assert set(delta.new) == {"A", "D", "X"}
+
+    delta.prepare(id_run=11, mapper_version=4)
+    delta.discard()
+    info = read_info(snapshot_path(3))
+    assert info is not None and (info.id_run, info.mapper_version, info.count) == (10, None, 3)
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,81 @@
+# tests/test_ingest_same_payload.py
+# Skip por conteúdo igual (INGEST_SKIP_SAME_PAYLOAD): só contra a última run que gravou linhas.
+from __future__ import annotations
+
+from collections.abc import Iterator
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import app.models  # noqa: F401  (regista todos os mappers)
+from app.domains.procurement.usecases.runs.ingest_supplier import _same_payload_as_last_run
+from app.models.feed_run import FeedRun
+from app.repositories.procurement.write.feed_run_write_repo import FeedRunWriteRepository
+
+ID_FEED = 1
+FEED = SimpleNamespace(id=ID_FEED, updated_at=None)
+
+
+@pytest.fixture
+def db() -> Iterator[Session]:
+    engine = create_engine("sqlite://")
+    FeedRun.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def _full_run(db: Session, digest: str) -> None:
+    run_w = FeedRunWriteRepository(db)
+    run = run_w.start(id_feed=ID_FEED)
+    run_w.finalize_ok(run.id, rows_total=10, rows_changed=0, partial=False, payload_sha256=digest)
+    db.commit()
+
+
+def _limit_run(db: Session) -> None:
+    # ?limit=: lê só as primeiras N linhas, faz EOL e não regista hash
+    run_w = FeedRunWriteRepository(db)
+    run = run_w.start(id_feed=ID_FEED)
+    run_w.finalize_ok(run.id, rows_total=3, rows_changed=0, partial=False, payload_sha256=None)
+    db.commit()
+
+
+def _unchanged_run(db: Session, digest: str) -> None:
+    run_w = FeedRunWriteRepository(db)
+    run = run_w.start(id_feed=ID_FEED)
+    run_w.finalize_unchanged(run.id, reason="same_content", http_status=None, payload_sha256=digest)
+    db.commit()
+
+
+def _same(db: Session, digest: str) -> bool:
+    return _same_payload_as_last_run(db, feed=FEED, mapper=None, digest=digest)
+
+
+def test_same_content_after_full_run_is_skipped(db: Session) -> None:
+    _full_run(db, "H")
+    assert _same(db, "H")
+    assert not _same(db, "other")
+
+
+def test_full_limit_full_sequence_is_not_skipped(db: Session) -> None:
+    _full_run(db, "H")  # A
+    _limit_run(db)  # B: EOL de tudo o que veio depois das primeiras N linhas
+    # C tem o conteúdo de A, mas tem de correr para repor o que B marcou como EOL
+    assert not _same(db, "H")
+
+    _full_run(db, "H")  # C corre completo
+    assert _same(db, "H")
+
+
+def test_unchanged_runs_keep_the_last_ingested_reference(db: Session) -> None:
+    _full_run(db, "H")
+    _unchanged_run(db, "H")
+    assert _same(db, "H")
+
+
+def test_mapper_version_change_is_not_skipped(db: Session) -> None:
+    _full_run(db, "H")
+    mapper = SimpleNamespace(version=2, updated_at=None)
+    assert not _same_payload_as_last_run(db, feed=FEED, mapper=mapper, digest="H")
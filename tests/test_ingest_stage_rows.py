@@ -0,0 +1,181 @@
+# tests/test_ingest_stage_rows.py
+# Modo bulk: as linhas da staging têm de levar o mesmo que o modo row grava/procura.
+from __future__ import annotations
+
+import io
+import json
+from collections.abc import Iterator
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+import app.models  # noqa: F401  (regista todos os mappers)
+from app.domains.procurement.services.ingest_rows import (
+    map_rows,
+    prepare_row,
+    row_fingerprint,
+    row_sku,
+    stage_row,
+)
+from app.models.brand import Brand
+from app.models.category import Category
+from app.repositories.catalog.write.brand_write_repo import BrandsWriteRepository
+from app.repositories.catalog.write.category_write_repo import CategoryWriteRepository
+from app.repositories.procurement.write.ingest_stage_write_repo import (
+    STAGE_COLUMNS,
+    IngestStageWriteRepository,
+)
+
+NAMES = [
+    "Acme",
+    "  ACME®  Corp  ",
+    "acme corp",
+    "Ｇｅｎｅｓｙｓ™",
+    "Cabos\tE   Fichas",
+    "x" * 250,
+    "Y" * 119 + " z" * 100,
+]
+
+
+@pytest.fixture
+def db() -> Iterator[Session]:
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def _btrim(conn: Any, _rec: Any) -> None:
+        conn.create_function("btrim", 1, lambda s: None if s is None else s.strip(" "))
+
+    Brand.__table__.create(engine)
+    Category.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def _staged(mapped: dict[str, Any]) -> dict[str, Any]:
+    return dict(zip(STAGE_COLUMNS, stage_row(7, mapped), strict=True))
+
+
+@pytest.mark.parametrize("raw", NAMES)
+def test_staged_names_match_get_or_create(db: Session, raw: str) -> None:
+    mapped = {"sku": "A-1", "brand": raw, "category": raw}
+    work = prepare_row(7, mapped)
+    staged = _staged(mapped)
+
+    brand = BrandsWriteRepository(db).get_or_create(work.brand_name)
+    category = CategoryWriteRepository(db).get_or_create(work.category_name)
+
+    # nome a guardar igual ao do modo row; chave = lower(btrim(name)) do lookup
+    assert staged["brand"] == brand.name
+    assert staged["brand_key"] == brand.name.strip(" ").lower()
+    assert staged["category"] == category.name
+    assert staged["category_key"] == category.name.strip(" ").lower()
+
+
+def test_names_differing_only_in_case_share_a_key(db: Session) -> None:
+    keys = {_staged({"sku": "A", "brand": n})["brand_key"] for n in NAMES[1:3]}
+    ids = {
+        BrandsWriteRepository(db).get_or_create(prepare_row(1, {"brand": n}).brand_name).id
+        for n in NAMES[1:3]
+    }
+    assert len(keys) == len(ids) == 1
+
+
+def test_missing_names_stage_as_null() -> None:
+    staged = _staged({"sku": "A", "brand": "", "category": None})
+    assert staged["brand"] is staged["brand_key"] is None
+    assert staged["category"] is staged["category_key"] is None
+
+
+# -------------------- tuplo da staging vs RowWork (modo row) --------------------
+
+MAPPED: list[dict[str, Any]] = [
+    {"sku": " A-1 ", "gtin": "5601234567890", "mpn": "MP-1", "price": "39,99 €", "stock": "10+"},
+    {"partnumber": "PN-2", "price": 12, "stock": None, "brand": "Beta", "cor": "azul"},
+    {"gtin": "123", "price": None, "stock": "N/A", "peso": 0, "vazio": "", "lista": []},
+    {"name": "Só nome", "description": "tab\there", "image_url": "http://x/a.jpg"},
+    {"sku": "C-3", "weight": "1,5 kg", "category": "Outlet", "extra": {"a": 1}},
+]
+
+
+@pytest.mark.parametrize("mapped", MAPPED)
+def test_stage_row_matches_row_mode(mapped: dict[str, Any]) -> None:
+    work = prepare_row(7, dict(mapped))
+    staged = _staged(dict(mapped))
+
+    assert staged["row_idx"] == 7
+    assert staged["sku"] == work.sku
+    assert (staged["gtin"], staged["partnumber"]) == (work.gtin, work.pn)
+    assert staged["price"] == work.offer_payload["price"]
+    assert staged["stock"] == work.offer_payload["stock"]
+    for k in ("name", "description", "image_url", "weight_str"):
+        assert staged[k] == work.product_payload.get(k)
+    meta = json.loads(staged["meta"]) if staged["meta"] else {}
+    assert meta == {k: str(v) for k, v in work.meta_payload.items()}
+    assert row_fingerprint(stage_row(7, dict(mapped))) == row_fingerprint(work)
+
+
+def test_map_rows_stage_and_work_agree() -> None:
+    profile = {"fields": {"sku": {"source": "ref"}, "price": {"source": "pvp"}}}
+    rows = [{"ref": f"R-{i}", "pvp": f"{i},5"} for i in range(1, 6)] + [{"pvp": "1"}]
+    staged = list(map_rows(rows, profile=profile, prepare="stage", chunk_size=4))
+    worked = list(map_rows(rows, profile=profile, prepare="work", chunk_size=4))
+
+    assert [i for i, _, _ in staged] == [i for i, _, _ in worked] == list(range(1, 7))
+    for (_, s, s_err), (_, w, w_err) in zip(staged, worked, strict=True):
+        assert s_err == w_err
+        assert (s is None) == (w is None)
+        if s is not None:
+            assert row_sku(s) == row_sku(w)
+            assert row_fingerprint(s) == row_fingerprint(w)
+
+
+# -------------------- COPY (formato text) --------------------
+
+
+class _FakeCursor:
+    def __init__(self, sink: list[tuple[str, str]]) -> None:
+        self._sink = sink
+
+    def copy_expert(self, sql: str, buf: io.StringIO) -> None:
+        self._sink.append((sql, buf.read()))
+
+    def close(self) -> None:
+        pass
+
+
+def _copy_fields(line: str) -> list[str | None]:
+    # parser do formato text do COPY (o que o Postgres faz do outro lado)
+    unesc = {"t": "\t", "n": "\n", "r": "\r", "\\": "\\"}
+    out: list[str | None] = []
+    for field in line.split("\t"):
+        if field == "\\N":
+            out.append(None)
+            continue
+        chars, it = [], iter(field)
+        for c in it:
+            chars.append(unesc[next(it)] if c == "\\" else c)
+        out.append("".join(chars))
+    return out
+
+
+def test_copy_rows_round_trip() -> None:
+    sink: list[tuple[str, str]] = []
+    raw = SimpleNamespace(cursor=lambda: _FakeCursor(sink))
+    session = SimpleNamespace(connection=lambda: SimpleNamespace(connection=raw))
+    stage = IngestStageWriteRepository(session)  # type: ignore[arg-type]
+
+    rows = [stage_row(i, dict(m)) for i, m in enumerate(MAPPED, 1)]
+    rows.append(stage_row(9, {"sku": "T\\1", "name": "a\tb\nc\r\\N", "description": "nul\x00"}))
+    assert stage.copy_rows(rows) == len(rows)
+    assert stage.copy_rows([]) == 0
+
+    ((sql, data),) = sink
+    assert sql == f"COPY _ingest_stage ({', '.join(STAGE_COLUMNS)}) FROM STDIN"
+    lines = data.split("\n")
+    assert lines.pop() == ""
+    expected = [[None if v is None else str(v).replace("\x00", "") for v in r] for r in rows]
+    assert [_copy_fields(line) for line in lines] == expected
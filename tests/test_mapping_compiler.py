@@ -0,0 +1,294 @@
+# tests/test_mapping_compiler.py
+# O perfil compilado (map_row) e a variante colunar (map_batch) têm de devolver
+# exatamente o mesmo que a implementação de referência (map_row_interpreted).
+from __future__ import annotations
+
+import random
+from typing import Any
+
+import pytest
+
+from app.domains.mapping.engine import IngestEngine
+
+ROWS: list[dict[str, Any]] = [
+    {"ref": "A-1", "ean": " 5601234567890 ", "pvp": "12,50", "qty": "7", "marca": "Acme"},
+    {"ref": "A-2", "ean": "", "pvp": "1.234,99", "qty": "-3", "marca": "acme", "cat": "Cabos"},
+    {"ref": "", "ean": None, "pvp": None, "qty": None},
+    {"ref": "B-9", "ean": "123", "pvp": 9.5, "qty": 12, "marca": "  BETA  ", "estado": "novo"},
+    {"ref": "C-0", "pvp": "abc", "qty": "n/a", "estado": "usado", "cat": "Outlet"},
+    {"ref": 42, "ean": 5609999999999, "pvp": 0, "qty": "0", "marca": None},
+    {},
+]
+
+PROFILES: dict[str, dict[str, Any]] = {
+    "empty": {},
+    "sources": {
+        "fields": {
+            "sku": {"source": "ref", "required": True},
+            "gtin": {"source": "ean"},
+            "price": {"from": "pvp"},
+            "stock": {"source": "qty"},
+        }
+    },
+    "fields_as_list": {
+        "fields": [
+            {"target": "sku", "source": "ref"},
+            {"target": "brand", "source": "marca", "trim": True, "uppercase": True},
+            {"no_target": True},
+            "junk",
+        ],
+        "required": ["sku", "brand"],
+    },
+    "transforms": {
+        "fields": {
+            "sku": {"source": "ref", "trim": True, "lowercase": True},
+            "price": {"source": "pvp", "to_number": {"decimal": ",", "thousands": "."}},
+            "stock": {"source": "qty", "value_map": {"n/a": "0", "": "1"}},
+            "state": {"source": "estado", "value_map": {"novo": "new", "usado": "used"}},
+        },
+        "defaults": {"stock": 5, "category": "Geral"},
+    },
+    "derive": {
+        "fields": {
+            "sku": {"source": "ref"},
+            "price": {"source": "pvp"},
+            "category": {
+                "source": "cat",
+                "derive": {
+                    "when": [{"empty_any_of": ["$cat"]}],
+                    "then": "Sem categoria",
+                    "else": "$cat",
+                },
+            },
+            "label": {"derive": {"when": {"eq": ["$marca", "Acme"]}, "then": "$ref"}},
+        }
+    },
+    "rules_and_filters": {
+        "fields": {
+            "sku": {"source": "ref"},
+            "price": {"source": "pvp"},
+            "stock": {"source": "qty"},
+            "brand": {"source": "marca"},
+        },
+        "rules": [
+            {"when": [{"gt": ["$stock", 5]}], "set": {"$flag": "many", "origin": "$brand"}},
+            {
+                "when": {"or": [{"contains": ["$ref", "B"]}, {"in": ["$estado", "usado, x"]}]},
+                "set": {"brand": "Outlet"},
+            },
+            {"when": [{"in": ["$marca", "Beta, Acme"]}], "set": {"listed": "$marca"}},
+            {
+                "when": [{"regex": ["$ref", "^[A-C]-\\d$"]}, {"ne": ["$ref", "A-2"]}],
+                "set": {"matched": True},
+            },
+            {
+                "when": [{"startswith": ["$brand", "ac"]}, {"endswith": ["$ref", "2"]}],
+                "set": {"lowered": "$brand"},
+            },
+            {
+                "when": [{"lte": ["$price", "10"]}, {"gte": ["$stock", 0]}, {"lt": [1, 2]}],
+                "set": {"cheap": 1},
+            },
+        ],
+        "row_selector": {
+            "and": [{"ne": ["$sku", ""]}, {"in": ["$sku", ["A-1", "A-2", "B-9", "C-0", 42]]}]
+        },
+        "drop_if": [{"eq": ["$estado", "usado"]}, {"empty_any_of": ["$price", "$sku"]}],
+        "required": ["sku"],
+    },
+    "malformed": {
+        "fields": {
+            "sku": {"source": "ref"},
+            "bad_cfg": "not-a-dict",
+            "price": {"source": "pvp", "to_number": "yes", "value_map": ["x"]},
+            "stock": {"source": "qty", "derive": {"then": "1"}},
+            "ghost": {"trim": True},
+        },
+        "rules": [
+            {"when": "not-a-list", "set": {"x": 1}},
+            {"when": [{"eq": ["$sku"]}], "set": {"y": 1}},
+            {"when": [{"nope": ["$sku", 1]}], "set": {"z": 1}},
+            {"when": [{"regex": ["$sku", "("]}], "set": {"w": 1}},
+            {"when": [{}], "set": {"v": 1}},
+            {"when": [{"and": {"eq": ["$sku", "A-1"]}}], "set": {"u": 1}},
+            {"when": [{"gt": ["$price", "abc"]}], "set": {"t": 1}},
+            {"set": {"always": "$missing"}},
+        ],
+        "drop_if": [{"or": []}, {"and": []}, "junk"],
+        "row_selector": {"or": {"eq": [1, 1]}},
+        "required": "not-a-list",
+    },
+}
+
+
+def _outcome(fn: Any, arg: Any) -> tuple[str, Any]:
+    try:
+        return "ok", fn(arg)
+    except Exception as e:
+        return "error", type(e)
+
+
+def _assert_equivalent(profile: dict[str, Any], rows: list[dict[str, Any]]) -> None:
+    engine = IngestEngine(profile)
+    expected = [_outcome(engine.map_row_interpreted, dict(r)) for r in rows]
+
+    assert [_outcome(engine.map_row, dict(r)) for r in rows] == expected
+
+    errors = [e for kind, e in expected if kind == "error"]
+    batch = _outcome(engine.map_batch, [dict(r) for r in rows])
+    if errors:
+        assert batch == ("error", errors[0])
+    else:
+        assert batch == ("ok", [res for _kind, res in expected])
+
+
+@pytest.mark.parametrize("name", sorted(PROFILES))
+def test_compiled_matches_interpreted(name: str) -> None:
+    _assert_equivalent(PROFILES[name], ROWS)
+
+
+def test_batch_of_one_and_empty_batch() -> None:
+    engine = IngestEngine(PROFILES["rules_and_filters"])
+    assert engine.map_batch([]) == []
+    for row in ROWS:
+        assert engine.map_batch([dict(row)]) == [engine.map_row_interpreted(dict(row))]
+
+
+# -------------------- perfis aleatórios --------------------
+
+_COLUMNS = ["ref", "ean", "pvp", "qty", "marca", "cat", "estado"]
+_TARGETS = ["sku", "gtin", "price", "stock", "brand", "category", "extra"]
+_VALUES: list[Any] = [
+    None,
+    "",
+    " ",
+    "0",
+    "7",
+    "-2",
+    "3.5",
+    "1.234,56",
+    "12,5",
+    "abc",
+    "Acme",
+    " acme ",
+    "B-1",
+    0,
+    1,
+    -4,
+    2.5,
+    1000,
+    True,
+    [],
+    ["x"],
+]
+_OPS = [
+    "eq",
+    "ne",
+    "gt",
+    "gte",
+    "lt",
+    "lte",
+    "contains",
+    "startswith",
+    "endswith",
+    "regex",
+    "in",
+    "empty_any_of",
+    "bogus",
+]
+
+
+def _token(rnd: random.Random) -> Any:
+    if rnd.random() < 0.5:
+        return "$" + rnd.choice(_TARGETS + _COLUMNS + ["missing"])
+    return rnd.choice(_VALUES + ["^A", "[", "a,b", "Acme, B-1"])
+
+
+def _cond(rnd: random.Random, depth: int = 0) -> Any:
+    r = rnd.random()
+    if depth < 2 and r < 0.15:
+        key = rnd.choice(["and", "or"])
+        items = [_cond(rnd, depth + 1) for _ in range(rnd.randint(0, 3))]
+        return {key: items if rnd.random() < 0.8 else (items[0] if items else {})}
+    if r < 0.2:
+        return rnd.choice([{}, "junk", None, {"eq": ["$sku"]}, {"eq": "x"}])
+    op = rnd.choice(_OPS)
+    if op == "empty_any_of":
+        args = [_token(rnd) for _ in range(rnd.randint(1, 3))]
+        return {op: args if rnd.random() < 0.8 else args[0]}
+    if op == "in" and rnd.random() < 0.5:
+        return {op: [_token(rnd), [rnd.choice(_VALUES) for _ in range(3)]]}
+    return {op: [_token(rnd), _token(rnd)]}
+
+
+def _conds(rnd: random.Random) -> Any:
+    conds = [_cond(rnd) for _ in range(rnd.randint(0, 3))]
+    return conds if rnd.random() < 0.8 else (conds[0] if conds else None)
+
+
+def _field(rnd: random.Random) -> Any:
+    if rnd.random() < 0.05:
+        return rnd.choice(["junk", None, 1])
+    cfg: dict[str, Any] = {}
+    if rnd.random() < 0.8:
+        cfg[rnd.choice(["source", "from"])] = rnd.choice(_COLUMNS + ["missing"])
+    for flag in ("trim", "lowercase", "uppercase", "required"):
+        if rnd.random() < 0.2:
+            cfg[flag] = rnd.choice([True, False, 1])
+    if rnd.random() < 0.2:
+        cfg["to_number"] = rnd.choice(
+            [{"decimal": ",", "thousands": "."}, {"decimal": ","}, {}, "yes"]
+        )
+    if rnd.random() < 0.2:
+        cfg["value_map"] = rnd.choice(
+            [{"": "vazio", "Acme": "ACME", "7": 70, "None": "n"}, ["x"], {}]
+        )
+    if rnd.random() < 0.2:
+        derive: dict[str, Any] = {"when": _conds(rnd), "then": _token(rnd)}
+        if rnd.random() < 0.5:
+            derive["else"] = _token(rnd)
+        cfg["derive"] = derive
+    return cfg
+
+
+def _profile(rnd: random.Random) -> dict[str, Any]:
+    targets = rnd.sample(_TARGETS, rnd.randint(0, len(_TARGETS)))
+    fields = {t: _field(rnd) for t in targets}
+    profile: dict[str, Any] = {}
+    if rnd.random() < 0.2:
+        profile["fields"] = [
+            {"target": t, **cfg} if isinstance(cfg, dict) else cfg for t, cfg in fields.items()
+        ]
+    else:
+        profile["fields"] = fields
+    if rnd.random() < 0.4:
+        profile["defaults"] = {rnd.choice(_TARGETS): rnd.choice(_VALUES) for _ in range(2)}
+    if rnd.random() < 0.6:
+        profile["rules"] = [
+            {
+                "when": _conds(rnd),
+                "set": {
+                    rnd.choice(_TARGETS + ["$" + t for t in _TARGETS]): _token(rnd)
+                    for _ in range(rnd.randint(0, 2))
+                },
+            }
+            for _ in range(rnd.randint(0, 3))
+        ]
+    if rnd.random() < 0.3:
+        profile["row_selector"] = _cond(rnd)
+    if rnd.random() < 0.3:
+        profile["drop_if"] = [_cond(rnd) for _ in range(rnd.randint(0, 2))]
+    if rnd.random() < 0.3:
+        profile["required"] = rnd.sample(_TARGETS, 2) if rnd.random() < 0.8 else "sku"
+    return profile
+
+
+def _row(rnd: random.Random) -> dict[str, Any]:
+    return {c: rnd.choice(_VALUES) for c in _COLUMNS if rnd.random() < 0.85}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_profiles_match_interpreted(seed: int) -> None:
+    rnd = random.Random(seed)
+    for _ in range(25):
+        _assert_equivalent(_profile(rnd), [_row(rnd) for _ in range(20)])
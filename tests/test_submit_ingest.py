@@ -0,0 +1,34 @@
+# tests/test_submit_ingest.py
+# Uma run em fila que não chega a arrancar não pode ficar 'running' para sempre.
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from app.core.errors import NotFound
+from app.domains.procurement.usecases.runs import submit_ingest
+
+
+class _Session:
+    def close(self) -> None:
+        pass
+
+
+def test_run_is_aborted_when_ingest_cannot_start(monkeypatch: pytest.MonkeyPatch) -> None:
+    aborted: list[tuple[int, str]] = []
+
+    async def failing_ingest(*_args: Any, **_kwargs: Any) -> dict[str, Any]:
+        raise NotFound("Feed not found for supplier")  # ex.: feed desativado com a run em fila
+
+    monkeypatch.setattr(submit_ingest, "SessionLocal", _Session)
+    monkeypatch.setattr(submit_ingest, "ingest_supplier", failing_ingest)
+    monkeypatch.setattr(
+        submit_ingest, "_abort_run", lambda id_run, msg: aborted.append((id_run, msg))
+    )
+
+    res = asyncio.run(submit_ingest.run_ingest_job(id_supplier=1, id_feed=2, id_run=3, lock=False))
+
+    assert res == {"ok": False, "id_run": 3, "error": "Feed not found for supplier"}
+    assert aborted == [(3, "NotFound: Feed not found for supplier")]